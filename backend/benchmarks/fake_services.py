@@ -0,0 +1,363 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from services.cid_service import compute_cid
+
+class FaultConfig:
+    """
+    Latency and errors injected into every request a fake service handles.
+    error_rate is the fraction of requests answered with error_status instead of a result.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def update(self, **fields):
+        for name in ("latency_ms", "jitter_ms", "error_rate", "error_status"):
+            if name in fields:
+                setattr(self, name, type(getattr(self, name))(fields[name]))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+        }
+
+class FakeService:
+    """
+    Local HTTP stand-in for an external service, served from a background thread.
+    Subclasses implement handle(method, path, query, headers, body) -> (status, body, content type).
+    Faults can be changed at runtime with POST /_faults (JSON body with FaultConfig fields);
+    GET /_stats returns request and injected-error counts.
+    """
+
+    name = "fake"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.faults = faults or FaultConfig()
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.injected_errors = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self) -> str:
+        """Start serving and return the base URL"""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service._dispatch(self, "GET")
+
+            def do_POST(self):
+                service._dispatch(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "injected_errors": self.injected_errors, "faults": self.faults.describe()}
+
+    def handle(self, method: str, path: str, query: Dict[str, list], headers, body: bytes) -> Tuple[int, bytes, str]:
+        raise NotImplementedError
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, method: str):
+        length = int(handler.headers.get("Content-Length", 0))
+        body = handler.rfile.read(length) if length else b""
+        parsed = urlparse(handler.path)
+
+        if parsed.path == "/_faults" and method == "POST":
+            self.faults.update(**json.loads(body or b"{}"))
+            return _respond(handler, 200, json.dumps(self.faults.describe()).encode(), "application/json")
+        if parsed.path == "/_stats":
+            return _respond(handler, 200, json.dumps(self.stats()).encode(), "application/json")
+
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.faults.delay())
+        if self.faults.should_fail():
+            with self._lock:
+                self.injected_errors += 1
+            return _respond(handler, self.faults.error_status, b'{"error": "injected failure"}', "application/json")
+
+        try:
+            status, payload, content_type = self.handle(method, parsed.path, parse_qs(parsed.query), handler.headers, body)
+        except Exception as e:
+            status, payload, content_type = 500, json.dumps({"error": str(e)}).encode(), "application/json"
+        _respond(handler, status, payload, content_type)
+
+class _ContentStore:
+    """CID-addressed blobs shared by the IPFS-like fakes"""
+
+    def __init__(self):
+        self._blobs: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def add(self, data: bytes) -> str:
+        cid = compute_cid(data)
+        with self._lock:
+            self._blobs[cid] = data
+        return cid
+
+    def get(self, cid: str) -> Optional[bytes]:
+        with self._lock:
+            return self._blobs.get(cid)
+
+class FakeIPFSNode(FakeService):
+    """Kubo RPC subset (/api/v0/add, /api/v0/cat) plus a read gateway at /ipfs/{cid}"""
+
+    name = "ipfs"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, **kwargs):
+        super().__init__(faults, **kwargs)
+        self.store = _ContentStore()
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api/v0"
+
+    @property
+    def gateway_url(self) -> str:
+        return f"{self.url}/ipfs"
+
+    def handle(self, method, path, query, headers, body):
+        if method == "POST" and path == "/api/v0/add":
+            cid = self.store.add(_multipart_file(headers.get("Content-Type", ""), body))
+            return 200, json.dumps({"Name": "encrypted_clothing_data", "Hash": cid, "Size": str(len(body))}).encode(), "application/json"
+        if method == "POST" and path == "/api/v0/cat":
+            return _blob_response(self.store.get(query.get("arg", [""])[0]))
+        if method == "GET" and path.startswith("/ipfs/"):
+            return _blob_response(self.store.get(path[len("/ipfs/"):]))
+        return 404, b'{"error": "not found"}', "application/json"
+
+class FakePinata(FakeService):
+    """Pinata pinFileToIPFS endpoint plus its gateway at /ipfs/{cid}"""
+
+    name = "pinata"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, **kwargs):
+        super().__init__(faults, **kwargs)
+        self.store = _ContentStore()
+
+    @property
+    def pin_url(self) -> str:
+        return f"{self.url}/pinning/pinFileToIPFS"
+
+    @property
+    def gateway_url(self) -> str:
+        return f"{self.url}/ipfs"
+
+    def handle(self, method, path, query, headers, body):
+        if method == "POST" and path == "/pinning/pinFileToIPFS":
+            if not headers.get("pinata_api_key"):
+                return 401, b'{"error": "missing API key"}', "application/json"
+            data = _multipart_file(headers.get("Content-Type", ""), body)
+            cid = self.store.add(data)
+            return 200, json.dumps({"IpfsHash": cid, "PinSize": len(data), "Timestamp": time.time()}).encode(), "application/json"
+        if method == "GET" and path.startswith("/ipfs/"):
+            return _blob_response(self.store.get(path[len("/ipfs/"):]))
+        return 404, b'{"error": "not found"}', "application/json"
+
+class FakeMasumi(FakeService):
+    """Masumi payment service: decision log (/api/log-decision) and transaction submission"""
+
+    name = "masumi"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, **kwargs):
+        super().__init__(faults, **kwargs)
+        self.decisions = 0
+        self.transactions: List[str] = []
+
+    @property
+    def submit_endpoint(self) -> str:
+        """Base URL for MASUMI_ENDPOINT (transactions go to {endpoint}/transactions/submit)"""
+        return self.url
+
+    def handle(self, method, path, query, headers, body):
+        if method == "POST" and path == "/api/log-decision":
+            payload = json.loads(body)
+            with self._lock:
+                self.decisions += 1
+            transaction_hash = hashlib.sha256(f"{payload['agent_id']}|{payload['decision_hash']}".encode()).hexdigest()
+            return 200, json.dumps({"success": True, "transaction_hash": transaction_hash}).encode(), "application/json"
+        if method == "POST" and path == "/transactions/submit":
+            tx_cbor = json.loads(body)["transaction_cbor"]
+            with self._lock:
+                self.transactions.append(tx_cbor)
+            tx_hash = hashlib.sha256(bytes.fromhex(tx_cbor)).hexdigest()
+            return 200, json.dumps({"success": True, "tx_hash": tx_hash}).encode(), "application/json"
+        return 404, b'{"error": "not found"}', "application/json"
+
+class FakeBlockfrost(FakeService):
+    """
+    Blockfrost subset read by the chain view: protocol parameters, chain tip and address UTxOs.
+    Assets are credited with hold(address, unit), each in a new block at the tip.
+    """
+
+    name = "blockfrost"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, **kwargs):
+        super().__init__(faults, **kwargs)
+        self.height = 1
+        self.parameters = {"max_tx_size": 16384, "coins_per_utxo_size": "4310"}
+        self._utxos: Dict[str, List[Dict[str, Any]]] = {}
+        self._transactions: Dict[str, List[Dict[str, Any]]] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/api/v0"
+
+    def hold(self, address: str, unit: str):
+        with self._lock:
+            self.height += 1
+            tx_hash = hashlib.sha256(f"{address}|{unit}|{self.height}".encode()).hexdigest()
+            output = {"output_index": 0, "address": address, "amount": [{"unit": unit, "quantity": "1"}]}
+            self._utxos.setdefault(address, []).append({"tx_hash": tx_hash, **output})
+            self._transactions.setdefault(address, []).append(
+                {"tx_hash": tx_hash, "block_height": self.height, "inputs": [], "outputs": [output]}
+            )
+
+    def handle(self, method, path, query, headers, body):
+        parts = path.split("/")[3:] if path.startswith("/api/v0/") else []
+        if parts == ["epochs", "latest", "parameters"]:
+            return 200, json.dumps(self.parameters).encode(), "application/json"
+        if parts == ["blocks", "latest"]:
+            return 200, json.dumps({"height": self.height, "hash": f"{self.height:064x}"}).encode(), "application/json"
+        if len(parts) == 3 and parts[0] == "addresses" and parts[2] in ("utxos", "transactions"):
+            with self._lock:
+                if parts[2] == "utxos":
+                    entries = list(self._utxos.get(parts[1], []))
+                else:
+                    low, high = int(query.get("from", ["0"])[0]), int(query.get("to", [str(self.height)])[0])
+                    entries = [{"tx_hash": tx["tx_hash"]} for tx in self._transactions.get(parts[1], [])
+                               if low <= tx["block_height"] <= high]
+            if parts[2] == "utxos" and parts[1] not in self._utxos:
+                return 404, b'{"error": "not found"}', "application/json"
+            return 200, json.dumps(entries).encode(), "application/json"
+        if len(parts) == 3 and parts[0] == "txs" and parts[2] == "utxos":
+            with self._lock:
+                for transactions in self._transactions.values():
+                    for tx in transactions:
+                        if tx["tx_hash"] == parts[1]:
+                            detail = {"hash": tx["tx_hash"], "inputs": tx["inputs"], "outputs": tx["outputs"]}
+                            return 200, json.dumps(detail).encode(), "application/json"
+        return 404, b'{"error": "not found"}', "application/json"
+
+class FakeServices:
+    """
+    The three stand-ins together, with the environment that points the backend at them
+    """
+
+    def __init__(self, ipfs: Optional[FaultConfig] = None, pinata: Optional[FaultConfig] = None,
+                 masumi: Optional[FaultConfig] = None):
+        self.ipfs = FakeIPFSNode(ipfs)
+        self.pinata = FakePinata(pinata)
+        self.masumi = FakeMasumi(masumi)
+
+    def start(self) -> "FakeServices":
+        for service in (self.ipfs, self.pinata, self.masumi):
+            service.start()
+        return self
+
+    def stop(self):
+        for service in (self.ipfs, self.pinata, self.masumi):
+            service.stop()
+
+    def environment(self, ipfs_backends: str = "pinata,local") -> Dict[str, str]:
+        return {
+            "IPFS_BACKENDS": ipfs_backends,
+            "IPFS_LOCAL_API_URL": self.ipfs.api_url,
+            "IPFS_GATEWAY_URL": self.pinata.gateway_url,
+            "IPFS_GATEWAYS": self.ipfs.gateway_url,
+            "PINATA_PIN_URL": self.pinata.pin_url,
+            "PINATA_API_KEY": "benchmark-key",
+            "PINATA_SECRET_KEY": "benchmark-secret",
+            "MASUMI_PAYMENT_BASE_URL": self.masumi.url,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {service.name: service.stats() for service in (self.ipfs, self.pinata, self.masumi)}
+
+def _multipart_file(content_type: str, body: bytes) -> bytes:
+    """Content of the first file part of a multipart/form-data body"""
+    boundary = content_type.split("boundary=", 1)[-1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        header, _, content = part.partition(b"\r\n\r\n")
+        if b"filename=" in header:
+            return content[:-2] if content.endswith(b"\r\n") else content
+    raise ValueError("No file in multipart body")
+
+def _blob_response(data: Optional[bytes]) -> Tuple[int, bytes, str]:
+    if data is None:
+        return 404, b'{"error": "not found"}', "application/json"
+    return 200, data, "application/octet-stream"
+
+def _respond(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str):
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+def add_fault_arguments(parser: argparse.ArgumentParser, name: str):
+    parser.add_argument(f"--{name}-latency-ms", type=float, default=0.0)
+    parser.add_argument(f"--{name}-jitter-ms", type=float, default=0.0)
+    parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+
+def faults_from_args(args: argparse.Namespace, name: str) -> FaultConfig:
+    return FaultConfig(getattr(args, f"{name}_latency_ms"), getattr(args, f"{name}_jitter_ms"),
+                       getattr(args, f"{name}_error_rate"))
+
+# Run the stand-ins on their own, e.g. in front of a separately started backend
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake IPFS, Pinata and Masumi services")
+    for service_name in ("ipfs", "pinata", "masumi"):
+        add_fault_arguments(parser, service_name)
+    args = parser.parse_args()
+
+    services = FakeServices(faults_from_args(args, "ipfs"), faults_from_args(args, "pinata"), faults_from_args(args, "masumi")).start()
+    print("# Point the backend at the fake services:")
+    for key, value in services.environment().items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fake_services import FakeServices, add_fault_arguments, faults_from_args
+from benchmarks.micro import image_bytes, parse_sizes, synthetic_image
+from benchmarks.report import print_table, summarize_latencies, write_report
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class RSSMonitor:
+    """
+    Samples a process's resident set size on a background thread and keeps the peak.
+    Reads /proc/<pid>/status (Linux); elsewhere only this process's ru_maxrss is available.
+    """
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.02):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.peak_kb = self._read_kb()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, self._read_kb())
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak_kb / 1024.0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, self._read_kb())
+
+    def _read_kb(self) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        if self.pid == os.getpid():
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak // 1024 if sys.platform == "darwin" else peak
+        return 0
+
+class BackendProcess:
+    """
+    The FastAPI app under uvicorn in a child process, so its latency and memory are not
+    mixed up with the load generator's
+    """
+
+    def __init__(self, environment: Dict[str, str], port: Optional[int] = None):
+        self.environment = environment
+        self.port = port or _free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 120.0):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR,
+            env={**os.environ, **self.environment},
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise Exception(f"Backend exited during startup with code {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/openapi.json", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise Exception("Backend did not become ready in time")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+def isolated_environment(data_dir: str) -> Dict[str, str]:
+    """Point every on-disk store at a scratch directory so runs start cold and leave data/ alone"""
+    return {
+        "IPFS_PIN_QUEUE_PATH": os.path.join(data_dir, "ipfs_pins.db"),
+        "IPFS_CACHE_DIR": os.path.join(data_dir, "ipfs_cache"),
+        "MASUMI_OUTBOX_PATH": os.path.join(data_dir, "masumi_outbox.db"),
+        "KEY_STORE_PATH": os.path.join(data_dir, "wrapped_keys.db"),
+        "GARMENT_STORE_DIR": os.path.join(data_dir, "garments"),
+        "VTO_CACHE_DIR": os.path.join(data_dir, "tryon_cache"),
+        "NFT_POLICY_SKEY_PATH": os.path.join(data_dir, "nft_policy.skey"),
+    }
+
+# Scenario request builders: (client, request index, image bytes) -> response
+Scenario = Callable[[httpx.AsyncClient, int, Optional[bytes]], Awaitable[httpx.Response]]
+
+def _unique(image_data: bytes, index: int, run_id: str) -> bytes:
+    # Decoders ignore bytes after the JPEG end marker, so this changes the content hash
+    # (defeating result caches and CID dedup) without re-encoding the image
+    return image_data + f"{run_id}:{index}".encode()
+
+def upload_scenario(run_id: str) -> Scenario:
+    async def request(client, index, image_data):
+        return await client.post(
+            "/api/clothing/upload",
+            files={"image": ("item.jpg", _unique(image_data, index, run_id), "image/jpeg")},
+            data={"metadata": json.dumps({"category": "top", "benchmark": True})},
+        )
+    return request
+
+def try_on_scenario(run_id: str, quality: Optional[str], cached: bool) -> Scenario:
+    async def request(client, index, image_data):
+        person = image_data if cached else _unique(image_data, index, run_id)
+        data = {"quality": quality} if quality else {}
+        return await client.post(
+            "/api/style/try-on",
+            files={
+                "person_image": ("person.jpg", person, "image/jpeg"),
+                "cloth_image": ("cloth.jpg", image_data, "image/jpeg"),
+            },
+            data=data,
+            headers={"Accept": "image/png"},
+        )
+    return request
+
+def decision_scenario(run_id: str) -> Scenario:
+    async def request(client, index, image_data):
+        decision_hash = hashlib.sha256(f"{run_id}:{index}".encode()).hexdigest()
+        return await client.post(
+            "/api/agent/log-decision",
+            json={"agent_id": "did:vestiai:benchmark", "decision_hash": decision_hash},
+        )
+    return request
+
+# Scenarios that send an image (and so are run once per image size)
+IMAGE_SCENARIOS = {"upload", "try-on"}
+
+async def run_level(base_url: str, scenario: Scenario, image_data: Optional[bytes],
+                    concurrency: int, requests: int, timeout: float) -> Dict[str, Any]:
+    """
+    Closed-loop load: concurrency workers each send their next request as soon as the
+    previous one completes, until requests have been sent
+    """
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            for index in counter:
+                started = time.perf_counter()
+                try:
+                    response = await scenario(client, index, image_data)
+                    outcome = None if response.status_code < 400 else str(response.status_code)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                elapsed = (time.perf_counter() - started) * 1000.0
+                if outcome is None:
+                    latencies.append(elapsed)
+                else:
+                    errors[outcome] = errors.get(outcome, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+
+    metrics = summarize_latencies(latencies)
+    metrics.update({
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "error_counts": errors,
+        "success_rate": len(latencies) / requests if requests else 0.0,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "wall_s": wall,
+    })
+    return metrics
+
+async def run(base_url: str, server_pid: Optional[int], scenarios: List[str], sizes: List[Tuple[int, int]],
+              concurrency_levels: List[int], requests: int, warmup: int, quality: Optional[str],
+              cached: bool, timeout: float) -> List[Dict[str, Any]]:
+    run_id = hashlib.sha256(str(time.time()).encode()).hexdigest()[:8]
+    builders = {
+        "upload": lambda: upload_scenario(run_id),
+        "try-on": lambda: try_on_scenario(run_id, quality, cached),
+        "decision": lambda: decision_scenario(run_id),
+    }
+
+    results = []
+    for name in scenarios:
+        scenario = builders[name]()
+        for width, height in (sizes if name in IMAGE_SCENARIOS else [(None, None)]):
+            image_data = image_bytes(synthetic_image(width, height)) if width else None
+            if warmup:
+                await run_level(base_url, scenario, image_data, 1, warmup, timeout)
+            for concurrency in concurrency_levels:
+                with RSSMonitor(server_pid) as rss:
+                    metrics = await run_level(base_url, scenario, image_data, concurrency, requests, timeout)
+                metrics["peak_rss_mb"] = rss.peak_mb
+                params = {"concurrency": concurrency}
+                if image_data is not None:
+                    params["size"] = f"{width}x{height}"
+                if name == "try-on" and quality:
+                    params["quality"] = quality
+                results.append({"name": name, "params": params, "metrics": metrics})
+                print(f"{name} {params}: p50={metrics['p50_ms']:.1f}ms p99={metrics['p99_ms']:.1f}ms "
+                      f"{metrics['throughput_rps']:.1f} req/s errors={metrics['errors']}", flush=True)
+    return results
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Load test of the HTTP API against local stand-ins for IPFS, Pinata and Masumi
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async load generator for the VestiAI backend")
+    parser.add_argument("--scenarios", default="upload,try-on,decision", help="Comma-separated: upload, try-on, decision")
+    parser.add_argument("--sizes", default="384x512,768x1024", help="Image sizes (WIDTHxHEIGHT) for image scenarios")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario/size/concurrency cell")
+    parser.add_argument("--warmup", type=int, default=5, help="Sequential warm-up requests per scenario and size")
+    parser.add_argument("--quality", default=None, help="Try-on resolution tier")
+    parser.add_argument("--cached", action="store_true", help="Repeat identical try-on inputs (measures cache hits)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--ipfs-backends", default="pinata,local")
+    parser.add_argument("--url", default=None, help="Benchmark an already running backend instead of starting one")
+    parser.add_argument("--pid", type=int, default=None, help="With --url: backend process id for RSS sampling")
+    parser.add_argument("--data-dir", default=None, help="Scratch directory for the started backend")
+    parser.add_argument("--output", default="", help="Write the JSON report here")
+    for service_name in ("ipfs", "pinata", "masumi"):
+        add_fault_arguments(parser, service_name)
+    args = parser.parse_args()
+
+    scenario_names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    concurrency_values = [int(value) for value in args.concurrency.split(",")]
+
+    services = backend = None
+    try:
+        if args.url:
+            base, pid = args.url.rstrip("/"), args.pid
+        else:
+            services = FakeServices(faults_from_args(args, "ipfs"), faults_from_args(args, "pinata"),
+                                    faults_from_args(args, "masumi")).start()
+            data_dir = args.data_dir or tempfile.mkdtemp(prefix="vestiai-bench-")
+            backend = BackendProcess({**isolated_environment(data_dir), **services.environment(args.ipfs_backends)})
+            backend.start()
+            base, pid = backend.url, backend.process.pid
+
+        results = asyncio.run(run(base, pid, scenario_names, parse_sizes(args.sizes), concurrency_values,
+                                  args.requests, args.warmup, args.quality, args.cached, args.timeout))
+    finally:
+        if backend is not None:
+            backend.stop()
+        if services is not None:
+            services.stop()
+
+    print()
+    print_table(results, ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "errors", "peak_rss_mb"])
+    config = vars(args)
+    if services is not None:
+        config["fake_services"] = services.stats()
+    write_report(args.output, "load", config, results)
@@ -0,0 +1,103 @@
+import argparse
+import base64
+import io
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from benchmarks.report import print_table, summarize_latencies, write_report
+from services.encryption_service import EncryptionService
+from services.vto_service import (
+    RESOLUTION_TIERS,
+    decode_image,
+    encode_result_image,
+    postprocess_image,
+    preprocess_image,
+)
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Noisy photo-like RGB image; pure noise would defeat PNG/JPEG compression unrealistically"""
+    generator = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = gradient * 0.6 + generator.normal(90, 25, (height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+def image_bytes(image: Image.Image, image_format: str = "JPEG") -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **({"quality": 90} if image_format == "JPEG" else {}))
+    return buffer.getvalue()
+
+def measure(function: Callable[[], Any], repeat: int, warmup: int = 2, payload_bytes: int = 0) -> Dict[str, float]:
+    """Time repeated calls of function; reports latency percentiles, ops/s and (with payload_bytes) MB/s"""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    metrics = summarize_latencies(samples)
+    metrics["ops_per_s"] = 1000.0 / metrics["mean_ms"] if metrics["mean_ms"] else 0.0
+    if payload_bytes:
+        metrics["mb_per_s"] = payload_bytes / (1024 * 1024) * metrics["ops_per_s"]
+    return metrics
+
+def benchmark_cases(width: int, height: int) -> List[Tuple[str, Callable[[], Any], int]]:
+    """(name, callable, payload bytes) for one source image size"""
+    encryption_service = EncryptionService()
+    target_size = RESOLUTION_TIERS["standard"]
+
+    source = synthetic_image(width, height)
+    source_jpeg = image_bytes(source)
+    decoded = decode_image(source_jpeg, target_size)
+    tensor = preprocess_image(decoded, target_size)
+    output_tensor = torch.rand((1, 3, height, width)) * 2 - 1
+    png_data = encode_result_image(output_tensor, "png")
+    envelope = {"image": source_jpeg, "metadata": {"category": "top", "color": "blue"}, "filename": "item.jpg"}
+
+    return [
+        ("encrypt_data", lambda: encryption_service.encrypt_data(envelope), len(source_jpeg)),
+        ("decode_image", lambda: decode_image(source_jpeg, target_size), len(source_jpeg)),
+        ("preprocess_image", lambda: preprocess_image(decoded, target_size), tensor.numel() * 4),
+        ("postprocess_image", lambda: postprocess_image(output_tensor), output_tensor.numel() * 4),
+        ("encode_png", lambda: encode_result_image(output_tensor, "png"), output_tensor.numel() * 4),
+        ("encode_webp", lambda: encode_result_image(output_tensor, "webp"), output_tensor.numel() * 4),
+        ("base64_encode", lambda: base64.b64encode(png_data).decode("utf-8"), len(png_data)),
+    ]
+
+def run(sizes: List[Tuple[int, int]], repeat: int, only: List[str]) -> List[Dict[str, Any]]:
+    results = []
+    for width, height in sizes:
+        for name, function, payload_bytes in benchmark_cases(width, height):
+            if only and name not in only:
+                continue
+            results.append({
+                "name": name,
+                "params": {"size": f"{width}x{height}"},
+                "metrics": measure(function, repeat, payload_bytes=payload_bytes),
+            })
+    return results
+
+def parse_sizes(value: str) -> List[Tuple[int, int]]:
+    """"512x384,1024x768" -> [(512, 384), (1024, 768)] as (width, height)"""
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().strip().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+# Micro-benchmarks of the CPU-bound upload and try-on stages
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for encryption and image processing")
+    parser.add_argument("--sizes", default="384x512,768x1024,1536x2048", help="Source image sizes (WIDTHxHEIGHT)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--only", default="", help="Comma-separated benchmark names")
+    parser.add_argument("--output", default="", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    results = run(parse_sizes(args.sizes), args.repeat, [name.strip() for name in args.only.split(",") if name.strip()])
+    print_table(results, ["p50_ms", "p95_ms", "p99_ms", "ops_per_s", "mb_per_s"])
+    write_report(args.output, "micro", vars(args), results)
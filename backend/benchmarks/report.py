@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# Metrics where a larger value is an improvement; everything else is compared as lower-is-better
+HIGHER_IS_BETTER = {"throughput_rps", "ops_per_s", "mb_per_s", "success_rate"}
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile (q in [0, 100]) of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize_latencies(samples_ms: Sequence[float]) -> Dict[str, float]:
+    values = sorted(samples_ms)
+    return {
+        "count": len(values),
+        "mean_ms": (sum(values) / len(values)) if values else 0.0,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else 0.0,
+    }
+
+def environment_info() -> Dict[str, Any]:
+    """Machine and code version a run was taken on, so reports can be compared fairly"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    info = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit or None,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+def write_report(path: Optional[str], kind: str, config: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the machine-readable report ({kind, environment, config, results}) and write it as JSON.
+    Each result is {"name", "params", "metrics"}; compare() matches results by name and params.
+    """
+    report = {"kind": kind, "environment": environment_info(), "config": config, "results": results}
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def print_table(results: List[Dict[str, Any]], columns: Sequence[str]):
+    """Human-readable summary of a result list"""
+    rows = [[result["name"] + "".join(f" {key}={value}" for key, value in result["params"].items())]
+            + [_format(result["metrics"].get(column)) for column in columns]
+            for result in results]
+    header = ["benchmark"] + list(columns)
+    widths = [max(len(str(row[i])) for row in rows + [header]) for i in range(len(header))]
+    print("  ".join(str(cell).ljust(width) for cell, width in zip(header, widths)))
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Relative change of every shared metric between two reports.
+    A change counts as a regression when it is worse than threshold (0.10 = 10%).
+    """
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    previous = {key(result): result["metrics"] for result in baseline["results"]}
+    changes = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        for metric, value in result["metrics"].items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (value - old) / abs(old)
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            changes.append({
+                "name": result["name"],
+                "params": result["params"],
+                "metric": metric,
+                "baseline": old,
+                "current": value,
+                "change": change,
+                "regression": worse > threshold,
+            })
+    return changes
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}" if abs(value) < 1000 else f"{value:.0f}"
+    return "" if value is None else str(value)
+
+# Compare two benchmark reports; exits non-zero when a tracked metric regressed
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--metrics", default="", help="Comma-separated metrics to check (default: all)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline_report = json.load(f)
+    with open(args.current) as f:
+        current_report = json.load(f)
+
+    selected = {metric.strip() for metric in args.metrics.split(",") if metric.strip()}
+    regressions = 0
+    for change in compare(baseline_report, current_report, args.threshold):
+        if selected and change["metric"] not in selected:
+            continue
+        params = " ".join(f"{key}={value}" for key, value in change["params"].items())
+        flag = "REGRESSION" if change["regression"] else ""
+        regressions += change["regression"]
+        print(f"{change['name']} {params} {change['metric']}: {_format(change['baseline'])} -> "
+              f"{_format(change['current'])} ({change['change'] * 100:+.1f}%) {flag}".rstrip())
+    sys.exit(1 if regressions else 0)
@@ -1,29 +1,186 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import hashlib
+import hmac
 import json
+import os
+from typing import List, Optional
+from services.admission_service import AdmissionMiddleware, admission
 from services.encryption_service import EncryptionService
+from services.executor_service import stage_executors
+from services.http_service import http_registry
 from services.ipfs_service import IPFSService
-from services.masumi_service import log_agent_decision
+from services.key_store_service import WrappedKeyStore
+from services.metrics_service import ObservabilityMiddleware, configure_logging, current_trace_id, metrics, trace_id_var, track
+from services.mint_job_service import mint_jobs
+from services.outbox_service import DecisionOutbox
+from services.profiling_service import ProfilerBusyError, profiler
+from services.startup_service import run_in_background, startup
+from services.tryon_job_service import IdempotencyConflictError, JobQueueFullError, TryOnJobQueue
+from services.tryon_options_service import OUTPUT_FORMATS, RESOLUTION_TIERS, resolve_quality
 
-app = FastAPI(title="VestiAI Backend", version="1.0.0")
+configure_logging(os.getenv("LOG_LEVEL", "INFO"))
 
+# The try-on service pulls in torch, so it is imported on first use (model warm-up or the
+# first try-on/garment request) rather than with the app
+_vto_service = None
+
+def _import_vto():
+    global _vto_service
+    if _vto_service is None:
+        from services import vto_service
+        _vto_service = vto_service
+    return _vto_service
+
+async def _vto():
+    """The try-on service module; a first import runs off the event loop"""
+    if _vto_service is None:
+        return await asyncio.to_thread(_import_vto)
+    return _vto_service
+
+def _warmup_tryon(tiers: List[str]) -> dict:
+    return _import_vto().warmup_tryon(tiers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared keep-alive HTTP pool for IPFS and Masumi calls
+    await http_registry.start()
+    # Thread/process pools for CPU-bound image and crypto stages
+    stage_executors.start()
+    # Derive the active key-encryption key once, before the first upload needs it
+    await startup.run("kek", asyncio.to_thread(encryption_service.warm_kek))
+    # Background drain of queued Masumi decisions
+    await startup.run("decision_outbox", decision_outbox.start())
+    # Background pinning of content uploaded with a locally computed CID
+    await startup.run("ipfs_pin_queue", ipfs_service.start())
+    # Async NFT minting jobs (batched multi-asset transactions)
+    await startup.run("mint_jobs", mint_jobs.start())
+    # Workers for asynchronous try-on jobs
+    await startup.run("tryon_jobs", tryon_jobs.start())
+    # Load and warm the try-on model while the server already answers liveness probes;
+    # /api/health/ready reports not-ready until it finishes
+    warmup = None
+    if os.getenv("VTO_PRELOAD", "true").lower() == "true":
+        tiers = [tier.strip() for tier in os.getenv("VTO_WARMUP_TIERS", ",".join(RESOLUTION_TIERS)).split(",") if tier.strip()]
+        warmup = run_in_background("tryon_model", _warmup_tryon, tiers)
+    yield
+    if warmup is not None:
+        # Do not hold shutdown for a warm-up still in progress
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    await ipfs_service.stop()
+    await decision_outbox.stop()
+    await tryon_jobs.stop()
+    if _vto_service is not None:
+        for scheduler in _vto_service.tryon_schedulers.values():
+            scheduler.stop()
+    await mint_jobs.stop()
+    stage_executors.shutdown()
+    key_store.close()
+    await http_registry.close()
+
+app = FastAPI(title="VestiAI Backend", version="1.0.0", lifespan=lifespan)
+
+# Concurrency, queue and in-flight byte limits for the upload and try-on endpoints
+# (inside CORS, so rejections still carry CORS headers)
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "Retry-After"],
 )
+# Trace ids and per-route latency for every request (outermost, so CORS handling and
+# admission queueing are timed too)
+app.add_middleware(ObservabilityMiddleware)
 
 encryption_service = EncryptionService()
 ipfs_service = IPFSService()
+decision_outbox = DecisionOutbox()
+key_store = WrappedKeyStore()
+
+async def _read_upload(upload: UploadFile) -> bytes:
+    """Read an uploaded file, timed as the multipart_read stage"""
+    with track("multipart_read"):
+        return await upload.read()
+
+def _store_wrapped_keys(items: List[tuple]):
+    """Wrap (cid, base64 data key) pairs under the active KEK and store them by CID"""
+    cids = [cid for cid, _ in items]
+    data_keys = [base64.urlsafe_b64decode(decryption_key) for _, decryption_key in items]
+    key_store.put_many(zip(cids, encryption_service.wrap_keys(data_keys)))
 
 
 
 class ClothingUploadResponse(BaseModel):
     cid: str
     decryption_key: str
+    garment_id: Optional[str] = None
+    pin_status: Optional[str] = None
+
+class BatchUploadItemResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    success: bool
+    cid: Optional[str] = None
+    decryption_key: Optional[str] = None
+    garment_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchUploadItemResult]
+
+class PinStatusResponse(BaseModel):
+    cid: str
+    status: str
+    size: int
+    attempts: int
+    remote_cid: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class NFTMintRequest(BaseModel):
+    user_address: str
+    item_cids: List[str]
+
+class NFTMintItemResult(BaseModel):
+    item_cid: str
+    success: bool
+    tx_hash: Optional[str] = None
+    policy_id: Optional[str] = None
+    asset_name: Optional[str] = None
+    batch_size: Optional[int] = None
+    error: Optional[str] = None
+
+class NFTMintResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[NFTMintItemResult]
+
+class MintJobResponse(BaseModel):
+    job_id: str
+    status: str
+    user_address: str
+    succeeded: int
+    failed: int
+    pending: int
+    results: List[Optional[NFTMintItemResult]]
+    created_at: float
+    updated_at: float
+
+class GarmentIngestResponse(BaseModel):
+    garment_id: str
+    feature_shape: List[int]
 
 class AgentDecisionRequest(BaseModel):
     agent_id: str
@@ -31,9 +188,61 @@ class AgentDecisionRequest(BaseModel):
 
 class AgentDecisionResponse(BaseModel):
     success: bool
-    transaction_hash: str = None
+    transaction_hash: Optional[str] = None
+    decision_id: Optional[str] = None
+    status: Optional[str] = None
     message: str
 
+class DecisionStatusResponse(BaseModel):
+    decision_id: str
+    agent_id: str
+    decision_hash: str
+    status: str
+    attempts: int
+    transaction_hash: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    anchor_id: Optional[str] = None
+    leaf_index: Optional[int] = None
+
+class ProofStep(BaseModel):
+    position: str
+    hash: str
+
+class DecisionProofResponse(BaseModel):
+    decision_id: str
+    agent_id: str
+    decision_hash: str
+    leaf_hash: str
+    status: str
+    anchor_id: str
+    leaf_index: int
+    leaf_count: int
+    merkle_root: str
+    anchor_agent_id: str
+    anchor_status: str
+    transaction_hash: Optional[str] = None
+    proof: List[ProofStep]
+
+class VirtualTryOnResponse(BaseModel):
+    success: bool
+    result_image: str
+    decision_hash: str
+    transaction_hash: Optional[str] = None
+    decision_id: Optional[str] = None
+    quality: Optional[str] = None
+    message: str
+
+class MultiTryOnResult(BaseModel):
+    index: int
+    garment_id: Optional[str] = None
+    success: bool
+    result_image: Optional[str] = None
+    decision_hash: Optional[str] = None
+    decision_id: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None
 
 
 @app.post("/api/clothing/upload", response_model=ClothingUploadResponse)
@@ -45,6 +254,8 @@ async def upload_clothing_item(
     Secure clothing item upload endpoint for Cardano integration.
     Encrypts image + metadata and uploads to IPFS.
     """
+    vto = await _vto()
+    
     try:
         # Validate file type
         if not image.content_type.startswith('image/'):
@@ -57,103 +268,850 @@ async def upload_clothing_item(
             raise HTTPException(status_code=400, detail="Invalid JSON metadata")
         
         # Read image data
-        image_data = await image.read()
+        image_data = await _read_upload(image)
         
-        # Create data package
-        data_package = {
-            "image": image_data.hex(),
-            "metadata": metadata_dict,
-            "filename": image.filename
-        }
+        # Precompute try-on garment features while the item is encrypted and pinned
+        features_task = asyncio.create_task(vto.prepare_garment_features(image_data))
         
-        # Encrypt data package
-        encrypted_data, decryption_key = encryption_service.encrypt_data(data_package)
+        # Encrypt image + metadata off the event loop (raw image bytes are sealed directly in the envelope)
+        with track("encrypt"):
+            encrypted_data, decryption_key = await stage_executors.run_buffer(
+                "crypto",
+                encryption_service.encrypt_image,
+                image_data,
+                {"metadata": metadata_dict, "filename": image.filename}
+            )
         
         # Upload to IPFS
-        cid = await ipfs_service.upload_encrypted_data(encrypted_data)
+        try:
+            cid = await ipfs_service.upload_encrypted_data(encrypted_data)
+        except Exception:
+            features_task.cancel()
+            raise
+        
+        # Keep a KEK-wrapped copy of the data key alongside the CID
+        try:
+            await asyncio.to_thread(_store_wrapped_keys, [(cid, decryption_key)])
+        except Exception as e:
+            print(f"Warning: Failed to store wrapped key: {e}")
+        
+        # Store garment features under the CID; the upload itself does not depend on it
+        garment_id = None
+        try:
+            await vto.store_garment_features(cid, await features_task)
+            garment_id = cid
+        except Exception as e:
+            print(f"Warning: Failed to precompute garment features: {e}")
+        
+        pin = await ipfs_service.get_pin_status(cid)
         
         return ClothingUploadResponse(
             cid=cid,
-            decryption_key=decryption_key
+            decryption_key=decryption_key,
+            garment_id=garment_id,
+            pin_status=pin["status"] if pin else None
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.post("/api/clothing/upload-batch", response_model=BatchUploadResponse)
+async def upload_clothing_batch(
+    images: List[UploadFile] = File(...),
+    metadata: str = Form(...)
+):
+    """
+    Bulk clothing upload for wardrobe imports.
+    metadata is a JSON array with one object per image (or a single object applied to all).
+    Items are encrypted in parallel and pinned together; failures are reported per item.
+    """
+    vto = await _vto()
+    
+    try:
+        try:
+            metadata_value = json.loads(metadata)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON metadata")
+        
+        if isinstance(metadata_value, list):
+            if len(metadata_value) != len(images):
+                raise HTTPException(status_code=400, detail="metadata must have one entry per image")
+            metadata_items = metadata_value
+        else:
+            metadata_items = [metadata_value] * len(images)
+        
+        results = [BatchUploadItemResult(index=index, filename=image.filename, success=False)
+                   for index, image in enumerate(images)]
+        
+        async def prepare(index: int, image: UploadFile):
+            if not image.content_type or not image.content_type.startswith('image/'):
+                raise ValueError("File must be an image")
+            image_data = await _read_upload(image)
+            features_task = asyncio.create_task(vto.prepare_garment_features(image_data))
+            try:
+                with track("encrypt"):
+                    encrypted = await stage_executors.run_buffer(
+                        "crypto",
+                        encryption_service.encrypt_image,
+                        image_data,
+                        {"metadata": metadata_items[index], "filename": image.filename}
+                    )
+            except Exception:
+                features_task.cancel()
+                raise
+            return encrypted, features_task
+        
+        # Encrypt all items in parallel on the crypto pool
+        prepared = await asyncio.gather(
+            *[prepare(index, image) for index, image in enumerate(images)],
+            return_exceptions=True
+        )
+        
+        ready = []
+        for index, outcome in enumerate(prepared):
+            if isinstance(outcome, Exception):
+                results[index].error = str(outcome)
+            else:
+                ready.append(index)
+        
+        # Pin all encrypted items with bounded concurrency (or one directory add)
+        cids = await ipfs_service.upload_encrypted_batch([prepared[index][0][0] for index in ready])
+        
+        for index, cid in zip(ready, cids):
+            (_, decryption_key), features_task = prepared[index]
+            if isinstance(cid, Exception):
+                features_task.cancel()
+                results[index].error = str(cid)
+                continue
+            
+            results[index].success = True
+            results[index].cid = cid
+            results[index].decryption_key = decryption_key
+            try:
+                await vto.store_garment_features(cid, await features_task)
+                results[index].garment_id = cid
+            except Exception as e:
+                print(f"Warning: Failed to precompute garment features: {e}")
+        
+        # Wrap and store all data keys in one pass (one KEK lookup, one transaction)
+        try:
+            await asyncio.to_thread(_store_wrapped_keys, [
+                (result.cid, result.decryption_key) for result in results if result.success
+            ])
+        except Exception as e:
+            print(f"Warning: Failed to store wrapped keys: {e}")
+        
+        succeeded = sum(1 for result in results if result.success)
+        return BatchUploadResponse(
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch upload failed: {str(e)}")
+
+@app.post("/api/garments/ingest", response_model=GarmentIngestResponse)
+async def ingest_garment_endpoint(
+    image: UploadFile = File(...),
+    garment_id: Optional[str] = Form(None),
+    overwrite: bool = Form(False)
+):
+    """
+    Precompute and store try-on inputs for a catalog garment.
+    The garment id defaults to the SHA-256 of the image. Replacing an existing garment with
+    different content requires overwrite=true; garments of uploaded wardrobe items cannot be replaced.
+    """
+    vto = await _vto()
+    
+    try:
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        image_data = await _read_upload(image)
+        garment_id = garment_id or hashlib.sha256(image_data).hexdigest()
+        
+        try:
+            feature_shape = await vto.ingest_garment(garment_id, image_data, overwrite)
+        except vto.GarmentExistsError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except vto.ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return GarmentIngestResponse(garment_id=garment_id, feature_shape=list(feature_shape))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Garment ingest failed: {str(e)}")
+
+def _mint_item_result(cid: str, outcome: Optional[dict]) -> Optional[NFTMintItemResult]:
+    if outcome is None:
+        return None
+    return NFTMintItemResult(
+        item_cid=cid,
+        success=outcome["success"],
+        tx_hash=outcome.get("tx_hash"),
+        policy_id=outcome.get("policy_id"),
+        asset_name=outcome.get("asset_name"),
+        batch_size=outcome.get("batch_size"),
+        error=outcome.get("error")
+    )
+
+def _mint_job_response(job: dict) -> MintJobResponse:
+    results = [_mint_item_result(cid, outcome) for cid, outcome in zip(job["items"], job["results"])]
+    succeeded = sum(1 for result in results if result is not None and result.success)
+    pending = sum(1 for result in results if result is None)
+    return MintJobResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        user_address=job["user_address"],
+        succeeded=succeeded,
+        failed=len(results) - succeeded - pending,
+        pending=pending,
+        results=results,
+        created_at=job["created_at"],
+        updated_at=job["updated_at"]
+    )
+
+@app.post("/api/nft/mint", response_model=NFTMintResponse)
+async def mint_wardrobe_items(request: NFTMintRequest):
+    """
+    Mint NFTs for wardrobe items and wait for the result.
+    Items join the minting queue, which packs concurrent requests into shared multi-asset
+    transactions under one policy; results are reported per item.
+    """
+    if not request.item_cids:
+        raise HTTPException(status_code=400, detail="No items to mint")
+    
+    job_id = await mint_jobs.submit(request.user_address, request.item_cids)
+    job = await mint_jobs.wait(job_id)
+    
+    results = [_mint_item_result(cid, outcome) for cid, outcome in zip(job["items"], job["results"])]
+    succeeded = sum(1 for result in results if result.success)
+    return NFTMintResponse(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+@app.post("/api/nft/mint-jobs", response_model=MintJobResponse, status_code=202)
+async def create_mint_job(request: NFTMintRequest):
+    """
+    Queue wardrobe items for minting and return a job id to poll
+    """
+    if not request.item_cids:
+        raise HTTPException(status_code=400, detail="No items to mint")
+    
+    job_id = await mint_jobs.submit(request.user_address, request.item_cids)
+    return _mint_job_response(await mint_jobs.get_status(job_id))
+
+@app.get("/api/nft/mint-jobs/{job_id}", response_model=MintJobResponse)
+async def get_mint_job(job_id: str):
+    """
+    Report the state of a minting job (queued, minting, submitted, confirmed or failed)
+    """
+    job = await mint_jobs.get_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Mint job not found")
+    return _mint_job_response(job)
+
+@app.get("/api/nft/mint/stats")
+async def mint_queue_stats():
+    """
+    Queue depth, batch statistics and chain cache counters of the minting queue
+    """
+    return mint_jobs.stats()
+
 @app.post("/api/agent/log-decision", response_model=AgentDecisionResponse)
 async def log_agent_decision_endpoint(request: AgentDecisionRequest):
     """
     Log VestiAI agent decision to Masumi Payment Service
     """
     try:
-        result = await log_agent_decision(request.agent_id, request.decision_hash)
-        
-        if isinstance(result, str):
-            # Transaction hash returned
-            return AgentDecisionResponse(
-                success=True,
-                transaction_hash=result,
-                message="Decision logged successfully with transaction hash"
-            )
-        else:
-            # Boolean True returned
-            return AgentDecisionResponse(
-                success=True,
-                message="Decision logged successfully"
-            )
+        # Queue the decision; the outbox workers deliver it to Masumi in the background
+        decision_id = await decision_outbox.enqueue(request.agent_id, request.decision_hash)
+        status = await decision_outbox.get_status(decision_id)
+        
+        return AgentDecisionResponse(
+            success=True,
+            transaction_hash=status["transaction_hash"],
+            decision_id=decision_id,
+            status=status["status"],
+            message="Decision queued for logging"
+        )
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to log decision: {str(e)}")
 
-@app.post("/api/style/try-on", response_model=VirtualTryOnResponse)
+@app.get("/api/agent/decisions/{decision_id}", response_model=DecisionStatusResponse)
+async def get_decision_status(decision_id: str):
+    """
+    Report the delivery state of a queued agent decision
+    """
+    status = await decision_outbox.get_status(decision_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Decision not found")
+    return DecisionStatusResponse(**status)
+
+@app.get("/api/agent/decisions/{decision_id}/proof", response_model=DecisionProofResponse)
+async def get_decision_proof(decision_id: str):
+    """
+    Merkle inclusion proof of a decision anchored in a batch (MASUMI_ANCHOR_MODE=merkle).
+    Verifiable offline: leaf = sha256(0x00 || "<agent_id>|<decision_hash>"), then for each
+    step node = sha256(0x01 || left || right) with the step hash on its position's side;
+    the result must equal merkle_root, which Masumi logged under anchor_agent_id.
+    """
+    proof = await decision_outbox.get_proof(decision_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Decision not found")
+    if proof["proof"] is None:
+        raise HTTPException(status_code=409, detail="Decision has not been sealed into an anchor yet")
+    return DecisionProofResponse(**proof)
+
+# Accept header media types served as raw image bytes by /api/style/try-on
+_IMAGE_MEDIA_TYPES = {media_type: name for name, (_, media_type, _) in OUTPUT_FORMATS.items()}
+
+def _negotiate_image_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the preferred image output format from an Accept header.
+    Returns None when JSON should be returned (no header, */*, or JSON preferred).
+    image/* selects PNG unless a specific image type is preferred at least as much.
+    """
+    best, best_q = None, 0.0
+    json_q = wildcard_q = 0.0
+    for part in (accept or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        media_type, q = fields[0].lower(), 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in ("application/json", "*/*"):
+            json_q = max(json_q, q)
+        elif media_type == "image/*":
+            wildcard_q = max(wildcard_q, q)
+        elif media_type in _IMAGE_MEDIA_TYPES and q > best_q:
+            best, best_q = _IMAGE_MEDIA_TYPES[media_type], q
+    if wildcard_q > best_q:
+        best, best_q = "png", wildcard_q
+    return best if best_q > json_q else None
+
+@app.post(
+    "/api/style/try-on",
+    response_model=VirtualTryOnResponse,
+    responses={200: {"content": {media_type: {} for media_type in _IMAGE_MEDIA_TYPES}}}
+)
 async def virtual_try_on(
+    request: Request,
     person_image: UploadFile = File(...),
-    cloth_image: UploadFile = File(...)
+    cloth_image: Optional[UploadFile] = File(None),
+    garment_id: Optional[str] = Form(None),
+    quality: Optional[str] = Form(None)
 ):
     """
-    Perform virtual try-on using HR-VITON model
+    Perform virtual try-on using HR-VITON model.
+    The garment is either uploaded as cloth_image or referenced by a stored garment_id.
+    quality selects the output resolution: preview (256x192), standard (512x384) or high (1024x768).
+    Send Accept: image/png, image/webp, image/jpeg or image/* to receive the raw image bytes with
+    decision metadata in X-Decision-* headers instead of base64 JSON.
     """
+    vto = await _vto()
+    
     try:
         # Validate file types
         if not person_image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Person image must be an image file")
-        if not cloth_image.content_type.startswith('image/'):
+        if (cloth_image is None) == (garment_id is None):
+            raise HTTPException(status_code=400, detail="Provide exactly one of cloth_image or garment_id")
+        if cloth_image is not None and not cloth_image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Cloth image must be an image file")
+        try:
+            tier, _ = resolve_quality(quality)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Load images
-        person_img_data = await person_image.read()
-        cloth_img_data = await cloth_image.read()
+        output_format = _negotiate_image_format(request.headers.get("accept"))
         
-        person_img = Image.open(io.BytesIO(person_img_data)).convert('RGB')
-        cloth_img = Image.open(io.BytesIO(cloth_img_data)).convert('RGB')
+        # Load images
+        person_img_data = await _read_upload(person_image)
+        cloth_img_data = await _read_upload(cloth_image) if cloth_image is not None else None
         
         # Perform virtual try-on
         try:
-            result_image_b64, decision_hash = await perform_virtual_tryon(person_img, cloth_img)
+            # Identical inputs are served from the result cache
+            result_image_data, decision_hash = await vto.render_cached_virtual_tryon(
+                person_img_data, cloth_img_data, garment_id, output_format or "png", tier
+            )
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Unknown garment: {garment_id}")
+        except vto.ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         except Exception as vto_error:
             print(f"VTO Error: {vto_error}")
             raise HTTPException(status_code=500, detail=f"VTO processing failed: {str(vto_error)}")
         
-        # Log decision to Masumi (Cardano)
+        # Queue decision for Masumi (Cardano) logging without waiting on the API
         agent_id = "did:vestiai:vto-agent"
         try:
-            tx_hash = await log_agent_decision(agent_id, decision_hash)
-            transaction_hash = tx_hash if isinstance(tx_hash, str) else None
+            decision_id = await decision_outbox.enqueue(agent_id, decision_hash)
         except Exception as e:
-            print(f"Warning: Failed to log VTO decision: {e}")
-            transaction_hash = None
+            print(f"Warning: Failed to queue VTO decision: {e}")
+            decision_id = None
+        
+        if output_format is not None:
+            headers = {"X-Decision-Hash": decision_hash, "X-Resolution-Tier": tier}
+            if decision_id is not None:
+                headers["X-Decision-Id"] = decision_id
+            return Response(
+                content=result_image_data,
+                media_type=OUTPUT_FORMATS[output_format][1],
+                headers=headers
+            )
         
         return VirtualTryOnResponse(
             success=True,
-            result_image=result_image_b64,
+            result_image=base64.b64encode(result_image_data).decode('utf-8'),
             decision_hash=decision_hash,
-            transaction_hash=transaction_hash,
+            decision_id=decision_id,
+            quality=tier,
             message="Virtual try-on completed successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {str(e)}")
 
+class TryOnJobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: str
+    quality: str
+    image_format: str
+    decision_hash: Optional[str] = None
+    decision_id: Optional[str] = None
+    result_image: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+async def _run_tryon_job(inputs: dict, progress) -> dict:
+    """Render one queued try-on job, reporting stages, and queue its decision for Masumi"""
+    vto = await _vto()
+    
+    token = trace_id_var.set(inputs["trace_id"])
+    try:
+        try:
+            image_data, decision_hash = await vto.render_cached_virtual_tryon(
+                inputs["person"], inputs["cloth"], inputs["garment_id"],
+                inputs["image_format"], inputs["quality"], progress
+            )
+        except KeyError:
+            raise Exception(f"Unknown garment: {inputs['garment_id']}")
+        
+        agent_id = "did:vestiai:vto-agent"
+        try:
+            decision_id = await decision_outbox.enqueue(agent_id, decision_hash)
+        except Exception as e:
+            print(f"Warning: Failed to queue VTO decision: {e}")
+            decision_id = None
+        return {"image": image_data, "decision_hash": decision_hash, "decision_id": decision_id}
+    finally:
+        trace_id_var.reset(token)
+
+tryon_jobs = TryOnJobQueue(_run_tryon_job, budget=admission.budget)
+
+def _tryon_request_hash(inputs: dict) -> str:
+    """Fingerprint of a try-on submission, to tell an idempotent retry from a new request"""
+    digest = hashlib.sha256(f"{inputs['garment_id']}|{inputs['quality']}|{inputs['image_format']}".encode())
+    for part in (inputs["person"], inputs["cloth"] or b""):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+def _tryon_job_response(job: dict, include_result: bool = True) -> TryOnJobResponse:
+    return TryOnJobResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        stage=job["stage"],
+        quality=job["quality"],
+        image_format=job["image_format"],
+        decision_hash=job.get("decision_hash"),
+        decision_id=job.get("decision_id"),
+        result_image=base64.b64encode(job["image"]).decode('utf-8') if include_result and job["image"] else None,
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"]
+    )
+
+@app.post("/api/style/try-on-jobs", response_model=TryOnJobResponse, status_code=202)
+async def submit_try_on_job(
+    request: Request,
+    person_image: UploadFile = File(...),
+    cloth_image: Optional[UploadFile] = File(None),
+    garment_id: Optional[str] = Form(None),
+    quality: Optional[str] = Form(None),
+    image_format: str = Form("png"),
+    idempotency_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None)
+):
+    """
+    Queue a virtual try-on and return its job id without waiting for the result.
+    Takes the same inputs as /api/style/try-on. Poll GET /api/style/try-on-jobs/{job_id},
+    follow /api/style/try-on-jobs/{job_id}/events (server-sent events) or fetch the raw image
+    from /api/style/try-on-jobs/{job_id}/result. Retries carrying the same Idempotency-Key
+    header get the original job back instead of queueing the work again, unless it failed.
+    Keys are scoped to the client (X-Client-Id header, else the peer address); reusing one
+    with different inputs is a 422.
+    """
+    if not person_image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Person image must be an image file")
+    if (cloth_image is None) == (garment_id is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of cloth_image or garment_id")
+    if cloth_image is not None and not cloth_image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Cloth image must be an image file")
+    if image_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format: {image_format}")
+    try:
+        tier, _ = resolve_quality(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    inputs = {
+        "person": await _read_upload(person_image),
+        "cloth": await _read_upload(cloth_image) if cloth_image is not None else None,
+        "garment_id": garment_id,
+        "quality": tier,
+        "image_format": image_format,
+        "trace_id": current_trace_id(),
+    }
+    client = x_client_id or (request.client.host if request.client else "")
+    try:
+        job_id = await tryon_jobs.submit(
+            inputs, idempotency_key, client=client, request_hash=_tryon_request_hash(inputs),
+            input_bytes=len(inputs["person"]) + len(inputs["cloth"] or b""),
+            quality=tier, image_format=image_format
+        )
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return _tryon_job_response(tryon_jobs.get(job_id))
+
+@app.get("/api/style/try-on-jobs/stats")
+async def try_on_job_stats():
+    """
+    Queue depth, worker count, jobs per status and result bytes held by the try-on job store
+    """
+    return tryon_jobs.stats()
+
+@app.get("/api/style/try-on-jobs/{job_id}", response_model=TryOnJobResponse)
+async def get_try_on_job(job_id: str, include_result: bool = True):
+    """
+    Report a try-on job's status and current stage; once it has succeeded, the result image
+    is included as base64 (unless include_result=false)
+    """
+    job = tryon_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Try-on job not found")
+    return _tryon_job_response(job, include_result)
+
+@app.get(
+    "/api/style/try-on-jobs/{job_id}/result",
+    responses={200: {"content": {media_type: {} for media_type in _IMAGE_MEDIA_TYPES}}}
+)
+async def get_try_on_job_result(job_id: str):
+    """
+    Raw result image of a finished try-on job, with decision metadata in X-Decision-* headers
+    """
+    job = tryon_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Try-on job not found")
+    if job["status"] == TryOnJobQueue.FAILED:
+        raise HTTPException(status_code=409, detail=f"Try-on job failed: {job['error']}")
+    if job["status"] != TryOnJobQueue.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Try-on job is {job['status']}")
+    
+    headers = {"X-Decision-Hash": job["decision_hash"], "X-Resolution-Tier": job["quality"]}
+    if job["decision_id"] is not None:
+        headers["X-Decision-Id"] = job["decision_id"]
+    return Response(content=job["image"], media_type=OUTPUT_FORMATS[job["image_format"]][1], headers=headers)
+
+@app.get("/api/style/try-on-jobs/{job_id}/events")
+async def stream_try_on_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-sent events for a try-on job: one "stage" event per stage entered (queued, decode,
+    preprocess, inference, encode), then a final "result" event carrying the job with its
+    base64 image, or an "error" event. Reconnecting with Last-Event-ID resumes after that event.
+    """
+    if tryon_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Try-on job not found")
+    try:
+        start = int(last_event_id) + 1 if last_event_id is not None else 0
+    except ValueError:
+        start = 0
+    
+    async def stream():
+        async for item in tryon_jobs.follow(job_id, start):
+            if item is None:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            index, event = item
+            job = tryon_jobs.get(job_id)
+            if event["stage"] == TryOnJobQueue.SUCCEEDED and job is not None:
+                name, data = "result", _tryon_job_response(job).model_dump_json()
+            elif event["stage"] == TryOnJobQueue.FAILED:
+                name, data = "error", json.dumps({"job_id": job_id, "error": event.get("error")})
+            else:
+                name, data = "stage", json.dumps({"job_id": job_id, **event})
+            yield f"id: {index}\nevent: {name}\ndata: {data}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Upper bound on garments per /api/style/try-on-multi request
+MAX_MULTI_GARMENTS = int(os.getenv("VTO_MULTI_MAX_GARMENTS", "32"))
+
+@app.post("/api/style/try-on-multi")
+async def virtual_try_on_multi(
+    person_image: UploadFile = File(...),
+    cloth_images: List[UploadFile] = File([]),
+    garment_ids: List[str] = Form([]),
+    quality: Optional[str] = Form(None),
+    image_format: str = Form("png")
+):
+    """
+    Try many garments on one person image.
+    Garments are uploaded as cloth_images and/or referenced by stored garment_ids (repeat the
+    field per garment); uploads come first in result indices, then stored garments.
+    The person image is encoded once and the garments run as one batch. Results are streamed
+    as newline-delimited JSON (one MultiTryOnResult per line) in completion order.
+    """
+    vto = await _vto()
+    
+    if not person_image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Person image must be an image file")
+    garment_ids = [garment_id for garment_id in garment_ids if garment_id]
+    if not cloth_images and not garment_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one cloth image or garment id")
+    if len(cloth_images) + len(garment_ids) > MAX_MULTI_GARMENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MULTI_GARMENTS} garments per request")
+    if any(not cloth.content_type.startswith('image/') for cloth in cloth_images):
+        raise HTTPException(status_code=400, detail="Cloth images must be image files")
+    if image_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format: {image_format}")
+    try:
+        tier, _ = resolve_quality(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    person_img_data = await _read_upload(person_image)
+    garments = [(await _read_upload(cloth), None) for cloth in cloth_images] + [(None, garment_id) for garment_id in garment_ids]
+    
+    async def stream():
+        agent_id = "did:vestiai:vto-agent"
+        try:
+            async for result in vto.render_multi_virtual_tryon(person_img_data, garments, image_format, tier):
+                garment_id = garments[result["index"]][1]
+                if "error" in result:
+                    line = MultiTryOnResult(index=result["index"], garment_id=garment_id, success=False, error=result["error"])
+                else:
+                    # Queue each decision for Masumi (Cardano) logging without waiting on the API
+                    try:
+                        decision_id = await decision_outbox.enqueue(agent_id, result["decision_hash"])
+                    except Exception as e:
+                        print(f"Warning: Failed to queue VTO decision: {e}")
+                        decision_id = None
+                    line = MultiTryOnResult(
+                        index=result["index"],
+                        garment_id=garment_id,
+                        success=True,
+                        result_image=base64.b64encode(result["image"]).decode('utf-8'),
+                        decision_hash=result["decision_hash"],
+                        decision_id=decision_id,
+                        cached=result["cached"]
+                    )
+                yield line.model_dump_json() + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure as a final line
+            print(f"VTO Error: {e}")
+            yield json.dumps({"success": False, "error": f"Virtual try-on failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Resolution-Tier": tier})
+
+@app.get("/api/style/try-on/stats")
+async def try_on_scheduler_stats():
+    """
+    Queue depth and batch-size statistics of the try-on inference scheduler, per resolution tier
+    """
+    vto = await _vto()
+    return {tier: scheduler.stats() for tier, scheduler in vto.tryon_schedulers.items()}
+
+@app.get("/api/style/try-on/cache-stats")
+async def try_on_cache_stats():
+    """
+    Hit/miss counters and tier sizes of the try-on result cache and the person encoding cache
+    """
+    vto = await _vto()
+    return {**vto.tryon_cache.stats(), "person_encodings": vto.person_cache.stats()}
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """
+    Admission control per endpoint group: active and queued requests, admitted and shed
+    counts (by reason), plus in-flight upload bytes against the global budget
+    """
+    return admission.stats()
+
+@app.get("/api/ipfs/cache-stats")
+async def ipfs_cache_stats():
+    """
+    Hit/miss counters and tier sizes of the local CID cache
+    """
+    if ipfs_service.cache is None:
+        raise HTTPException(status_code=404, detail="IPFS cache is disabled")
+    return ipfs_service.cache.stats()
+
+@app.get("/api/ipfs/pins/{cid}", response_model=PinStatusResponse)
+async def get_pin_status(cid: str):
+    """
+    Report the background pin state of uploaded content.
+    status "mismatch" means a backend pinned the content under remote_cid instead; the content
+    is still served locally until the pin is resolved
+    """
+    status = await ipfs_service.get_pin_status(cid)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Pin not found")
+    return PinStatusResponse(**status)
+
+@app.post("/api/ipfs/pins/{cid}/resolve", response_model=PinStatusResponse)
+async def resolve_pin(cid: str, action: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    Settle a CID mismatch (ADMIN_TOKEN required): action=retry pins the content again,
+    action=discard drops the locally held copy and marks the pin failed
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Pin administration is disabled (ADMIN_TOKEN not set)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    try:
+        resolved = await ipfs_service.resolve_pin(cid, action)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resolved is None:
+        raise HTTPException(status_code=409, detail="Pin is not in the mismatch state")
+    return PinStatusResponse(**await ipfs_service.get_pin_status(cid))
+
+@app.get("/api/ipfs/pins")
+async def pin_queue_stats():
+    """
+    Counts of queued, in-flight, pinned, failed and mismatched background pins
+    """
+    if ipfs_service.pin_queue is None:
+        raise HTTPException(status_code=404, detail="Deferred pinning is disabled")
+    return await ipfs_service.pin_queue.stats()
+
+@app.get("/api/ipfs/backends")
+async def ipfs_backend_stats():
+    """
+    Latency EWMA and health of each IPFS backend, in current routing order
+    """
+    return {
+        "replicas": ipfs_service.router.replicas,
+        "min_replicas": ipfs_service.router.min_replicas,
+        "pin_order": [backend.name for backend in ipfs_service.router.ranked(pin=True)],
+        "fetch_order": [backend.name for backend in ipfs_service.router.ranked()],
+        "backends": ipfs_service.router.stats()
+    }
+
+def _scheduler_metrics():
+    """Try-on scheduler and result cache gauges, read from their stats at scrape time"""
+    vto = _vto_service
+    if vto is None:
+        # Nothing has been rendered yet; scraping should not load the model stack
+        return
+    yield "# TYPE vestiai_tryon_queue_depth gauge"
+    for tier, scheduler in vto.tryon_schedulers.items():
+        yield f'vestiai_tryon_queue_depth{{tier="{tier}"}} {scheduler.stats()["queue_depth"]}'
+    yield "# TYPE vestiai_tryon_batches_total counter"
+    for tier, scheduler in vto.tryon_schedulers.items():
+        yield f'vestiai_tryon_batches_total{{tier="{tier}"}} {scheduler.stats()["batches"]}'
+    cache = vto.tryon_cache.stats()
+    yield "# TYPE vestiai_tryon_cache_lookups_total counter"
+    for outcome in ("hits_memory", "hits_disk", "misses", "coalesced"):
+        yield f'vestiai_tryon_cache_lookups_total{{outcome="{outcome}"}} {cache[outcome]}'
+
+metrics.add_collector(_scheduler_metrics)
+
+@app.get("/api/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def readiness(response: Response):
+    """
+    Readiness probe: 503 until every startup component (stores, background workers and,
+    with VTO_PRELOAD, the warmed try-on model) is ready, so no request pays for a cold start
+    """
+    vto = _vto_service
+    inference = {}
+    if vto is not None:
+        from services.inference_service import weights_shared
+        inference = {
+            "inference": vto.inference_config.describe(),
+            "weights_shared": weights_shared(vto.inference_config),
+        }
+    state = startup.describe(inference)
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus text-format metrics: per-route request latency, per-stage latency
+    histograms and try-on scheduler/cache counters
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/admin/profile")
+async def capture_profile(
+    mode: str = "sampling",
+    seconds: float = 10.0,
+    row_limit: int = 50,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Capture a time-boxed profile of the running backend (ADMIN_TOKEN required).
+    mode=sampling returns folded stacks of all threads (for flamegraph tools);
+    mode=torch returns per-operator CPU time of the inference batches run during the window.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (ADMIN_TOKEN not set)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    try:
+        result = await profiler.profile(mode, seconds, row_limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if mode == "sampling":
+        return PlainTextResponse(result)
+    return result
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
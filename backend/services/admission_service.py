@@ -0,0 +1,296 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from services.metrics_service import metrics
+
+# Endpoint groups under admission control and the POST paths they cover
+ADMISSION_GROUPS = {
+    "tryon": ("/api/style/try-on", "/api/style/try-on-multi", "/api/style/try-on-jobs"),
+    "upload": ("/api/clothing/upload", "/api/clothing/upload-batch", "/api/garments/ingest"),
+}
+
+# group -> (concurrency, queue length, queue timeout ms, max body bytes)
+_DEFAULTS = {
+    "tryon": (4, 32, 10000, 20 * 1024 * 1024),
+    "upload": (16, 64, 5000, 100 * 1024 * 1024),
+}
+
+admission_admitted = metrics.counter("admission_admitted_total", "Requests admitted past admission control", ("group",))
+admission_shed = metrics.counter("admission_shed_total", "Requests rejected by admission control", ("group", "reason"))
+admission_queue_wait = metrics.histogram("admission_queue_wait_seconds", "Time admitted requests waited for a slot", ("group",))
+admission_active = metrics.gauge("admission_active_requests", "Admitted requests currently holding a slot", ("group",))
+admission_queued = metrics.gauge("admission_queued_requests", "Requests waiting for a slot", ("group",))
+admission_inflight_bytes = metrics.gauge("admission_inflight_bytes", "Request body bytes reserved by admitted requests")
+
+class AdmissionRejected(HTTPException):
+    """A request shed by admission control; 503s carry a Retry-After hint"""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after is not None else None
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.reason = reason
+
+class EndpointLimiter:
+    """
+    Concurrency limit for one endpoint group with a bounded FIFO wait queue.
+    A request that would wait longer than its deadline (judged from the moving average
+    service time) is rejected up front instead of timing out in the queue.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float, max_body_bytes: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.max_body_bytes = max_body_bytes
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Exponential moving average of how long an admitted request holds its slot
+        self._service_time: Optional[float] = None
+
+        self.admitted = 0
+        self.shed: Dict[str, int] = {}
+
+    def estimated_wait(self, position: int) -> float:
+        """Expected queueing delay for the waiter at position (0 = next in line)"""
+        if self._service_time is None:
+            return 0.0
+        return self._service_time * (position // self.concurrency + 1)
+
+    async def acquire(self, timeout: float):
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._admit(0.0)
+            self._publish()
+            return
+
+        position = len(self._waiters)
+        estimate = self.estimated_wait(position)
+        if position >= self.max_queue:
+            raise self._reject("queue_full", "Server busy, queue is full", estimate or self.queue_timeout)
+        if estimate > timeout:
+            raise self._reject("deadline", "Server busy, expected wait exceeds the deadline", estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._publish()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+                self._publish()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject("timeout", "Server busy, timed out waiting in queue", self.estimated_wait(len(self._waiters)))
+        self._admit(time.perf_counter() - started)
+
+    def release(self, service_time: Optional[float] = None):
+        if service_time is not None:
+            self._service_time = service_time if self._service_time is None else 0.8 * self._service_time + 0.2 * service_time
+        # Hand the slot straight to the next live waiter so arrivals cannot jump the queue
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "avg_service_ms": (self._service_time or 0.0) * 1000.0,
+        }
+
+    def _publish(self):
+        admission_active.set(self.active, self.name)
+        admission_queued.set(len(self._waiters), self.name)
+
+    def _admit(self, waited: float):
+        self.admitted += 1
+        admission_admitted.inc(self.name)
+        admission_queue_wait.observe(waited, self.name)
+
+    def _reject(self, reason: str, detail: str, retry_after: Optional[float] = None) -> AdmissionRejected:
+        self.record_shed(reason)
+        return AdmissionRejected(413 if reason == "too_large" else 503, reason, detail, retry_after)
+
+    def record_shed(self, reason: str):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        admission_shed.inc(self.name, reason)
+
+class ByteBudget:
+    """Global budget of request body bytes held by admitted requests"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.reserved = 0
+
+    def try_reserve(self, amount: int) -> bool:
+        if self.reserved + amount > self.capacity:
+            return False
+        self.reserved += amount
+        admission_inflight_bytes.set(self.reserved)
+        return True
+
+    def release(self, amount: int):
+        self.reserved -= amount
+        admission_inflight_bytes.set(self.reserved)
+
+class AdmissionController:
+    """
+    Admission limits for the expensive multipart endpoints: a concurrency limiter per
+    endpoint group and one in-flight byte budget shared by all of them
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.budget = ByteBudget(int(os.getenv("ADMISSION_MAX_INFLIGHT_BYTES", str(256 * 1024 * 1024))))
+        self.limiters: Dict[str, EndpointLimiter] = {}
+        self._routes: Dict[str, EndpointLimiter] = {}
+        for group, paths in ADMISSION_GROUPS.items():
+            concurrency, queue, timeout_ms, max_body = _DEFAULTS[group]
+            prefix = f"ADMISSION_{group.upper()}"
+            limiter = EndpointLimiter(
+                group,
+                concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+                max_queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+                queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_MS", str(timeout_ms))) / 1000.0,
+                max_body_bytes=int(os.getenv(f"{prefix}_MAX_BODY_BYTES", str(max_body))),
+            )
+            self.limiters[group] = limiter
+            for path in paths:
+                self._routes[path] = limiter
+
+    def limiter_for(self, scope) -> Optional[EndpointLimiter]:
+        if not self.enabled or scope["type"] != "http" or scope.get("method") != "POST":
+            return None
+        return self._routes.get(scope.get("path"))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "inflight_bytes": self.budget.reserved,
+            "max_inflight_bytes": self.budget.capacity,
+            "groups": {name: limiter.stats() for name, limiter in self.limiters.items()},
+        }
+
+# Admission state shared by every request in this worker
+admission = AdmissionController()
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying admission control before a guarded endpoint reads its body.
+    Requests wait for a group slot (bounded queue, deadline-aware 503 + Retry-After), and
+    admitted bodies count against the byte budget: declared Content-Length up front, chunked
+    bodies as they stream. Bodies over the group limit get a 413 before they are read.
+    Clients may tighten the queue deadline with X-Request-Deadline-Ms.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.controller.limiter_for(scope)
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        budget = self.controller.budget
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        content_length, timeout = _parse_headers(headers, limiter.queue_timeout)
+
+        try:
+            if content_length is not None and content_length > min(limiter.max_body_bytes, budget.capacity):
+                limiter.record_shed("too_large")
+                raise AdmissionRejected(413, "too_large", f"Request body exceeds {limiter.max_body_bytes} bytes")
+            await limiter.acquire(timeout)
+        except AdmissionRejected as e:
+            return await _send_rejection(e, scope, receive, send)
+
+        started = time.perf_counter()
+        service_time = None
+        reserved = 0
+        received = 0
+        response_started = False
+        # Set when the body is rejected mid-stream; the app may turn that into a response itself
+        shed = False
+
+        async def receive_limited():
+            nonlocal reserved, received, shed
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limiter.max_body_bytes:
+                    shed = True
+                    limiter.record_shed("too_large")
+                    raise AdmissionRejected(413, "too_large", f"Request body exceeds {limiter.max_body_bytes} bytes")
+                if received > reserved:
+                    # Chunked or understated body: grow the reservation as it streams
+                    if not budget.try_reserve(received - reserved):
+                        shed = True
+                        limiter.record_shed("memory")
+                        raise AdmissionRejected(503, "memory", "Server busy, too much upload data in flight", limiter.estimated_wait(0))
+                    reserved = received
+            return message
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            if content_length:
+                if not budget.try_reserve(content_length):
+                    limiter.record_shed("memory")
+                    raise AdmissionRejected(503, "memory", "Server busy, too much upload data in flight", limiter.estimated_wait(0))
+                reserved = content_length
+            await self.app(scope, receive_limited, send_tracking)
+            # Only requests that ran to completion say how long a slot is held
+            if not shed:
+                service_time = time.perf_counter() - started
+        except AdmissionRejected as e:
+            if response_started:
+                raise
+            await _send_rejection(e, scope, receive, send)
+        finally:
+            budget.release(reserved)
+            limiter.release(service_time)
+
+def _parse_headers(headers: Dict[str, str], queue_timeout: float) -> Tuple[Optional[int], float]:
+    try:
+        content_length = int(headers["content-length"])
+    except (KeyError, ValueError):
+        content_length = None
+    try:
+        deadline = float(headers["x-request-deadline-ms"]) / 1000.0
+        timeout = max(0.0, min(queue_timeout, deadline))
+    except (KeyError, ValueError):
+        timeout = queue_timeout
+    return content_length, timeout
+
+async def _send_rejection(error: AdmissionRejected, scope, receive, send):
+    response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers=error.headers)
+    await response(scope, receive, send)
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+class TieredResultCache:
+    """
+    Two-tier content-addressed byte cache.
+    A bounded in-memory LRU sits in front of an on-disk directory with size-based LRU eviction.
+    Concurrent lookups of the same missing key share a single computation (single-flight).
+    """
+
+    def __init__(self, directory: Optional[str], memory_items: int = 256,
+                 memory_bytes: int = 256 * 1024 * 1024, disk_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_index: Optional["OrderedDict[str, int]"] = None
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions_memory = 0
+        self.evictions_disk = 0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the cached value for key, computing and storing it once on a miss"""
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits_memory += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.create_task(self._load_or_compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def computing(self, key: str) -> bool:
+        """Whether a computation for key is in flight"""
+        return key in self._inflight
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look a key up in both tiers without computing it; counted in the hit/miss stats"""
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits_memory += 1
+            return value
+        if self.directory:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self.hits_disk += 1
+                self._memory_put(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: bytes):
+        """Write a value through to both tiers"""
+        self._memory_put(key, value)
+        if self.directory:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.hits_memory + self.hits_disk + self.misses + self.coalesced
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": ((lookups - self.misses) / lookups) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_items": len(self._disk_index or ()),
+            "disk_bytes": self._disk_size,
+            "evictions_memory": self.evictions_memory,
+            "evictions_disk": self.evictions_disk,
+            "inflight": len(self._inflight),
+        }
+
+    async def _load_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        if self.directory:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self.hits_disk += 1
+                self._memory_put(key, value)
+                return value
+
+        self.misses += 1
+        value = await compute()
+        await self._store(key, value)
+        return value
+
+    async def _store(self, key: str, value: bytes):
+        """Hook used to save freshly computed values (subclasses may validate first)"""
+        await self.put(key, value)
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: bytes):
+        if len(value) > self.memory_bytes or self.memory_items <= 0:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = value
+        self._memory_size += len(value)
+        while len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.evictions_memory += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_index(self):
+        # Rebuild the LRU order from file mtimes (touched on every hit)
+        entries = []
+        os.makedirs(self.directory, exist_ok=True)
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((name, size) for _, name, size in entries)
+        self._disk_size = sum(size for _, _, size in entries)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        with self._disk_lock:
+            if self._disk_index is None:
+                self._load_disk_index()
+            if key not in self._disk_index:
+                return None
+            self._disk_index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            with self._disk_lock:
+                size = self._disk_index.pop(key, 0)
+                self._disk_size -= size
+            return None
+
+    def _disk_put(self, key: str, value: bytes):
+        if len(value) > self.disk_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        with self._disk_lock:
+            if self._disk_index is None:
+                self._load_disk_index()
+            self._disk_size -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(value)
+            self._disk_size += len(value)
+            while self._disk_size > self.disk_bytes and self._disk_index:
+                evicted, size = self._disk_index.popitem(last=False)
+                self._disk_size -= size
+                self.evictions_disk += 1
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
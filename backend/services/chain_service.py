@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.http_service import HTTPClientRegistry, http_registry
+
+class ChainView:
+    """
+    Cached, non-blocking view of the Cardano chain through the Blockfrost HTTP API.
+    Protocol parameters and the chain tip are held for a TTL; per-address UTxO sets are loaded
+    once and then rolled forward from the transactions seen since, instead of being re-queried.
+    """
+
+    def __init__(self, http: Optional[HTTPClientRegistry] = None):
+        self.http = http or http_registry
+        self.base_url = os.getenv("BLOCKFROST_URL", "https://cardano-preprod.blockfrost.io/api/v0").rstrip("/")
+        self.project_id = os.getenv("BLOCKFROST_PROJECT_ID", "preprodKrJccVpvpXyMC6bPCkMQlPRpyCOWUyb2")
+        self.params_ttl = float(os.getenv("CHAIN_PARAMS_TTL", "600"))
+        self.tip_ttl = float(os.getenv("CHAIN_TIP_TTL", "20"))
+        self.page_size = 100
+
+        # name -> (expires_at, value)
+        self._ttl_cache: Dict[str, Tuple[float, Any]] = {}
+        self._ttl_locks: Dict[str, asyncio.Lock] = {}
+        # address -> {"height": int, "utxos": {(tx_hash, output_index): entry}}
+        self._utxo_views: Dict[str, Dict[str, Any]] = {}
+        self._utxo_locks: Dict[str, asyncio.Lock] = {}
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.utxo_full_loads = 0
+        self.utxo_incremental_updates = 0
+
+    async def protocol_parameters(self) -> Dict[str, Any]:
+        """Current epoch's protocol parameters"""
+        return await self._cached("params", self.params_ttl, lambda: self._get("/epochs/latest/parameters"))
+
+    async def tip(self) -> Dict[str, Any]:
+        """Latest block (hash, height, slot, epoch)"""
+        return await self._cached("tip", self.tip_ttl, lambda: self._get("/blocks/latest"))
+
+    async def utxos(self, address: str) -> List[Dict[str, Any]]:
+        """
+        Unspent outputs at an address as of the current tip.
+        The first call loads the full set; later calls only apply transactions from new blocks.
+        """
+        lock = self._utxo_locks.setdefault(address, asyncio.Lock())
+        async with lock:
+            height = (await self.tip())["height"]
+            view = self._utxo_views.get(address)
+            if view is None:
+                view = {"height": height, "utxos": await self._load_utxos(address)}
+                self._utxo_views[address] = view
+                self.utxo_full_loads += 1
+            elif height > view["height"]:
+                await self._roll_forward(address, view, height)
+                self.utxo_incremental_updates += 1
+            return list(view["utxos"].values())
+
+    async def asset_units(self, address: str) -> Set[str]:
+        """Asset units (policy id + hex asset name) currently held at an address"""
+        return {amount["unit"] for utxo in await self.utxos(address) for amount in utxo["amount"]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "utxo_addresses": len(self._utxo_views),
+            "utxo_full_loads": self.utxo_full_loads,
+            "utxo_incremental_updates": self.utxo_incremental_updates,
+        }
+
+    async def _cached(self, name: str, ttl: float, fetch):
+        entry = self._ttl_cache.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            self.cache_hits += 1
+            return entry[1]
+        # One refresh at a time; waiters reuse its result
+        lock = self._ttl_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            entry = self._ttl_cache.get(name)
+            if entry is not None and entry[0] > time.monotonic():
+                self.cache_hits += 1
+                return entry[1]
+            value = await fetch()
+            self._ttl_cache[name] = (time.monotonic() + ttl, value)
+            return value
+
+    async def _load_utxos(self, address: str) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        utxos = {}
+        page = 1
+        while True:
+            entries = await self._get(f"/addresses/{address}/utxos", {"page": page, "count": self.page_size}, missing=[])
+            for entry in entries:
+                utxos[(entry["tx_hash"], entry["output_index"])] = entry
+            if len(entries) < self.page_size:
+                return utxos
+            page += 1
+
+    async def _roll_forward(self, address: str, view: Dict[str, Any], height: int):
+        page = 1
+        while True:
+            transactions = await self._get(
+                f"/addresses/{address}/transactions",
+                {"from": str(view["height"] + 1), "to": str(height), "page": page, "count": self.page_size},
+                missing=[]
+            )
+            for transaction in transactions:
+                detail = await self._get(f"/txs/{transaction['tx_hash']}/utxos")
+                for spent in detail.get("inputs", []):
+                    if spent.get("address") == address:
+                        view["utxos"].pop((spent["tx_hash"], spent["output_index"]), None)
+                for output in detail.get("outputs", []):
+                    if output.get("address") == address:
+                        view["utxos"][(detail["hash"], output["output_index"])] = {
+                            "tx_hash": detail["hash"],
+                            "output_index": output["output_index"],
+                            "amount": output["amount"],
+                            "address": address,
+                        }
+            if len(transactions) < self.page_size:
+                break
+            page += 1
+        view["height"] = height
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None, missing: Any = None):
+        self.requests += 1
+        response = await self.http.request(
+            "blockfrost", "GET", f"{self.base_url}{path}",
+            params=params, headers={"project_id": self.project_id}
+        )
+        if response.status_code == 404 and missing is not None:
+            # Blockfrost answers 404 for addresses it has never seen
+            return missing
+        if response.status_code != 200:
+            raise Exception(f"Blockfrost API error: {response.status_code} - {response.text}")
+        return response.json()
+
+# Shared chain view used by the minting service
+chain_view = ChainView()
@@ -0,0 +1,167 @@
+import base64
+import hashlib
+from typing import List, Optional, Tuple
+
+# Defaults of `ipfs add`: fixed-size 256 KiB chunks, balanced DAG with at most 174 links per node
+DEFAULT_CHUNK_SIZE = 262144
+DEFAULT_MAX_LINKS = 174
+
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_SHA2_256 = 0x12
+_CODEC_DAG_PB = 0x70
+_CODEC_RAW = 0x55
+_UNIXFS_FILE = 2
+
+def compute_cid(data: bytes, cid_version: int = 0, raw_leaves: Optional[bool] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, max_links: int = DEFAULT_MAX_LINKS) -> str:
+    """
+    Compute the CID `ipfs add` assigns to data (UnixFS file, sha2-256 multihash).
+    CIDv0 uses dag-pb leaves; CIDv1 defaults to raw leaves, as kubo does.
+    """
+    if raw_leaves is None:
+        raw_leaves = cid_version == 1
+    if raw_leaves and cid_version == 0:
+        raise ValueError("Raw leaves require CIDv1")
+
+    view = memoryview(data)
+    # Each node is (cid bytes, file size, cumulative serialized size)
+    nodes: List[Tuple[bytes, int, int]] = []
+    for offset in range(0, max(len(view), 1), chunk_size):
+        chunk = view[offset:offset + chunk_size]
+        if raw_leaves:
+            nodes.append((_cid_bytes(cid_version, _CODEC_RAW, bytes(chunk)), len(chunk), len(chunk)))
+        else:
+            block = _pb_node([], _unixfs_data(chunk, len(chunk), [], include_data=len(chunk) > 0))
+            nodes.append((_cid_bytes(cid_version, _CODEC_DAG_PB, block), len(chunk), len(block)))
+
+    while len(nodes) > 1:
+        parents = []
+        for start in range(0, len(nodes), max_links):
+            children = nodes[start:start + max_links]
+            file_size = sum(child[1] for child in children)
+            block = _pb_node(
+                [(cid, tsize) for cid, _, tsize in children],
+                _unixfs_data(b"", file_size, [child[1] for child in children], include_data=False)
+            )
+            tsize = len(block) + sum(child[2] for child in children)
+            parents.append((_cid_bytes(cid_version, _CODEC_DAG_PB, block), file_size, tsize))
+        nodes = parents
+
+    return encode_cid(nodes[0][0])
+
+def verify_cid(cid: str, data: bytes) -> bool:
+    """
+    Check that data is the UnixFS file content addressed by cid.
+    Supports CIDv0, CIDv1 dag-pb with raw leaves, and single-block CIDv1 raw; other CIDs fail.
+    """
+    try:
+        version, codec = _parse_cid(cid)
+    except ValueError:
+        return False
+    if version == 0:
+        return compute_cid(data, 0) == cid
+    if codec == _CODEC_RAW:
+        return encode_cid(_cid_bytes(1, _CODEC_RAW, bytes(data))) == cid
+    return compute_cid(data, 1, raw_leaves=True) == cid
+
+def is_valid_cid(cid: str) -> bool:
+    """True if cid is a syntactically valid CIDv0/CIDv1 string this module can handle"""
+    try:
+        _parse_cid(cid)
+        return True
+    except ValueError:
+        return False
+
+def encode_cid(cid: bytes) -> str:
+    """Render binary CID bytes in their canonical string form (base58btc v0, base32 v1)"""
+    if cid[:2] == bytes([_SHA2_256, 32]):
+        return _base58_encode(cid)
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+def _cid_bytes(version: int, codec: int, block: bytes) -> bytes:
+    multihash = bytes([_SHA2_256, 32]) + hashlib.sha256(block).digest()
+    if version == 0:
+        return multihash
+    return _varint(1) + _varint(codec) + multihash
+
+def _parse_cid(cid: str) -> Tuple[int, int]:
+    if len(cid) == 46 and cid.startswith("Qm"):
+        raw = _base58_decode(cid)
+        if raw[:2] != bytes([_SHA2_256, 32]) or len(raw) != 34:
+            raise ValueError("Invalid CIDv0")
+        return 0, _CODEC_DAG_PB
+    if cid.startswith("b") and cid[1:].isalnum():
+        encoded = cid[1:].upper()
+        raw = base64.b32decode(encoded + "=" * (-len(encoded) % 8))
+        version, offset = _read_varint(raw, 0)
+        codec, offset = _read_varint(raw, offset)
+        if version != 1 or codec not in (_CODEC_DAG_PB, _CODEC_RAW) or raw[offset:offset + 2] != bytes([_SHA2_256, 32]):
+            raise ValueError("Unsupported CIDv1")
+        return 1, codec
+    raise ValueError(f"Unsupported CID: {cid}")
+
+def _unixfs_data(data: bytes, file_size: int, block_sizes: List[int], include_data: bool) -> bytes:
+    out = bytearray(_field_varint(1, _UNIXFS_FILE))
+    if include_data:
+        out += _field_bytes(2, data)
+    out += _field_varint(3, file_size)
+    for size in block_sizes:
+        out += _field_varint(4, size)
+    return bytes(out)
+
+def _pb_node(links: List[Tuple[bytes, int]], data: bytes) -> bytes:
+    # dag-pb canonical form: Links (field 2) before Data (field 1)
+    out = bytearray()
+    for cid, tsize in links:
+        link = _field_bytes(1, cid) + _field_bytes(2, b"") + _field_varint(3, tsize)
+        out += _field_bytes(2, link)
+    out += _field_bytes(1, data)
+    return bytes(out)
+
+def _field_varint(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+def _field_bytes(number: int, value: bytes) -> bytes:
+    return _varint((number << 3) | 2) + _varint(len(value)) + bytes(value)
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while offset < len(data):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+    raise ValueError("Truncated varint")
+
+def _base58_encode(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    out = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        out = _BASE58_ALPHABET[remainder] + out
+    leading = len(data) - len(data.lstrip(b"\0"))
+    return "1" * leading + out
+
+def _base58_decode(text: str) -> bytes:
+    number = 0
+    for char in text:
+        index = _BASE58_ALPHABET.find(char)
+        if index < 0:
+            raise ValueError("Invalid base58 character")
+        number = number * 58 + index
+    leading = len(text) - len(text.lstrip("1"))
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big") if number else b""
+    return b"\0" * leading + body
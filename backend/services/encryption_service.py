@@ -1,19 +1,95 @@
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
+from collections import OrderedDict
+from typing import Dict, List, Optional
 import os
 import base64
+import hashlib
 import json
+import struct
+import threading
+import time
+
+# Binary envelope layout (version 1):
+#   header:  MAGIC (4) | version (1) | chunk_size u32 (4) | nonce_prefix (7)
+#   body:    AES-256-GCM STREAM chunks, each chunk_size plaintext bytes + 16 byte tag
+# The plaintext stream is a u32 length-prefixed JSON metadata block followed by
+# the raw image bytes. Chunk nonces are nonce_prefix | counter u32 | last flag,
+# so reordered or truncated chunks fail authentication.
+ENVELOPE_MAGIC = b"VSTE"
+ENVELOPE_VERSION = 1
+_HEADER = struct.Struct(">4sBI7s")
+_META_LEN = struct.Struct(">I")
+_TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+class KEKCache:
+    """Bounded, TTL-evicted in-process cache of derived key-encryption keys"""
+
+    def __init__(self, max_entries: int = 16, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kek_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(kek_id)
+            if entry is None:
+                return None
+            key, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[kek_id]
+                return None
+            self._entries.move_to_end(kek_id)
+            return key
+
+    def put(self, kek_id: str, key: bytes):
+        with self._lock:
+            self._entries[kek_id] = (key, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(kek_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
 class EncryptionService:
     def __init__(self):
         # In production, retrieve from secure key management service
         self.master_key = os.getenv("ENCRYPTION_MASTER_KEY", "your-secure-master-key-here")
-    
+        self.chunk_size = int(os.getenv("ENCRYPTION_CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+
+        # Envelope key management: per-item data keys are wrapped by a KEK derived from the
+        # master key. Derivation costs a full PBKDF2 run, so KEKs are cached per id.
+        self.active_kek_id = os.getenv("ENCRYPTION_KEK_ID", "kek-v1")
+        self.kek_cache_size = int(os.getenv("ENCRYPTION_KEK_CACHE_SIZE", "16"))
+        self.kek_ttl = float(os.getenv("ENCRYPTION_KEK_TTL", "3600"))
+        self._init_kek_cache()
+
+    def _init_kek_cache(self):
+        self._kek_cache = KEKCache(self.kek_cache_size, self.kek_ttl)
+        self._kek_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Cached KEKs and locks stay in this process when the service is sent to a process pool
+        state = self.__dict__.copy()
+        del state["_kek_cache"]
+        del state["_kek_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_kek_cache()
+
     def _generate_key(self):
         """Generate a new encryption key"""
-        return Fernet.generate_key()
-    
+        return AESGCM.generate_key(bit_length=256)
+
     def _derive_key_from_password(self, password: str, salt: bytes):
         """Derive encryption key from password and salt"""
         kdf = PBKDF2HMAC(
@@ -23,27 +99,175 @@ class EncryptionService:
             iterations=100000,
         )
         return base64.urlsafe_b64encode(kdf.derive(password.encode()))
-    
+
+    def _get_kek(self, kek_id: str) -> bytes:
+        """Return the key-encryption key for kek_id, deriving it at most once per TTL"""
+        kek = self._kek_cache.get(kek_id)
+        if kek is not None:
+            return kek
+        with self._kek_lock:
+            kek = self._kek_cache.get(kek_id)
+            if kek is None:
+                salt = hashlib.sha256(f"vestiai-kek:{kek_id}".encode()).digest()
+                kek = base64.urlsafe_b64decode(self._derive_key_from_password(self.master_key, salt))
+                self._kek_cache.put(kek_id, kek)
+            return kek
+
+    def warm_kek(self, kek_id: Optional[str] = None):
+        """Derive and cache a KEK ahead of the first request"""
+        self._get_kek(kek_id or self.active_kek_id)
+
+    def wrap_key(self, data_key: bytes, kek_id: Optional[str] = None) -> str:
+        """Wrap a per-item data key (RFC 3394) as "<kek_id>$<base64 wrapped key>" """
+        return self.wrap_keys([data_key], kek_id)[0]
+
+    def unwrap_key(self, wrapped_key: str) -> bytes:
+        """Recover a per-item data key from its wrapped form"""
+        return self.unwrap_keys([wrapped_key])[0]
+
+    def wrap_keys(self, data_keys: List[bytes], kek_id: Optional[str] = None) -> List[str]:
+        """Wrap many data keys under one KEK, deriving it once"""
+        kek_id = kek_id or self.active_kek_id
+        kek = self._get_kek(kek_id)
+        return [
+            f"{kek_id}${base64.urlsafe_b64encode(aes_key_wrap(kek, data_key)).decode()}"
+            for data_key in data_keys
+        ]
+
+    def unwrap_keys(self, wrapped_keys: List[str]) -> List[bytes]:
+        """Unwrap many data keys, deriving each distinct KEK once"""
+        keks: Dict[str, bytes] = {}
+        data_keys = []
+        for wrapped_key in wrapped_keys:
+            kek_id, _, wrapped = wrapped_key.partition("$")
+            if not wrapped:
+                raise ValueError("Wrapped key is missing its KEK id")
+            if kek_id not in keks:
+                keks[kek_id] = self._get_kek(kek_id)
+            data_keys.append(aes_key_unwrap(keks[kek_id], base64.urlsafe_b64decode(wrapped.encode())))
+        return data_keys
+
+    def rewrap_keys(self, wrapped_keys: List[str], kek_id: Optional[str] = None) -> List[str]:
+        """Re-wrap data keys under another KEK (key rotation); the data itself is untouched"""
+        return self.wrap_keys(self.unwrap_keys(wrapped_keys), kek_id)
+
     def encrypt_data(self, data_package: dict):
         """
-        Encrypt data package using AES-256 (Fernet)
+        Encrypt data package into a versioned binary envelope (AES-256-GCM stream).
+        The raw "image" bytes are sealed as-is; the remaining keys form the metadata header.
         Returns: (encrypted_data, decryption_key)
         """
-        # Generate unique key for this upload
         encryption_key = self._generate_key()
-        fernet = Fernet(encryption_key)
-        
-        # Serialize and encrypt data
-        json_data = json.dumps(data_package).encode()
-        encrypted_data = fernet.encrypt(json_data)
-        
+
+        image_data = data_package.get("image") or b""
+        header_fields = {k: v for k, v in data_package.items() if k != "image"}
+        meta_json = json.dumps(header_fields).encode()
+
+        encrypted_data = self._seal_stream(
+            encryption_key,
+            [_META_LEN.pack(len(meta_json)) + meta_json, image_data]
+        )
+
         # Return encrypted data and base64 encoded key
         return encrypted_data, base64.urlsafe_b64encode(encryption_key).decode()
-    
+
+    def encrypt_image(self, image_data: bytes, fields: dict):
+        """
+        Encrypt raw image bytes with metadata fields (buffer-first form of encrypt_data,
+        used when the image is handed over through the executor layer)
+        Returns: (encrypted_data, decryption_key)
+        """
+        return self.encrypt_data({**fields, "image": image_data})
+
     def decrypt_data(self, encrypted_data: bytes, decryption_key: str):
-        """Decrypt data using provided key"""
+        """
+        Decrypt data using provided key.
+        Accepts binary envelopes and legacy Fernet blobs; "image" is returned as raw bytes.
+        """
         key = base64.urlsafe_b64decode(decryption_key.encode())
+
+        if bytes(encrypted_data[:len(ENVELOPE_MAGIC)]) != ENVELOPE_MAGIC:
+            return self._decrypt_legacy(encrypted_data, key)
+
+        plaintext = self._open_stream(key, encrypted_data)
+        (meta_len,) = _META_LEN.unpack_from(plaintext, 0)
+        meta_end = _META_LEN.size + meta_len
+        data_package = json.loads(bytes(plaintext[_META_LEN.size:meta_end]).decode())
+        data_package["image"] = bytes(plaintext[meta_end:])
+        return data_package
+
+    def decrypt_with_wrapped_key(self, encrypted_data: bytes, wrapped_key: str):
+        """Decrypt data using a server-side wrapped data key"""
+        data_key = self.unwrap_key(wrapped_key)
+        return self.decrypt_data(encrypted_data, base64.urlsafe_b64encode(data_key).decode())
+
+    def _decrypt_legacy(self, encrypted_data: bytes, key: bytes):
+        """Decrypt a pre-envelope Fernet blob holding a hex-encoded JSON package"""
         fernet = Fernet(key)
-        
-        decrypted_data = fernet.decrypt(encrypted_data)
-        return json.loads(decrypted_data.decode())
\ No newline at end of file
+
+        decrypted_data = fernet.decrypt(bytes(encrypted_data))
+        data_package = json.loads(decrypted_data.decode())
+        if isinstance(data_package.get("image"), str):
+            data_package["image"] = bytes.fromhex(data_package["image"])
+        return data_package
+
+    def _seal_stream(self, key: bytes, parts) -> bytes:
+        """Encrypt the concatenation of parts as a chunked AEAD stream"""
+        aesgcm = AESGCM(key)
+        nonce_prefix = os.urandom(7)
+        header = _HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, self.chunk_size, nonce_prefix)
+
+        out = [header]
+        for counter, chunk, last in _iter_chunks(parts, self.chunk_size):
+            nonce = nonce_prefix + struct.pack(">IB", counter, last)
+            out.append(aesgcm.encrypt(nonce, chunk, header))
+        return b"".join(out)
+
+    def _open_stream(self, key: bytes, encrypted_data: bytes) -> bytearray:
+        """Decrypt and authenticate a chunked AEAD stream produced by _seal_stream"""
+        view = memoryview(encrypted_data)
+        if len(view) < _HEADER.size:
+            raise ValueError("Encrypted envelope is truncated")
+
+        magic, version, chunk_size, nonce_prefix = _HEADER.unpack_from(view, 0)
+        if version != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version: {version}")
+
+        header = bytes(view[:_HEADER.size])
+        aesgcm = AESGCM(key)
+        sealed_size = chunk_size + _TAG_SIZE
+        plaintext = bytearray()
+
+        offset = _HEADER.size
+        counter = 0
+        while True:
+            sealed = view[offset:offset + sealed_size]
+            offset += len(sealed)
+            last = offset >= len(view)
+            nonce = nonce_prefix + struct.pack(">IB", counter, last)
+            plaintext += aesgcm.decrypt(nonce, bytes(sealed), header)
+            if last:
+                return plaintext
+            counter += 1
+
+def _iter_chunks(parts, chunk_size: int):
+    """Yield (counter, chunk, last) over the concatenation of parts without joining them"""
+    total = sum(len(part) for part in parts)
+    pending = bytearray()
+    counter = 0
+    emitted = 0
+
+    for part in parts:
+        view = memoryview(part)
+        while len(view):
+            take = chunk_size - len(pending)
+            pending += view[:take]
+            view = view[take:]
+            if len(pending) == chunk_size:
+                emitted += chunk_size
+                yield counter, bytes(pending), emitted == total
+                pending.clear()
+                counter += 1
+
+    if pending or total == 0 or emitted != total:
+        yield counter, bytes(pending), True
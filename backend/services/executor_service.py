@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict
+
+# Stage types and their default pool kinds. Thread pools are the default because PIL,
+# torch and cryptography release the GIL in their hot loops; process pools can be
+# selected per stage when pure-Python overhead dominates.
+STAGES = {
+    "image": "thread",   # decode, preprocess, postprocess, PNG/base64 encode
+    "crypto": "thread",  # envelope encryption
+}
+
+class StageExecutors:
+    """
+    Configurable executor layer for CPU-bound request stages.
+    Each stage type gets its own thread or process pool so heavy work never runs on the event loop.
+    Configure with EXECUTOR_<STAGE>_KIND (thread|process) and EXECUTOR_<STAGE>_WORKERS.
+    """
+
+    def __init__(self):
+        self.start_method = os.getenv("EXECUTOR_START_METHOD", "spawn")
+        self.config = {}
+        for stage, default_kind in STAGES.items():
+            kind = os.getenv(f"EXECUTOR_{stage.upper()}_KIND", default_kind).lower()
+            if kind not in ("thread", "process"):
+                raise ValueError(f"Invalid executor kind for stage '{stage}': {kind}")
+            workers = int(os.getenv(f"EXECUTOR_{stage.upper()}_WORKERS", str(min(4, os.cpu_count() or 1))))
+            self.config[stage] = (kind, workers)
+
+        self._pools: Dict[str, Executor] = {}
+
+    def start(self):
+        """Create all stage pools up front (called from the app lifespan)"""
+        for stage in self.config:
+            self._pool(stage)
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        self._pools = {}
+
+    def is_process(self, stage: str) -> bool:
+        return self.config[stage][0] == "process"
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool for the given stage"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(stage), functools.partial(fn, *args, **kwargs))
+
+    async def run_buffer(self, stage: str, fn: Callable, buffer: bytes, *args, **kwargs) -> Any:
+        """
+        Run fn(buffer, *args, **kwargs) on the stage pool.
+        For process pools the buffer is handed over through shared memory instead of being pickled;
+        fn then receives a read-only memoryview that is only valid for the duration of the call.
+        """
+        if not self.is_process(stage):
+            return await self.run(stage, fn, buffer, *args, **kwargs)
+
+        size = len(buffer)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            shm.buf[:size] = buffer
+            return await self.run(stage, _call_with_shared_buffer, shm.name, size, fn, args, kwargs)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _pool(self, stage: str) -> Executor:
+        pool = self._pools.get(stage)
+        if pool is None:
+            kind, workers = self.config[stage]
+            if kind == "process":
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-stage")
+            self._pools[stage] = pool
+        return pool
+
+def _call_with_shared_buffer(name: str, size: int, fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    """Worker-side trampoline: attach to the parent's shared memory block and call fn on it"""
+    # Pool workers share the parent's resource tracker, so the parent's unlink cleans up
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size].toreadonly()
+    try:
+        return fn(view, *args, **kwargs)
+    finally:
+        view.release()
+        shm.close()
+
+# Shared executor layer used by request handlers and services
+stage_executors = StageExecutors()
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import tempfile
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_GARMENT_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+class GarmentFeatureStore:
+    """
+    On-disk store of precomputed garment inputs, one .npy array per garment and resolution.
+    Arrays are opened memory-mapped, so repeated try-ons page the data in from the OS cache
+    instead of re-decoding and re-normalising the cloth image. Ingested catalog garments also
+    keep their original image, for resolutions above the stored tiers.
+    A JSON sidecar per garment records the content digest of its arrays and where the
+    garment came from (upload or ingest); it is written last, once all arrays are in place.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("GARMENT_STORE_DIR", "data/garments")
+
+    def put(self, garment_id: str, features: np.ndarray, size: Tuple[int, int]):
+        """Persist a garment's feature array atomically"""
+        path = self._path(garment_id, size)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(features, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def get(self, garment_id: str, size: Tuple[int, int]) -> Optional[np.ndarray]:
+        """Open a garment's feature array read-only and memory-mapped, or None if unknown"""
+        path = self._path(garment_id, size)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def contains(self, garment_id: str, size: Tuple[int, int]) -> bool:
+        return os.path.exists(self._path(garment_id, size))
+
+    def sizes(self, garment_id: str) -> List[Tuple[int, int]]:
+        """Resolutions stored for a garment"""
+        prefix = os.path.basename(self._meta_path(garment_id))[:-len(".json")] + "."
+        sizes = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return sizes
+        for name in names:
+            if name.startswith(prefix) and name.endswith(".npy"):
+                height, width = name[len(prefix):-len(".npy")].split("x")
+                sizes.append((int(height), int(width)))
+        return sorted(sizes)
+
+    def remove_sizes(self, garment_id: str, sizes: Iterable[Tuple[int, int]]):
+        for size in sizes:
+            try:
+                os.remove(self._path(garment_id, size))
+            except FileNotFoundError:
+                pass
+
+    def put_image(self, garment_id: str, image_data: bytes):
+        """Atomically store a garment's original image bytes"""
+        path = self._image_path(garment_id)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(image_data)
+        os.replace(tmp_path, path)
+
+    def get_image(self, garment_id: str) -> Optional[bytes]:
+        try:
+            with open(self._image_path(garment_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def remove_image(self, garment_id: str):
+        try:
+            os.remove(self._image_path(garment_id))
+        except FileNotFoundError:
+            pass
+
+    def put_meta(self, garment_id: str, meta: Dict[str, Any]):
+        """Atomically write a garment's metadata sidecar"""
+        path = self._meta_path(garment_id)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def get_meta(self, garment_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(garment_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _path(self, garment_id: str, size: Tuple[int, int]) -> str:
+        if not _GARMENT_ID.match(garment_id or ""):
+            raise ValueError(f"Invalid garment id: {garment_id!r}")
+        return os.path.join(self.directory, f"{garment_id}.{size[0]}x{size[1]}.npy")
+
+    def _meta_path(self, garment_id: str) -> str:
+        if not _GARMENT_ID.match(garment_id or ""):
+            raise ValueError(f"Invalid garment id: {garment_id!r}")
+        return os.path.join(self.directory, f"{garment_id}.json")
+
+    def _image_path(self, garment_id: str) -> str:
+        if not _GARMENT_ID.match(garment_id or ""):
+            raise ValueError(f"Invalid garment id: {garment_id!r}")
+        return os.path.join(self.directory, f"{garment_id}.image")
@@ -0,0 +1,100 @@
+import httpx
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from services.metrics_service import current_trace_id
+
+class HTTPClientRegistry:
+    """
+    App-scoped pool of keep-alive HTTP connections shared by the IPFS and Masumi services.
+    Started and closed from the FastAPI lifespan; created lazily when used outside the app.
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.max_connections_per_host = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+        self.connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        self.http2 = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+        # Per-service total timeouts (seconds); unknown services use the default
+        self.timeouts = {
+            "default": float(os.getenv("HTTP_TIMEOUT_DEFAULT", "30")),
+            "ipfs": float(os.getenv("HTTP_TIMEOUT_IPFS", "30")),
+            "masumi": float(os.getenv("HTTP_TIMEOUT_MASUMI", "30")),
+            "blockfrost": float(os.getenv("HTTP_TIMEOUT_BLOCKFROST", "15")),
+        }
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def start(self):
+        """Create the shared client (called from the app lifespan)"""
+        if self._client is None:
+            self._client = self._create_client()
+
+    async def close(self):
+        """Close the shared client and drop idle connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._host_slots.clear()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def timeout(self, service: str) -> httpx.Timeout:
+        """Timeout configuration for a named service"""
+        total = self.timeouts.get(service, self.timeouts["default"])
+        return httpx.Timeout(total, connect=min(self.connect_timeout, total))
+
+    async def request(self, service: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool, honouring per-host and per-service limits"""
+        kwargs.setdefault("timeout", self.timeout(service))
+        # Carry the current request's trace id to downstream services
+        trace_id = current_trace_id()
+        if trace_id is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "X-Trace-Id": trace_id}
+        async with self._host_slot(url):
+            return await self.client.request(method, url, **kwargs)
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str):
+        parsed = httpx.URL(url)
+        host_key = f"{parsed.scheme}://{parsed.host}:{parsed.port}"
+        slot = self._host_slots.get(host_key)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_slots[host_key] = slot
+        async with slot:
+            yield
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            timeout=self.timeout("default"),
+        )
+
+# Shared registry used by all services
+http_registry = HTTPClientRegistry()
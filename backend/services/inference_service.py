@@ -0,0 +1,233 @@
+import copy
+import json
+import os
+import time
+import torch
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# CPU inference modes for the try-on generators
+INFERENCE_MODES = ("fp32", "bf16", "int8_dynamic", "int8_static")
+
+class InferenceConfig:
+    """
+    How the try-on model runs on CPU.
+    Configure with VTO_INFERENCE_MODE (fp32|bf16|int8_dynamic|int8_static), VTO_TORCHSCRIPT,
+    VTO_CHANNELS_LAST, VTO_INTRA_OP_THREADS and VTO_INTER_OP_THREADS (0 keeps torch's default).
+    """
+
+    def __init__(self, mode: Optional[str] = None, torchscript: Optional[bool] = None,
+                 channels_last: Optional[bool] = None):
+        self.mode = (mode or os.getenv("VTO_INFERENCE_MODE", "fp32")).lower()
+        if self.mode not in INFERENCE_MODES:
+            raise ValueError(f"Invalid inference mode: {self.mode}")
+        self.torchscript = torchscript if torchscript is not None else os.getenv("VTO_TORCHSCRIPT", "false").lower() == "true"
+        self.channels_last = channels_last if channels_last is not None else os.getenv("VTO_CHANNELS_LAST", "false").lower() == "true"
+        self.intra_op_threads = int(os.getenv("VTO_INTRA_OP_THREADS", "0"))
+        self.inter_op_threads = int(os.getenv("VTO_INTER_OP_THREADS", "0"))
+        self.calibration_batches = int(os.getenv("VTO_CALIBRATION_BATCHES", "8"))
+
+    def cache_tag(self) -> str:
+        """Suffix for cache keys; reduced-precision modes render slightly different pixels"""
+        return "" if self.mode == "fp32" else f"|{self.mode}"
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "torchscript": self.torchscript,
+            "channels_last": self.channels_last,
+            "intra_op_threads": torch.get_num_threads(),
+            "inter_op_threads": torch.get_num_interop_threads(),
+        }
+
+def configure_threads(config: InferenceConfig):
+    """Apply thread settings; inter-op threads can only be set before torch's pool starts"""
+    if config.intra_op_threads > 0:
+        torch.set_num_threads(config.intra_op_threads)
+    if config.inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(config.inter_op_threads)
+        except RuntimeError as e:
+            print(f"Warning: Could not set inter-op threads: {e}")
+
+class InferenceRunner:
+    """
+    Callable wrapper around an optimized model.
+    Handles input memory format and bf16 autocast, and always returns contiguous fp32 output.
+    """
+
+    def __init__(self, model: Callable, config: InferenceConfig):
+        self.model = model
+        self.config = config
+
+    def __call__(self, person_batch: torch.Tensor, cloth_batch: torch.Tensor) -> torch.Tensor:
+        if self.config.channels_last:
+            person_batch = person_batch.contiguous(memory_format=torch.channels_last)
+            cloth_batch = cloth_batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.config.mode == "bf16"):
+            output = self.model(person_batch, cloth_batch)
+        return output.float().contiguous()
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+def load_state_dict_shared(module: torch.nn.Module, path: str, strict: bool = True) -> bool:
+    """
+    Load a checkpoint into module with its tensors memory-mapped from the file (zip-format
+    checkpoints, torch.save default). The parameters then live in the OS page cache, so every
+    worker process on the host shares one physical copy while the weights stay read-only
+    (fp32/bf16 eager inference; quantization, channels_last and freezing make private copies).
+    Returns whether the weights are shared; legacy checkpoints fall back to a private copy.
+    """
+    try:
+        state = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        module.load_state_dict(state, strict=strict, assign=True)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not memory-map checkpoint {path}, loading a private copy: {e}")
+        module.load_state_dict(torch.load(path, map_location="cpu"), strict=strict)
+        return False
+
+def weights_shared(config: InferenceConfig) -> bool:
+    """Whether optimize_model keeps memory-mapped weights as they are in this configuration"""
+    return config.mode in ("fp32", "bf16") and not config.channels_last and not config.torchscript
+
+def optimize_model(model: Any, config: InferenceConfig,
+                   example_inputs: Tuple[torch.Tensor, ...],
+                   calibration_inputs: Optional[Sequence[Tuple[torch.Tensor, ...]]] = None) -> InferenceRunner:
+    """
+    Prepare a try-on model for CPU inference in the configured mode.
+    nn.Module models are quantized, converted to channels_last and optionally traced and frozen
+    as a whole; composite models (the HR-VITON pair) get the same treatment per generator where
+    it does not need example inputs. Steps that fail fall back to the unoptimized model.
+    """
+    configure_threads(config)
+
+    if isinstance(model, torch.nn.Module):
+        model = _optimize_module(model.eval(), config, example_inputs, calibration_inputs)
+    else:
+        for name in ("condition_gen", "image_gen"):
+            module = getattr(model, name, None)
+            if isinstance(module, torch.nn.Module):
+                # Generator inputs are internal to the pipeline, so only input-free steps apply
+                setattr(model, name, _optimize_module(module.eval(), config, None, None))
+    return InferenceRunner(model, config)
+
+def _optimize_module(module: torch.nn.Module, config: InferenceConfig,
+                     example_inputs: Optional[Tuple[torch.Tensor, ...]],
+                     calibration_inputs: Optional[Sequence[Tuple[torch.Tensor, ...]]]) -> torch.nn.Module:
+    if config.mode == "int8_dynamic":
+        # Dynamic quantization covers Linear/RNN layers; convolutions stay fp32
+        module = torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8)
+    elif config.mode == "int8_static":
+        if example_inputs is None:
+            print("Warning: Static int8 quantization needs example inputs; keeping fp32 weights")
+        else:
+            module = _quantize_static(module, example_inputs, calibration_inputs or [example_inputs])
+
+    if config.channels_last and config.mode != "int8_static":
+        module = module.to(memory_format=torch.channels_last)
+
+    if config.torchscript:
+        if example_inputs is None:
+            print("Warning: TorchScript tracing needs example inputs; running eagerly")
+        else:
+            module = _trace_and_freeze(module, example_inputs, config)
+    return module
+
+def _quantize_static(module: torch.nn.Module, example_inputs: Tuple[torch.Tensor, ...],
+                     calibration_inputs: Sequence[Tuple[torch.Tensor, ...]]) -> torch.nn.Module:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    try:
+        prepared = prepare_fx(copy.deepcopy(module), get_default_qconfig_mapping("x86"), example_inputs)
+        with torch.no_grad():
+            for inputs in calibration_inputs:
+                prepared(*inputs)
+        return convert_fx(prepared)
+    except Exception as e:
+        print(f"Warning: Static int8 quantization failed, keeping fp32 weights: {e}")
+        return module
+
+def _trace_and_freeze(module: torch.nn.Module, example_inputs: Tuple[torch.Tensor, ...],
+                      config: InferenceConfig) -> torch.nn.Module:
+    if config.channels_last:
+        example_inputs = tuple(t.contiguous(memory_format=torch.channels_last) for t in example_inputs)
+    try:
+        with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=config.mode == "bf16"):
+            traced = torch.jit.trace(module, example_inputs, check_trace=False)
+            frozen = torch.jit.freeze(traced.eval())
+            # Run the profiling passes once so the first request doesn't pay for them
+            frozen(*example_inputs)
+            frozen(*example_inputs)
+        return frozen
+    except Exception as e:
+        print(f"Warning: TorchScript tracing failed, running eagerly: {e}")
+        return module
+
+def compare_inference_modes(model_factory: Callable[[], Any], size: Tuple[int, int] = (512, 384),
+                            batch_size: int = 1, runs: int = 10,
+                            configs: Optional[List[InferenceConfig]] = None) -> List[Dict[str, Any]]:
+    """
+    Accuracy-vs-latency check: run each configuration on the same random inputs and compare
+    its output with the plain fp32 model. Reports median per-image latency, max/mean absolute
+    error and PSNR (outputs live in [-1, 1]).
+    """
+    generator = torch.Generator().manual_seed(0)
+    height, width = size
+    inputs = [
+        (torch.rand((batch_size, 3, height, width), generator=generator) * 2 - 1,
+         torch.rand((batch_size, 3, height, width), generator=generator) * 2 - 1)
+        for _ in range(max(2, runs))
+    ]
+
+    reference_runner = optimize_model(model_factory(), InferenceConfig("fp32", False, False), inputs[0])
+    reference = [reference_runner(*pair) for pair in inputs]
+
+    configs = configs or [
+        InferenceConfig(mode, torchscript, channels_last)
+        for mode in INFERENCE_MODES
+        for torchscript, channels_last in ((False, False), (True, True))
+    ]
+
+    report = []
+    for config in configs:
+        started = time.perf_counter()
+        runner = optimize_model(model_factory(), config, inputs[0], inputs[:config.calibration_batches])
+        prepare_ms = (time.perf_counter() - started) * 1000.0
+
+        runner(*inputs[0])  # warm-up
+        timings, max_error, total_error, squared_error = [], 0.0, 0.0, 0.0
+        for pair, expected in zip(inputs, reference):
+            started = time.perf_counter()
+            output = runner(*pair)
+            timings.append((time.perf_counter() - started) * 1000.0 / batch_size)
+            difference = (output - expected).abs()
+            max_error = max(max_error, difference.max().item())
+            total_error += difference.mean().item()
+            squared_error += difference.pow(2).mean().item()
+
+        mse = squared_error / len(inputs)
+        timings.sort()
+        report.append({
+            "mode": config.mode,
+            "torchscript": config.torchscript,
+            "channels_last": config.channels_last,
+            "prepare_ms": prepare_ms,
+            "latency_ms_p50": timings[len(timings) // 2],
+            "max_abs_error": max_error,
+            "mean_abs_error": total_error / len(inputs),
+            "psnr_db": float("inf") if mse == 0 else 10 * torch.log10(torch.tensor(4.0 / mse)).item(),
+        })
+    return report
+
+# Accuracy-vs-latency check for the current model
+if __name__ == "__main__":
+    from services.vto_service import TARGET_SIZE, create_viton_model
+
+    results = compare_inference_modes(create_viton_model, size=TARGET_SIZE,
+                                      batch_size=int(os.getenv("VTO_MAX_BATCH_SIZE", "1")))
+    print(json.dumps(results, indent=2))
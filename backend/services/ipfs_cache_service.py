@@ -0,0 +1,44 @@
+import asyncio
+import os
+from typing import Optional
+
+from services.cache_service import TieredResultCache
+from services.cid_service import is_valid_cid, verify_cid
+
+class CIDCache(TieredResultCache):
+    """
+    Local cache of immutable IPFS content keyed by CID.
+    Content is verified against its CID before it is stored, and recently read items stay
+    in the in-memory hot tier. Disk hits are copied into bytes (not memory-mapped), so
+    callers can hand them to anything that expects bytes.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        super().__init__(
+            directory or os.getenv("IPFS_CACHE_DIR", "data/ipfs_cache"),
+            memory_items=int(os.getenv("IPFS_CACHE_MEMORY_ITEMS", "512")),
+            memory_bytes=int(os.getenv("IPFS_CACHE_MEMORY_BYTES", str(128 * 1024 * 1024))),
+            disk_bytes=int(os.getenv("IPFS_CACHE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+        )
+        self.rejected = 0
+
+    async def put_verified(self, cid: str, data: bytes) -> bool:
+        """Store data under cid if it hashes to that CID; returns whether it was cached"""
+        if not is_valid_cid(cid) or not await asyncio.to_thread(verify_cid, cid, data):
+            self.rejected += 1
+            return False
+        await self.put(cid, bytes(data))
+        return True
+
+    async def _store(self, key: str, value: bytes):
+        # Fetched content is only cached once it is proven to match its CID
+        await self.put_verified(key, value)
+
+    def stats(self):
+        stats = super().stats()
+        stats["rejected"] = self.rejected
+        return stats
+
+    def _path(self, key: str) -> str:
+        # CIDv0 strings all start with "Qm"; shard on the tail instead
+        return os.path.join(self.directory, key[-2:], key)
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+from services.http_service import HTTPClientRegistry
+from services.metrics_service import track
+
+class IPFSBackend(ABC):
+    """
+    One IPFS endpoint that can pin and/or serve content.
+    Tracks an EWMA of recent call latency plus failure streaks, which the router uses for ranking.
+    Subclasses implement pin and fetch; can_pin / can_fetch say which the router may call.
+    """
+
+    can_pin = False
+    can_fetch = False
+
+    def __init__(self, name: str, http: HTTPClientRegistry):
+        self.name = name
+        self.http = http
+        self.ewma_alpha = float(os.getenv("IPFS_EWMA_ALPHA", "0.3"))
+        self.failure_threshold = int(os.getenv("IPFS_BACKEND_FAILURE_THRESHOLD", "3"))
+        self.cooldown = float(os.getenv("IPFS_BACKEND_COOLDOWN", "10"))
+        self.failure_penalty_ms = float(os.getenv("IPFS_BACKEND_FAILURE_PENALTY_MS", "1000"))
+
+        self.ewma_ms: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    @abstractmethod
+    async def pin(self, data: bytes) -> str:
+        """Store data and return its CID"""
+
+    @abstractmethod
+    async def fetch(self, cid: str) -> bytes:
+        """Return the content stored under cid"""
+
+    def observe(self, latency_ms: float):
+        """Fold a latency sample into the EWMA"""
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms = self.ewma_alpha * latency_ms + (1 - self.ewma_alpha) * self.ewma_ms
+
+    def record(self, ok: bool, latency_ms: float):
+        """Fold one call into the latency EWMA and the health state"""
+        self.observe(latency_ms)
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                # Back off exponentially while the backend keeps failing
+                streak = self.consecutive_failures - self.failure_threshold
+                self.open_until = time.monotonic() + min(self.cooldown * (2 ** streak), 300.0)
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def score(self) -> float:
+        """Lower is better: expected latency plus a penalty per recent failure, unhealthy backends last"""
+        latency = self.ewma_ms if self.ewma_ms is not None else 0.0
+        penalty = self.consecutive_failures * self.failure_penalty_ms
+        return latency + penalty + (1e9 if not self.healthy() else 0.0)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "pin": self.can_pin,
+            "fetch": self.can_fetch,
+            "ewma_ms": self.ewma_ms,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "healthy": self.healthy(),
+        }
+
+class PinataBackend(IPFSBackend):
+    """Pinata pinning API, reading back through the Pinata gateway"""
+
+    can_pin = True
+    can_fetch = True
+
+    def __init__(self, http: HTTPClientRegistry, api_key: str, secret: str,
+                 pin_url: str = "https://api.pinata.cloud/pinning/pinFileToIPFS",
+                 gateway_url: str = "https://gateway.pinata.cloud/ipfs"):
+        super().__init__("pinata", http)
+        self.api_key = api_key
+        self.secret = secret
+        self.pin_url = pin_url
+        self.gateway_url = gateway_url.rstrip("/")
+
+    async def pin(self, data: bytes) -> str:
+        headers = {
+            "pinata_api_key": self.api_key,
+            "pinata_secret_api_key": self.secret
+        }
+        files = {
+            "file": ("encrypted_clothing_data", data, "application/octet-stream")
+        }
+        response = await self.http.request("ipfs", "POST", self.pin_url, headers=headers, files=files)
+        if response.status_code == 200:
+            return response.json()["IpfsHash"]
+        raise Exception(f"Pinata upload failed: {response.text}")
+
+    async def fetch(self, cid: str) -> bytes:
+        return await _gateway_get(self.http, f"{self.gateway_url}/{cid}")
+
+class LocalNodeBackend(IPFSBackend):
+    """Kubo RPC API of a local IPFS node"""
+
+    can_pin = True
+    can_fetch = True
+
+    def __init__(self, http: HTTPClientRegistry, api_url: str = "http://localhost:5001/api/v0"):
+        super().__init__("local", http)
+        self.api_url = api_url.rstrip("/")
+
+    @property
+    def add_url(self) -> str:
+        return f"{self.api_url}/add"
+
+    async def pin(self, data: bytes) -> str:
+        files = {
+            "file": ("encrypted_clothing_data", data, "application/octet-stream")
+        }
+        response = await self.http.request("ipfs", "POST", self.add_url, files=files)
+        if response.status_code == 200:
+            return response.json()["Hash"]
+        raise Exception(f"Local IPFS upload failed: {response.text}")
+
+    async def fetch(self, cid: str) -> bytes:
+        response = await self.http.request("ipfs", "POST", f"{self.api_url}/cat", params={"arg": cid})
+        if response.status_code == 200:
+            return response.content
+        raise Exception(f"Local IPFS retrieval failed: {response.text}")
+
+class GatewayBackend(IPFSBackend):
+    """Read-only public or private HTTP gateway"""
+
+    can_fetch = True
+
+    def __init__(self, http: HTTPClientRegistry, gateway_url: str):
+        gateway_url = gateway_url.rstrip("/")
+        super().__init__(f"gateway:{gateway_url}", http)
+        self.gateway_url = gateway_url
+
+    async def pin(self, data: bytes) -> str:
+        raise Exception(f"Gateway {self.gateway_url} is read-only")
+
+    async def fetch(self, cid: str) -> bytes:
+        return await _gateway_get(self.http, f"{self.gateway_url}/{cid}")
+
+class BackendRouter:
+    """
+    Latency-aware routing across IPFS backends.
+    Pins go to the best-ranked backends with failover until the replication policy is met;
+    reads can be hedged across several backends, and the first valid response wins.
+    """
+
+    def __init__(self, backends: List[IPFSBackend], verify: Optional[Callable[[str, bytes], bool]] = None,
+                 verifiable: Optional[Callable[[str], bool]] = None):
+        # verify(cid, data) checks content against its CID; verifiable(cid) says whether
+        # verify can judge that kind of CID at all (default: every CID)
+        self.backends = backends
+        self.verify = verify
+        self.verifiable = verifiable
+
+        replication = os.getenv("IPFS_REPLICATION", "1").lower()
+        pinners = [backend for backend in backends if backend.can_pin]
+        self.replicas = len(pinners) if replication == "all" else max(1, int(replication))
+        self.min_replicas = min(int(os.getenv("IPFS_MIN_REPLICAS", "1")), self.replicas)
+        self.hedge_reads = os.getenv("IPFS_HEDGE_READS", "true").lower() == "true"
+        self.hedge_delay = float(os.getenv("IPFS_HEDGE_DELAY_MS", "150")) / 1000.0
+        self.read_fanout = int(os.getenv("IPFS_READ_FANOUT", "2"))
+
+    def ranked(self, pin: bool = False) -> List[IPFSBackend]:
+        """Backends able to pin (or fetch), best first; ties keep configuration order"""
+        candidates = [b for b in self.backends if (b.can_pin if pin else b.can_fetch)]
+        return sorted(candidates, key=lambda backend: backend.score())
+
+    async def pin(self, data: bytes) -> str:
+        """
+        Pin data on up to `replicas` backends, failing over down the ranking.
+        Returns the CID once at least `min_replicas` backends have accepted it.
+        """
+        with track("ipfs_pin"):
+            return await self._pin_replicated(data)
+
+    async def fetch(self, cid: str) -> bytes:
+        """
+        Fetch content by CID, hedging across backends.
+        The best backend is asked first; each further backend starts after hedge_delay
+        (or as soon as an earlier one fails). The first response that verifies against the
+        CID wins; a response that does not match counts as a failure of its backend.
+        Content is returned unchecked only for CIDs the verifier cannot handle.
+        """
+        with track("ipfs_fetch"):
+            return await self._fetch_hedged(cid)
+
+    async def _pin_replicated(self, data: bytes) -> str:
+        candidates = self.ranked(pin=True)
+        if not candidates:
+            raise Exception("No IPFS pinning backend configured")
+
+        cids: Dict[str, str] = {}
+        errors: List[str] = []
+        pending = list(candidates)
+        while pending and len(cids) < self.replicas:
+            wave = pending[:self.replicas - len(cids)]
+            pending = pending[len(wave):]
+            results = await asyncio.gather(
+                *[self._timed(backend, backend.pin(data)) for backend in wave],
+                return_exceptions=True
+            )
+            for backend, result in zip(wave, results):
+                if isinstance(result, Exception):
+                    errors.append(f"{backend.name}: {result}")
+                else:
+                    cids[backend.name] = result
+
+        if len(cids) < self.min_replicas:
+            raise Exception(f"Pinned on {len(cids)}/{self.min_replicas} required backends ({'; '.join(errors)})")
+
+        distinct = set(cids.values())
+        if len(distinct) > 1:
+            print(f"Warning: IPFS backends returned different CIDs for one upload: {cids}")
+        return next(iter(cids.values()))
+
+    async def _fetch_hedged(self, cid: str) -> bytes:
+        candidates = self.ranked()
+        if not candidates:
+            raise Exception("No IPFS retrieval backend configured")
+        fanout = max(1, self.read_fanout) if self.hedge_reads else 1
+        primary, reserve = candidates[:fanout], candidates[fanout:]
+
+        tasks: Dict[asyncio.Task, IPFSBackend] = {}
+        errors: List[str] = []
+        check = self.verify is not None and (self.verifiable is None or self.verifiable(cid))
+
+        def launch(backend: IPFSBackend):
+            call = self._fetch_verified(backend, cid) if check else backend.fetch(cid)
+            tasks[asyncio.create_task(self._timed(backend, call))] = backend
+
+        launch(primary.pop(0))
+        try:
+            while tasks:
+                timeout = self.hedge_delay if primary else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow response: hedge with the next backend
+                    launch(primary.pop(0))
+                    continue
+
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is not None:
+                        errors.append(f"{backend.name}: {task.exception()}")
+                        continue
+                    return task.result()
+
+                if not tasks:
+                    # Everything in flight failed; fail over
+                    if primary:
+                        launch(primary.pop(0))
+                    elif reserve:
+                        launch(reserve.pop(0))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        raise Exception(f"IPFS retrieval failed on all backends ({'; '.join(errors)})")
+
+    async def _fetch_verified(self, backend: IPFSBackend, cid: str) -> bytes:
+        data = await backend.fetch(cid)
+        if not await asyncio.to_thread(self.verify, cid, data):
+            raise Exception(f"Content does not match CID {cid}")
+        return data
+
+    def stats(self) -> List[Dict[str, object]]:
+        return [backend.stats() for backend in self.backends]
+
+    async def _timed(self, backend: IPFSBackend, call):
+        started = time.perf_counter()
+        try:
+            result = await call
+        except asyncio.CancelledError:
+            # Lost a hedge race: not a failure, but the time spent is a lower bound on its
+            # latency, so a backend that keeps losing races drops down the ranking
+            backend.observe((time.perf_counter() - started) * 1000.0)
+            raise
+        except Exception:
+            backend.record(False, (time.perf_counter() - started) * 1000.0)
+            raise
+        backend.record(True, (time.perf_counter() - started) * 1000.0)
+        return result
+
+async def _gateway_get(http: HTTPClientRegistry, url: str) -> bytes:
+    response = await http.request("ipfs", "GET", url)
+    if response.status_code == 200:
+        return response.content
+    raise Exception(f"IPFS retrieval failed: {response.text}")
@@ -1,83 +1,213 @@
-import httpx
+import asyncio
+import json
 import os
-from typing import Optional
+from typing import List, Optional, Union
+from services.http_service import HTTPClientRegistry, http_registry
+from services.cid_service import compute_cid, is_valid_cid, verify_cid
+from services.executor_service import stage_executors
+from services.ipfs_cache_service import CIDCache
+from services.metrics_service import track
+from services.ipfs_routing_service import (
+    BackendRouter, GatewayBackend, IPFSBackend, LocalNodeBackend, PinataBackend
+)
+from services.pin_queue_service import PinQueue
 
 class IPFSService:
-    def __init__(self):
+    def __init__(self, http: Optional[HTTPClientRegistry] = None, cache: Optional[CIDCache] = None,
+                 router: Optional[BackendRouter] = None):
+        self.http = http or http_registry
+        
+        # Local content-addressed cache; CIDs are immutable so entries never go stale
+        if cache is None and os.getenv("IPFS_CACHE_ENABLED", "true").lower() == "true":
+            cache = CIDCache()
+        self.cache = cache
+        self.gateway_url = os.getenv("IPFS_GATEWAY_URL", "https://gateway.pinata.cloud/ipfs").rstrip("/")
+
         # Configure IPFS gateway - use Pinata, Infura, or local node
         self.pinata_api_key = os.getenv("PINATA_API_KEY", "your-pinata-api-key")
         self.pinata_secret = os.getenv("PINATA_SECRET_KEY", "your-pinata-secret")
-        self.pinata_url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+        self.pinata_url = os.getenv("PINATA_PIN_URL", "https://api.pinata.cloud/pinning/pinFileToIPFS")
         
         # Alternative: Local IPFS node
-        self.local_ipfs_url = "http://localhost:5001/api/v0/add"
+        self.local_api_url = os.getenv("IPFS_LOCAL_API_URL", "http://localhost:5001/api/v0").rstrip("/")
+        
+        # Concurrent pins used by batch uploads
+        self.upload_concurrency = int(os.getenv("IPFS_UPLOAD_CONCURRENCY", "8"))
+        
+        self.router = router or BackendRouter(
+            self._configure_backends(), verify=verify_cid, verifiable=is_valid_cid
+        )
+        
+        # Deferred pinning: the CID is computed locally and pins happen in the background
+        self.pin_queue: Optional[PinQueue] = None
+        if os.getenv("IPFS_DEFERRED_PINNING", "true").lower() == "true":
+            self.pin_queue = PinQueue(self.router.pin)
+    
+    async def start(self):
+        if self.pin_queue is not None:
+            await self.pin_queue.start()
+    
+    async def stop(self):
+        if self.pin_queue is not None:
+            await self.pin_queue.stop()
+    
+    def _configure_backends(self) -> List[IPFSBackend]:
+        """
+        Build the backend set from IPFS_BACKENDS (comma-separated pinning backends in
+        preference order: pinata, local) plus read-only gateways from IPFS_GATEWAYS.
+        Without IPFS_BACKENDS, Pinata is used when an API key is set and the local node otherwise.
+        """
+        default = "pinata" if self.pinata_api_key != "your-pinata-api-key" else "local"
+        names = [name.strip().lower() for name in os.getenv("IPFS_BACKENDS", default).split(",") if name.strip()]
+        
+        backends: List[IPFSBackend] = []
+        for name in names:
+            if name == "pinata":
+                backends.append(PinataBackend(self.http, self.pinata_api_key, self.pinata_secret,
+                                              self.pinata_url, self.gateway_url))
+            elif name == "local":
+                backends.append(LocalNodeBackend(self.http, self.local_api_url))
+            else:
+                raise ValueError(f"Unknown IPFS backend: {name}")
+        
+        gateways = [url.strip() for url in os.getenv("IPFS_GATEWAYS", "").split(",") if url.strip()]
+        if "pinata" not in names and self.gateway_url not in gateways:
+            gateways.insert(0, self.gateway_url)
+        backends.extend(GatewayBackend(self.http, url) for url in gateways)
+        return backends
     
     async def upload_encrypted_data(self, encrypted_data: bytes) -> str:
         """
-        Upload encrypted data to IPFS and return CID
+        Upload encrypted data to IPFS and return CID.
+        Pins are routed to the fastest healthy backends and replicated per IPFS_REPLICATION.
+        With deferred pinning the CID is computed locally (as `ipfs add` would) and returned
+        before any network I/O; the pin itself is queued and retried in the background.
         """
+        if self.pin_queue is not None:
+            return await self._queue_pin(encrypted_data)
+        
         try:
-            # Using Pinata service
-            if self.pinata_api_key != "your-pinata-api-key":
-                return await self._upload_to_pinata(encrypted_data)
-            else:
-                # Fallback to local IPFS node
-                return await self._upload_to_local_ipfs(encrypted_data)
+            cid = await self.router.pin(encrypted_data)
         except Exception as e:
             raise Exception(f"IPFS upload failed: {str(e)}")
+        
+        await self._write_through(cid, encrypted_data)
+        return cid
     
-    async def _upload_to_pinata(self, encrypted_data: bytes) -> str:
-        """Upload to Pinata IPFS service"""
-        headers = {
-            "pinata_api_key": self.pinata_api_key,
-            "pinata_secret_api_key": self.pinata_secret
-        }
-        
-        files = {
-            "file": ("encrypted_clothing_data", encrypted_data, "application/octet-stream")
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.pinata_url,
-                headers=headers,
-                files=files,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["IpfsHash"]
-            else:
-                raise Exception(f"Pinata upload failed: {response.text}")
+    async def upload_encrypted_batch(self, items: List[bytes]) -> List[Union[str, Exception]]:
+        """
+        Upload many encrypted blobs and return one CID or Exception per item, in order.
+        With deferred pinning every item is simply queued.
+        Against a local node all items go up as one wrapped-directory add; otherwise (or if
+        that fails) items are pinned individually with bounded concurrency.
+        """
+        if not items:
+            return []
+        
+        if self.pin_queue is not None:
+            return list(await asyncio.gather(
+                *[self._queue_pin(item) for item in items],
+                return_exceptions=True
+            ))
+        
+        pinners = self.router.ranked(pin=True)
+        if self.router.replicas == 1 and pinners and isinstance(pinners[0], LocalNodeBackend):
+            try:
+                cids = await self._upload_directory_to_local_ipfs(pinners[0], items)
+                for cid, item in zip(cids, items):
+                    await self._write_through(cid, item)
+                return cids
+            except Exception as e:
+                print(f"Warning: Directory add failed, pinning items individually: {e}")
+        
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+        
+        async def upload_one(encrypted_data: bytes) -> str:
+            async with semaphore:
+                return await self.upload_encrypted_data(encrypted_data)
+        
+        return list(await asyncio.gather(*[upload_one(item) for item in items], return_exceptions=True))
     
-    async def _upload_to_local_ipfs(self, encrypted_data: bytes) -> str:
-        """Upload to local IPFS node"""
-        files = {
-            "file": ("encrypted_clothing_data", encrypted_data, "application/octet-stream")
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.local_ipfs_url,
-                files=files,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["Hash"]
-            else:
-                raise Exception(f"Local IPFS upload failed: {response.text}")
+    async def _queue_pin(self, encrypted_data: bytes) -> str:
+        """Compute the CID locally and queue the content for background pinning"""
+        try:
+            with track("cid"):
+                cid = await stage_executors.run_buffer("crypto", compute_cid, encrypted_data)
+            await self.pin_queue.enqueue(cid, encrypted_data)
+        except Exception as e:
+            raise Exception(f"IPFS upload failed: {str(e)}")
+        
+        await self._write_through(cid, encrypted_data)
+        return cid
+    
+    async def get_pin_status(self, cid: str) -> Optional[dict]:
+        """Background pin state of a CID uploaded with deferred pinning"""
+        if self.pin_queue is None:
+            return None
+        return await self.pin_queue.get_status(cid)
+    
+    async def resolve_pin(self, cid: str, action: str) -> Optional[str]:
+        """Retry or discard a pin whose backend returned a different CID"""
+        if self.pin_queue is None:
+            return None
+        return await self.pin_queue.resolve(cid, action)
+    
+    async def _upload_directory_to_local_ipfs(self, node: LocalNodeBackend, items: List[bytes]) -> List[str]:
+        """Add all items to the local IPFS node in one wrapped-directory request"""
+        names = [f"item-{index:05d}" for index in range(len(items))]
+        files = [
+            ("file", (name, item, "application/octet-stream"))
+            for name, item in zip(names, items)
+        ]
+        
+        response = await self.http.request(
+            "ipfs", "POST",
+            node.add_url,
+            params={"wrap-with-directory": "true", "pin": "true"},
+            files=files
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Local IPFS directory add failed: {response.text}")
+        
+        # The node streams one JSON object per added entry (files, then the wrapping directory)
+        hashes = {}
+        for line in response.text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                hashes[entry.get("Name")] = entry.get("Hash")
+        
+        missing = [name for name in names if not hashes.get(name)]
+        if missing:
+            raise Exception(f"Local IPFS directory add returned no CID for {len(missing)} items")
+        return [hashes[name] for name in names]
     
     async def retrieve_data(self, cid: str) -> bytes:
-        """Retrieve data from IPFS using CID"""
-        gateway_url = f"https://gateway.pinata.cloud/ipfs/{cid}"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(gateway_url, timeout=30.0)
-            
-            if response.status_code == 200:
-                return response.content
-            else:
-                raise Exception(f"IPFS retrieval failed: {response.text}")
\ No newline at end of file
+        """
+        Retrieve data from IPFS using CID.
+        Served from the local CID cache when possible (disk hits are read into bytes in one
+        copy, so callers always get bytes); concurrent misses for one CID share a single fetch.
+        """
+        if self.cache is None:
+            return await self._fetch_from_gateway(cid)
+        return await self.cache.get_or_compute(cid, lambda: self._fetch_from_gateway(cid))
+    
+    async def _fetch_from_gateway(self, cid: str) -> bytes:
+        """
+        Fetch content through the backend router (hedged across gateways and nodes).
+        Content whose pin is still queued is served from the queue instead.
+        """
+        if self.pin_queue is not None:
+            payload = await self.pin_queue.get_payload(cid)
+            if payload is not None:
+                return payload
+        return await self.router.fetch(cid)
+    
+    async def _write_through(self, cid: str, data: bytes):
+        """Cache freshly uploaded content so it can be read back without network I/O"""
+        if self.cache is None:
+            return
+        try:
+            await self.cache.put_verified(cid, data)
+        except Exception as e:
+            print(f"Warning: Failed to cache uploaded content for {cid}: {e}")
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wrapped_keys (
+    cid TEXT PRIMARY KEY,
+    wrapped_key TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class WrappedKeyStore:
+    """
+    SQLite store of wrapped per-item data keys, keyed by the item's IPFS CID.
+    Wrapped keys carry their KEK id, so rotation can re-wrap them in bulk without touching IPFS.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("KEY_STORE_PATH", "data/wrapped_keys.db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def put(self, cid: str, wrapped_key: str):
+        self.put_many([(cid, wrapped_key)])
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        """Insert or replace wrapped keys in one transaction"""
+        now = time.time()
+        rows = [(cid, wrapped_key, now, now) for cid, wrapped_key in items]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO wrapped_keys (cid, wrapped_key, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(cid) DO UPDATE SET wrapped_key = excluded.wrapped_key, "
+                    "updated_at = excluded.updated_at",
+                    rows
+                )
+
+    def get(self, cid: str) -> Optional[str]:
+        return self.get_many([cid]).get(cid)
+
+    def get_many(self, cids: List[str]) -> Dict[str, str]:
+        if not cids:
+            return {}
+        with self._lock:
+            conn = self._connection()
+            found = {}
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(cids), 500):
+                chunk = cids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT cid, wrapped_key FROM wrapped_keys WHERE cid IN ({placeholders})",
+                    chunk
+                ).fetchall())
+            return found
+
+    def rotate(self, encryption_service, kek_id: Optional[str] = None, batch_size: int = 1000) -> int:
+        """
+        Re-wrap every stored key under kek_id (default: the service's active KEK).
+        Keys are processed in batches, so each KEK is derived once. Returns the number re-wrapped.
+        """
+        kek_id = kek_id or encryption_service.active_kek_id
+        prefix = f"{kek_id}$"
+        rotated = 0
+        last_cid = ""
+        while True:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT cid, wrapped_key FROM wrapped_keys WHERE cid > ? ORDER BY cid LIMIT ?",
+                    (last_cid, batch_size)
+                ).fetchall()
+            if not rows:
+                return rotated
+            last_cid = rows[-1][0]
+
+            stale = [(cid, wrapped_key) for cid, wrapped_key in rows if not wrapped_key.startswith(prefix)]
+            if stale:
+                rewrapped = encryption_service.rewrap_keys([wrapped_key for _, wrapped_key in stale], kek_id)
+                self.put_many(zip([cid for cid, _ in stale], rewrapped))
+                rotated += len(stale)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
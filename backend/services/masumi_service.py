@@ -1,8 +1,10 @@
-import httpx
 import os
 from typing import Union
+from services.http_service import http_registry
+from services.metrics_service import track
 
-async def log_agent_decision(agent_id: str, decision_hash: str) -> Union[str, bool]:
+async def log_agent_decision(agent_id: str, decision_hash: str,
+                             action: str = "outfit_recommendation") -> Union[str, bool]:
     """
     Log agent decision to Masumi Payment Service
     Returns transaction hash on success or True if successful
@@ -18,7 +20,7 @@ async def log_agent_decision(agent_id: str, decision_hash: str) -> Union[str, bo
         "agent_id": agent_id,
         "decision_hash": decision_hash,
         "service": "vestiai",
-        "action": "outfit_recommendation"
+        "action": action
     }
     
     headers = {
@@ -27,19 +29,25 @@ async def log_agent_decision(agent_id: str, decision_hash: str) -> Union[str, bo
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        with track("masumi_log"):
+            response = await http_registry.request(
+                "masumi", "POST",
                 f"{base_url}/api/log-decision",
                 json=payload,
-                headers=headers,
-                timeout=30.0
+                headers=headers
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("transaction_hash", True)
-            else:
-                raise Exception(f"Masumi API error: {response.status_code} - {response.text}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            return result.get("transaction_hash", True)
+        else:
+            raise Exception(f"Masumi API error: {response.status_code} - {response.text}")
                 
     except Exception as e:
-        raise Exception(f"Failed to log decision to Masumi: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to log decision to Masumi: {str(e)}")
+
+async def log_anchor_root(agent_id: str, merkle_root: str) -> Union[str, bool]:
+    """
+    Log the Merkle root of a batch of decisions in place of the decisions themselves
+    """
+    return await log_agent_decision(agent_id, merkle_root, action="decision_batch_anchor")
@@ -0,0 +1,55 @@
+import hashlib
+from typing import Dict, List, Sequence
+
+# RFC 6962-style domain separation, so a leaf can never be passed off as an interior node
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+def leaf_hash(agent_id: str, decision_hash: str) -> bytes:
+    """Leaf of one decision: sha256(0x00 || "<agent_id>|<decision_hash>")"""
+    return hashlib.sha256(_LEAF_PREFIX + f"{agent_id}|{decision_hash}".encode()).digest()
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """Interior node: sha256(0x01 || left || right)"""
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+def build_tree(leaves: Sequence[bytes]) -> List[List[bytes]]:
+    """
+    All levels of the tree, leaves first and root last.
+    An unpaired node at the end of a level is promoted unchanged (no duplication, which would
+    let two different leaf lists share a root).
+    """
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def merkle_root(leaves: Sequence[bytes]) -> bytes:
+    return build_tree(leaves)[-1][0]
+
+def inclusion_proof(levels: List[List[bytes]], index: int) -> List[Dict[str, str]]:
+    """
+    Sibling path from leaf index up to the root, as [{"position": "left"|"right", "hash": hex}].
+    position says on which side the sibling is concatenated; promoted levels contribute nothing.
+    """
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"position": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+def verify_inclusion(leaf: bytes, proof: Sequence[Dict[str, str]], root_hex: str) -> bool:
+    """Recompute the root from a leaf and its proof; needs nothing but hashlib"""
+    current = leaf
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        current = node_hash(sibling, current) if step["position"] == "left" else node_hash(current, sibling)
+    return current.hex() == root_hex.lower()
@@ -0,0 +1,249 @@
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency histogram buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace id of the request being handled; set by ObservabilityMiddleware
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+_TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9\-_.]{8,64}$")
+_TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+class TraceIdFilter(logging.Filter):
+    """Stamps each log record with the trace id of the request it was logged under"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "trace_id", None) is None:
+            record.trace_id = current_trace_id() or "-"
+        return True
+
+def configure_logging(level: str = "INFO"):
+    """Send the services' loggers to stderr with the trace id on every line"""
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    logger = logging.getLogger("services")
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+def resolve_trace_id(headers) -> str:
+    """
+    Trace id for an incoming request: a W3C traceparent trace id, else a well-formed
+    X-Trace-Id / X-Request-ID header, else a new random id
+    """
+    match = _TRACEPARENT_PATTERN.match(headers.get("traceparent", "").strip().lower())
+    if match:
+        return match.group(1)
+    for name in ("x-trace-id", "x-request-id"):
+        value = headers.get(name, "").strip()
+        if _TRACE_ID_PATTERN.match(value):
+            return value
+    return uuid.uuid4().hex
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple[str, ...]) -> str:
+        if not self.label_names:
+            return ""
+        pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values))
+        return "{" + pairs + "}"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = sorted((labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items())
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._bucket_labels(labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+    def _bucket_labels(self, labels: Tuple[str, ...], bound: float) -> str:
+        le = "+Inf" if bound == float("inf") else _number(bound)
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+        pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}"
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format registry (counters, gauges, histograms).
+    Collectors registered with add_collector contribute extra lines at scrape time,
+    e.g. gauges derived from existing stats() methods.
+    """
+
+    def __init__(self, namespace: str = "vestiai"):
+        self.namespace = namespace
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{self.namespace}_{name}", help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(f"{self.namespace}_{name}", help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.namespace}_{name}", help_text, label_names, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Warning: Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+# Shared registry and the metrics recorded across the backend
+metrics = MetricsRegistry()
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is fully sent",
+    ("method", "route", "status")
+)
+http_requests_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+stage_seconds = metrics.histogram(
+    "stage_duration_seconds",
+    "Latency of request stages (multipart_read, decode, preprocess, inference, encode, encrypt, cid, ipfs_pin, ipfs_fetch, masumi_log)",
+    ("stage",)
+)
+stage_errors = metrics.counter("stage_errors_total", "Stage executions that raised", ("stage",))
+
+@contextmanager
+def track(stage: str):
+    """
+    Time a block as one execution of a stage; usable around sync code and awaits alike
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage)
+
+class ObservabilityMiddleware:
+    """
+    ASGI middleware that assigns each HTTP request a trace id (returned as X-Trace-Id and
+    available to handlers through current_trace_id) and records its latency per route
+    template. Latency runs until the last body chunk is sent, so streamed responses count fully.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        trace_id = resolve_trace_id(headers)
+        token = trace_id_var.set(trace_id)
+        status = {"code": 500}
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                scope.get("method", ""),
+                getattr(route, "path", "unmatched"),
+                str(status["code"])
+            )
+            trace_id_var.reset(token)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.chain_service import ChainView, chain_view
+
+class MintJobQueue:
+    """
+    Asynchronous NFT minting jobs.
+    Each job is a set of wardrobe items; items from all pending jobs are flushed together
+    (by count or after a timer) so they share multi-asset transactions. Job state lives in a
+    bounded in-memory store and expires after a TTL.
+    """
+
+    QUEUED = "queued"
+    MINTING = "minting"
+    SUBMITTED = "submitted"
+    CONFIRMED = "confirmed"
+    FAILED = "failed"
+
+    def __init__(self, minter: Optional[Callable[[List[Tuple[str, str]]], Awaitable[List[Dict[str, Any]]]]] = None,
+                 chain: Optional[ChainView] = None):
+        # None: use mint_wardrobe_batch_async, imported on first use
+        self.minter = minter
+        self.chain = chain or chain_view
+        self.max_batch_items = int(os.getenv("NFT_MINT_MAX_BATCH_ITEMS", "100"))
+        self.max_wait = float(os.getenv("NFT_MINT_MAX_WAIT_MS", "2000")) / 1000.0
+        self.max_jobs = int(os.getenv("NFT_MINT_MAX_JOBS", "1000"))
+        self.job_ttl = float(os.getenv("NFT_MINT_JOB_TTL", "3600"))
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.items_processed = 0
+        self.items_minted = 0
+
+    async def start(self):
+        if self._task is None:
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, user_address: str, item_cids: List[str]) -> str:
+        """Create a minting job and return its id immediately"""
+        await self.start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "user_address": user_address,
+            "status": self.QUEUED,
+            "items": list(item_cids),
+            "results": [None] * len(item_cids),
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._done[job_id] = asyncio.Event()
+        for index, cid in enumerate(item_cids):
+            self._queue.put_nowait((job_id, index, user_address, cid))
+        return job_id
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Wait until every item of a job has a result.
+        Returns the job held before waiting, so a prune while waiting cannot lose it.
+        """
+        job = self._jobs.get(job_id)
+        done = self._done.get(job_id)
+        if done is not None:
+            await done.wait()
+        return job
+
+    async def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of a job, or None if unknown or expired.
+        Submitted jobs are promoted to confirmed once every minted asset shows up in the
+        recipient's UTxO set (served from the incrementally updated chain view).
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == self.SUBMITTED:
+            try:
+                minted = [result for result in job["results"] if result and result.get("success")]
+                held = await self.chain.asset_units(job["user_address"]) if minted else set()
+                if minted and all(result["asset_unit"] in held for result in minted):
+                    job["status"] = self.CONFIRMED
+                    job["updated_at"] = time.time()
+            except Exception as e:
+                print(f"Warning: Could not check mint confirmation for job {job_id}: {e}")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "jobs": counts,
+            "batches": self.batches,
+            "items_processed": self.items_processed,
+            "items_minted": self.items_minted,
+            "mean_batch_size": (self.items_processed / self.batches) if self.batches else 0.0,
+            "chain": self.chain.stats(),
+        }
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.max_wait
+            while len(batch) < self.max_batch_items:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[str, int, str, str]]):
+        for job_id in {entry[0] for entry in batch}:
+            self._update(job_id, status=self.MINTING)
+
+        try:
+            minter = self.minter or _default_minter()
+            results = await minter([(address, cid) for _, _, address, cid in batch])
+            if len(results) != len(batch):
+                raise Exception(f"Minter returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            results = [{"success": False, "error": str(e), "message": "Failed to mint NFT"} for _ in batch]
+
+        self.batches += 1
+        self.items_processed += len(batch)
+        self.items_minted += sum(1 for result in results if result.get("success"))
+        for (job_id, index, _, _), result in zip(batch, results):
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["results"][index] = result
+
+        for job_id in {entry[0] for entry in batch}:
+            job = self._jobs.get(job_id)
+            if job is None or any(result is None for result in job["results"]):
+                continue
+            succeeded = any(result.get("success") for result in job["results"])
+            self._update(job_id, status=self.SUBMITTED if succeeded else self.FAILED)
+            self._done[job_id].set()
+
+    def _update(self, job_id: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+
+    def _prune(self):
+        """Drop finished jobs, oldest first, past their TTL or while over the count bound"""
+        cutoff = time.time() - self.job_ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if not self._done[job_id].is_set():
+                # Still minting; later finished jobs can be dropped around it
+                continue
+            if len(self._jobs) >= self.max_jobs or job["updated_at"] < cutoff:
+                del self._jobs[job_id]
+                self._done.pop(job_id, None)
+
+def _default_minter():
+    # The Cardano stack (pycardano, blockfrost) is only imported once something is minted
+    from services.nft_minting_service import mint_wardrobe_batch_async
+    return mint_wardrobe_batch_async
+
+# Shared minting job queue
+mint_jobs = MintJobQueue()
@@ -2,26 +2,101 @@ import os
 import json
 import time
 import hashlib
+import threading
+import asyncio
+import httpx
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Set, Tuple
+from blockfrost import ApiUrls
 from pycardano import *
 
+from services.chain_service import ChainView, chain_view
+from services.http_service import http_registry
+
+# Cardano limits: transactions may not exceed 16 KiB; Masumi still adds inputs, change and
+# signatures, so batches are packed to a lower budget
+MAX_TX_BYTES = int(os.getenv("NFT_MAX_TX_BYTES", "12000"))
+COINS_PER_UTXO_BYTE = int(os.getenv("NFT_COINS_PER_UTXO_BYTE", "4310"))
+MIN_OUTPUT_LOVELACE = 2000000
+
 class NFTMintingService:
     def __init__(self):
         self.network = Network.TESTNET
-        self.context = BlockFrostChainContext(
-            project_id=os.getenv("BLOCKFROST_PROJECT_ID", "preprodKrJccVpvpXyMC6bPCkMQlPRpyCOWUyb2"),
-            base_url=ApiUrls.preprod.value
-        )
+        self._context = None
         
-        # Mock policy key - in production, load from secure storage
-        self.policy_signing_key = PaymentSigningKey.generate()
+        # Mock policy key - in production, load from secure storage.
+        # Persisted so every mint (and every batch) shares one policy ID.
+        self.policy_key_path = os.getenv("NFT_POLICY_SKEY_PATH", "data/nft_policy.skey")
+        self.policy_signing_key = self._load_policy_key()
         self.policy_verification_key = PaymentVerificationKey.from_signing_key(self.policy_signing_key)
+        self.policy_script = self._create_policy_script()
+        self.policy_id = self._generate_policy_id(self.policy_script).to_primitive().hex()
+        
+        # Default packing limits; the async path derives per-call limits from live protocol parameters
+        self.max_tx_bytes = MAX_TX_BYTES
+        self.coins_per_utxo_byte = COINS_PER_UTXO_BYTE
+        
+        # Asset units submitted but not yet seen on chain -> submission time, so an item
+        # is not minted to the same address twice while its first mint is in flight
+        self.pending_ttl = float(os.getenv("NFT_PENDING_MINT_TTL", "3600"))
+        self._pending: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
         
         # Masumi service credentials
         self.masumi_api_key = os.getenv("MASUMI_API_KEY", "mock_masumi_key")
         self.masumi_endpoint = os.getenv("MASUMI_ENDPOINT", "https://api.masumi.io/v1")
 
+    @property
+    def context(self) -> BlockFrostChainContext:
+        """Chain context, created on first use (constructing it queries Blockfrost)"""
+        if self._context is None:
+            self._context = BlockFrostChainContext(
+                project_id=os.getenv("BLOCKFROST_PROJECT_ID", "preprodKrJccVpvpXyMC6bPCkMQlPRpyCOWUyb2"),
+                base_url=ApiUrls.preprod.value
+            )
+        return self._context
+
+    def packing_limits(self, params: Dict[str, Any]) -> Tuple[int, int]:
+        """(max_tx_bytes, coins_per_utxo_byte) from the chain's protocol parameters (Blockfrost field names)"""
+        max_tx_bytes, coins_per_utxo_byte = self.max_tx_bytes, self.coins_per_utxo_byte
+        if params.get("max_tx_size"):
+            # Keep the same headroom below the protocol limit as the configured default
+            max_tx_bytes = min(MAX_TX_BYTES, int(params["max_tx_size"]) - 16384 + MAX_TX_BYTES)
+        if params.get("coins_per_utxo_size"):
+            coins_per_utxo_byte = int(params["coins_per_utxo_size"])
+        return max_tx_bytes, coins_per_utxo_byte
+
+    def asset_unit(self, item_name: str) -> str:
+        """Policy id + hex asset name, as Blockfrost lists held assets"""
+        return self.policy_id + item_name.encode().hex()
+
+    def _reserve_asset(self, unit: str) -> bool:
+        """Mark an asset unit as being minted; False if a mint of it is already pending"""
+        now = time.time()
+        with self._pending_lock:
+            for pending_unit, submitted_at in list(self._pending.items()):
+                if submitted_at < now - self.pending_ttl:
+                    del self._pending[pending_unit]
+            if unit in self._pending:
+                return False
+            self._pending[unit] = now
+            return True
+
+    def _release_asset(self, unit: str):
+        """Forget a reservation whose mint never reached the chain"""
+        with self._pending_lock:
+            self._pending.pop(unit, None)
+
+    def _load_policy_key(self) -> PaymentSigningKey:
+        if os.path.exists(self.policy_key_path):
+            return PaymentSigningKey.load(self.policy_key_path)
+        key = PaymentSigningKey.generate()
+        directory = os.path.dirname(self.policy_key_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        key.save(self.policy_key_path)
+        return key
+
     def _create_policy_script(self) -> NativeScript:
         """Create a simple single-signature minting policy"""
         return ScriptPubkey(self.policy_verification_key.hash())
@@ -30,49 +105,85 @@ class NFTMintingService:
         """Generate policy ID from script"""
         return policy_script.hash()
 
-    def _create_metadata(self, item_cid: str, policy_id: str) -> Dict[str, Any]:
+    def _asset_name(self, item_cid: str, user_address: str) -> str:
+        """Deterministic asset name (<= 32 bytes) for one item minted to one address"""
+        digest = hashlib.sha256(f"{user_address}:{item_cid}".encode()).hexdigest()[:16]
+        return f"VestiAI_Item_{digest}"
+
+    def _asset_metadata(self, item_cid: str, item_name: str) -> Dict[str, Any]:
+        return {
+            "name": item_name,
+            "description": "VestiAI Wardrobe Item NFT",
+            "image": f"ipfs://{item_cid}",
+            "mediaType": "image/jpeg",
+            "attributes": {
+                "Creator": "VestiAI",
+                "Type": "Wardrobe Item",
+                "Minted": int(time.time())
+            }
+        }
+
+    def _create_metadata(self, item_cid: str, policy_id: str, user_address: str = "") -> Dict[str, Any]:
         """Create CIP-25 compliant NFT metadata"""
-        item_name = f"VestiAI_Item_{int(time.time())}"
-        
+        item_name = self._asset_name(item_cid, user_address)
         metadata = {
-            "721": {
+            721: {
                 policy_id: {
-                    item_name: {
-                        "name": item_name,
-                        "description": "VestiAI Wardrobe Item NFT",
-                        "image": f"ipfs://{item_cid}",
-                        "mediaType": "image/jpeg",
-                        "attributes": {
-                            "Creator": "VestiAI",
-                            "Type": "Wardrobe Item",
-                            "Minted": int(time.time())
-                        }
-                    }
+                    item_name: self._asset_metadata(item_cid, item_name)
                 }
             }
         }
         return metadata, item_name
 
-    def _build_transaction(self, user_address: str, policy_script: NativeScript, 
+    def _create_batch_metadata(self, items: List[Tuple[str, str]], policy_id: str) -> Dict[str, Any]:
+        """CIP-25 metadata for many (item_cid, asset_name) pairs under one policy"""
+        return {
+            721: {
+                policy_id: {
+                    item_name: self._asset_metadata(item_cid, item_name)
+                    for item_cid, item_name in items
+                }
+            }
+        }
+
+    def _build_transaction(self, user_address: str, policy_script: NativeScript,
                           policy_id: str, item_name: str, metadata: Dict[str, Any]) -> Transaction:
         """Build the minting transaction"""
+        return self._build_batch_transaction(policy_script, policy_id, [(user_address, item_name)], metadata)
+
+    def _build_batch_transaction(self, policy_script: NativeScript, policy_id: str,
+                                 assets: List[Tuple[str, str]], metadata: Dict[str, Any],
+                                 coins_per_utxo_byte: Optional[int] = None) -> Transaction:
+        """
+        Build one transaction minting every (user_address, asset_name) pair under policy_id.
+        Assets for the same address share a single output.
+        """
+        coins_per_utxo_byte = coins_per_utxo_byte or self.coins_per_utxo_byte
+        policy = bytes.fromhex(policy_id)
+        by_address: Dict[str, Dict[bytes, int]] = {}
+        for user_address, item_name in assets:
+            by_address.setdefault(user_address, {})[item_name.encode()] = 1
         
-        # Create asset to mint
-        asset = Asset.from_primitive([policy_id.encode(), item_name.encode()])
-        multi_asset = MultiAsset({policy_id.encode(): {item_name.encode(): 1}})
+        # Build transaction outputs with NFTs + minimum ADA
+        outputs = []
+        for user_address, names in by_address.items():
+            output = TransactionOutput(
+                Address.decode(user_address),
+                Value(coin=MIN_OUTPUT_LOVELACE, multi_asset=MultiAsset.from_primitive({policy: names}))
+            )
+            # Outputs holding many assets need more than the 2 ADA floor (Babbage min-UTxO rule)
+            output.amount.coin = max(MIN_OUTPUT_LOVELACE, coins_per_utxo_byte * (160 + len(output.to_cbor())))
+            outputs.append(output)
         
-        # Build transaction output with NFT + minimum ADA
-        output = TransactionOutput(
-            Address.from_bech32(user_address),
-            Value(coin=2000000, multi_asset=multi_asset)  # 2 ADA + NFT
-        )
+        mint = MultiAsset.from_primitive({policy: {name.encode(): 1 for _, name in assets}})
+        auxiliary_data = AuxiliaryData(AlonzoMetadata(metadata=Metadata(metadata)))
         
         # Create transaction body
         tx_body = TransactionBody(
             inputs=[],  # Will be populated by Masumi
-            outputs=[output],
-            mint=multi_asset,
-            auxiliary_data=AuxiliaryData(metadata=Metadata(metadata))
+            outputs=outputs,
+            mint=mint,
+            auxiliary_data_hash=auxiliary_data.hash()
         )
         
         # Create witness set with policy script
@@ -80,7 +191,48 @@ class NFTMintingService:
             native_scripts=[policy_script]
         )
         
-        return Transaction(tx_body, witness_set)
+        return Transaction(tx_body, witness_set, auxiliary_data=auxiliary_data)
+
+    def pack_transactions(self, assets: List[Tuple[str, str, str]],
+                          limits: Optional[Tuple[int, int]] = None) -> List[Tuple[List[int], Transaction, Dict[str, Any]]]:
+        """
+        Pack (user_address, item_cid, asset_name) entries into as few transactions as fit max_tx_bytes.
+        limits is (max_tx_bytes, coins_per_utxo_byte) for this call, defaulting to the configured ones;
+        it is passed in rather than stored so concurrent packs on executor threads cannot interfere.
+        Returns (entry indexes, transaction, metadata) per transaction.
+        """
+        max_tx_bytes, coins_per_utxo_byte = limits or (self.max_tx_bytes, self.coins_per_utxo_byte)
+        packed = []
+        start = 0
+        while start < len(assets):
+            transaction, metadata = self._build_for(assets[start:start + 1], coins_per_utxo_byte)
+            count, size = 1, len(transaction.to_cbor())
+            remaining = len(assets) - start
+            if remaining > 1 and size < max_tx_bytes:
+                # Estimate how many assets fit from the marginal size of one more, then shrink to fit
+                pair, _ = self._build_for(assets[start:start + 2], coins_per_utxo_byte)
+                per_asset = max(1, len(pair.to_cbor()) - size)
+                target = min(remaining, 1 + (max_tx_bytes - size) // per_asset)
+                while target > 1:
+                    candidate, candidate_metadata = self._build_for(assets[start:start + target], coins_per_utxo_byte)
+                    candidate_size = len(candidate.to_cbor())
+                    if candidate_size <= max_tx_bytes:
+                        transaction, metadata, count = candidate, candidate_metadata, target
+                        break
+                    target = max(1, target - max(1, -(-(candidate_size - max_tx_bytes) // per_asset)))
+            packed.append((list(range(start, start + count)), transaction, metadata))
+            start += count
+        return packed
+
+    def _build_for(self, assets: List[Tuple[str, str, str]],
+                   coins_per_utxo_byte: Optional[int] = None) -> Tuple[Transaction, Dict[str, Any]]:
+        metadata = self._create_batch_metadata([(item_cid, item_name) for _, item_cid, item_name in assets], self.policy_id)
+        transaction = self._build_batch_transaction(
+            self.policy_script, self.policy_id,
+            [(user_address, item_name) for user_address, _, item_name in assets], metadata,
+            coins_per_utxo_byte
+        )
+        return transaction, metadata
 
     def _submit_via_masumi(self, transaction: Transaction) -> Dict[str, Any]:
         """Submit transaction via Masumi Payment Service API"""
@@ -111,14 +263,51 @@ class NFTMintingService:
                 return response.json()
             else:
                 raise Exception(f"Masumi API error: {response.status_code} - {response.text}")
-                
+        
         except requests.RequestException as e:
-            # Fallback: Mock successful response for development
-            return {
-                "success": True,
-                "tx_hash": hashlib.sha256(tx_cbor.encode()).hexdigest()[:64],
-                "message": "Transaction submitted successfully (mock)"
-            }
+            # Nothing reached the chain, so the item must not be reported as minted
+            raise Exception(f"Masumi submission failed: {e}")
+
+    async def _submit_via_masumi_async(self, transaction: Transaction) -> Dict[str, Any]:
+        """Submit transaction via Masumi through the shared keep-alive HTTP pool"""
+        tx_cbor = (await asyncio.to_thread(transaction.to_cbor)).hex()
+        
+        payload = {
+            "transaction_cbor": tx_cbor,
+            "network": "preprod",
+            "service": "nft_minting"
+        }
+        
+        headers = {
+            "Authorization": f"Bearer {self.masumi_api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        try:
+            response = await http_registry.request(
+                "masumi", "POST",
+                f"{self.masumi_endpoint}/transactions/submit",
+                json=payload,
+                headers=headers
+            )
+        except httpx.RequestError as e:
+            # Nothing reached the chain, so the items must not be reported as minted
+            raise Exception(f"Masumi submission failed: {e}")
+        
+        if response.status_code == 200:
+            return response.json()
+        raise Exception(f"Masumi API error: {response.status_code} - {response.text}")
+
+_minting_service: Optional[NFTMintingService] = None
+_minting_service_lock = threading.Lock()
+
+def get_minting_service() -> NFTMintingService:
+    """Shared minting service, so every mint reuses one policy key and chain context"""
+    global _minting_service
+    with _minting_service_lock:
+        if _minting_service is None:
+            _minting_service = NFTMintingService()
+        return _minting_service
 
 def mint_wardrobe_nft(user_stake_address: str, item_cid: str) -> Dict[str, Any]:
     """
@@ -127,29 +316,36 @@ def mint_wardrobe_nft(user_stake_address: str, item_cid: str) -> Dict[str, Any]:
     Args:
         user_stake_address: User's Cardano stake address
         item_cid: IPFS CID of the item image
-        
+    
     Returns:
         Dict containing transaction hash and NFT details
     """
     
     try:
-        # Initialize minting service
-        minting_service = NFTMintingService()
+        # Shared minting service
+        minting_service = get_minting_service()
         
         # Step 1: Define Policy
-        policy_script = minting_service._create_policy_script()
-        policy_id = minting_service._generate_policy_id(policy_script).to_primitive().hex()
+        policy_script = minting_service.policy_script
+        policy_id = minting_service.policy_id
         
         # Step 2: Define Metadata (CIP-25)
-        metadata, item_name = minting_service._create_metadata(item_cid, policy_id)
+        metadata, item_name = minting_service._create_metadata(item_cid, policy_id, user_stake_address)
+        unit = minting_service.asset_unit(item_name)
+        if not minting_service._reserve_asset(unit):
+            raise Exception("Item is already being minted to this address")
         
-        # Step 3: Build Transaction
-        transaction = minting_service._build_transaction(
-            user_stake_address, policy_script, policy_id, item_name, metadata
-        )
-        
-        # Step 4: Sign and Submit via Masumi
-        result = minting_service._submit_via_masumi(transaction)
+        try:
+            # Step 3: Build Transaction
+            transaction = minting_service._build_transaction(
+                user_stake_address, policy_script, policy_id, item_name, metadata
+            )
+            
+            # Step 4: Sign and Submit via Masumi
+            result = minting_service._submit_via_masumi(transaction)
+        except Exception:
+            minting_service._release_asset(unit)
+            raise
         
         return {
             "success": True,
@@ -159,7 +355,7 @@ def mint_wardrobe_nft(user_stake_address: str, item_cid: str) -> Dict[str, Any]:
             "metadata": metadata,
             "message": "NFT minted successfully"
         }
-        
+    
     except Exception as e:
         return {
             "success": False,
@@ -167,6 +363,126 @@ def mint_wardrobe_nft(user_stake_address: str, item_cid: str) -> Dict[str, Any]:
             "message": "Failed to mint NFT"
         }
 
+async def mint_wardrobe_batch_async(items: List[Tuple[str, str]], chain: Optional[ChainView] = None) -> List[Dict[str, Any]]:
+    """
+    Mint many (user_address, item_cid) pairs under the shared policy, packing them into as few
+    transactions as the size limit allows; returns one result per item, in order. Packing runs
+    off the event loop and the transactions are submitted concurrently through the shared HTTP
+    pool. Packing limits follow the live protocol parameters (cached) when the chain view is
+    reachable, and items the recipient already holds are rejected instead of minted again.
+    """
+    try:
+        minting_service = await asyncio.to_thread(get_minting_service)
+    except Exception as e:
+        return [{"success": False, "error": str(e), "message": "Failed to mint NFT"} for _ in items]
+    
+    chain = chain or chain_view
+    limits = None
+    try:
+        limits = minting_service.packing_limits(await chain.protocol_parameters())
+    except Exception as e:
+        print(f"Warning: Using default minting limits, protocol parameters unavailable: {e}")
+    
+    held = await _held_units(chain, {user_address for user_address, _ in items})
+    results, assets, owners = _plan_batch(minting_service, items, held)
+    packed = await asyncio.to_thread(minting_service.pack_transactions, assets, limits)
+    submissions = await asyncio.gather(
+        *[minting_service._submit_via_masumi_async(transaction) for _, transaction, _ in packed],
+        return_exceptions=True
+    )
+    
+    outcomes: Dict[int, Dict[str, Any]] = {}
+    for (indexes, _, metadata), submission in zip(packed, submissions):
+        if isinstance(submission, Exception):
+            outcomes.update(_batch_outcomes(minting_service, assets, indexes, metadata, error=submission))
+        else:
+            outcomes.update(_batch_outcomes(minting_service, assets, indexes, metadata, submission))
+    return _collect_results(results, owners, outcomes)
+
+async def _held_units(chain: ChainView, addresses: Set[str]) -> Set[str]:
+    """Asset units already held by any of the (valid) addresses; best effort if the chain is unreachable"""
+    valid = []
+    for user_address in addresses:
+        try:
+            Address.decode(user_address)
+            valid.append(user_address)
+        except Exception:
+            continue
+    held: Set[str] = set()
+    for user_address, units in zip(valid, await asyncio.gather(*[chain.asset_units(a) for a in valid], return_exceptions=True)):
+        if isinstance(units, Exception):
+            print(f"Warning: Could not check existing assets of {user_address}: {units}")
+        else:
+            held |= units
+    return held
+
+def _plan_batch(minting_service: NFTMintingService, items: List[Tuple[str, str]], held: Optional[Set[str]] = None):
+    """
+    Validate addresses and assign asset names.
+    Bad addresses fail per item instead of failing the whole batch; the same item requested
+    twice for one address coalesces onto a single asset. Asset names are deterministic, so an
+    item already held (per held) or with a mint still pending fails rather than adding a second unit.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    assets: List[Tuple[str, str, str]] = []
+    asset_index: Dict[str, int] = {}
+    owners: List[Optional[int]] = []
+    for user_address, item_cid in items:
+        try:
+            Address.decode(user_address)
+        except Exception as e:
+            results[len(owners)] = {"success": False, "error": f"Invalid address: {e}", "message": "Failed to mint NFT"}
+            owners.append(None)
+            continue
+        item_name = minting_service._asset_name(item_cid, user_address)
+        if item_name not in asset_index:
+            unit = minting_service.asset_unit(item_name)
+            if held and unit in held:
+                error = "Item is already minted to this address"
+            elif not minting_service._reserve_asset(unit):
+                error = "Item is already being minted to this address"
+            else:
+                asset_index[item_name] = len(assets)
+                assets.append((user_address, item_cid, item_name))
+                owners.append(asset_index[item_name])
+                continue
+            results[len(owners)] = {"success": False, "error": error, "message": "Failed to mint NFT"}
+            owners.append(None)
+            continue
+        owners.append(asset_index[item_name])
+    return results, assets, owners
+
+def _batch_outcomes(minting_service: NFTMintingService, assets: List[Tuple[str, str, str]], indexes: List[int],
+                    metadata: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                    error: Optional[Exception] = None) -> Dict[int, Dict[str, Any]]:
+    outcomes = {}
+    policy_id = minting_service.policy_id
+    for index in indexes:
+        user_address, _, item_name = assets[index]
+        if error is not None:
+            minting_service._release_asset(minting_service.asset_unit(item_name))
+            outcomes[index] = {"success": False, "error": str(error), "message": "Failed to mint NFT"}
+            continue
+        outcomes[index] = {
+            "success": True,
+            "tx_hash": result.get("tx_hash"),
+            "policy_id": policy_id,
+            "asset_name": item_name,
+            "asset_unit": minting_service.asset_unit(item_name),
+            "user_address": user_address,
+            "metadata": {721: {policy_id: {item_name: metadata[721][policy_id][item_name]}}},
+            "batch_size": len(indexes),
+            "message": "NFT minted successfully"
+        }
+    return outcomes
+
+def _collect_results(results: List[Optional[Dict[str, Any]]], owners: List[Optional[int]],
+                     outcomes: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for position, owner in enumerate(owners):
+        if owner is not None:
+            results[position] = outcomes[owner]
+    return results
+
 # Example usage
 if __name__ == "__main__":
     # Test the minting function
@@ -174,4 +490,4 @@ if __name__ == "__main__":
     test_cid = "QmYourIPFSHashHere123456789"
     
     result = mint_wardrobe_nft(test_address, test_cid)
-    print(json.dumps(result, indent=2))
\ No newline at end of file
+    print(json.dumps(result, indent=2))
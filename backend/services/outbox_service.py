@@ -0,0 +1,429 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from services.masumi_service import log_agent_decision, log_anchor_root
+from services.merkle_service import build_tree, inclusion_proof, leaf_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id TEXT PRIMARY KEY,
+    agent_id TEXT NOT NULL,
+    decision_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    transaction_hash TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (agent_id, decision_hash)
+);
+CREATE INDEX IF NOT EXISTS decisions_due ON decisions (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS anchors (
+    id TEXT PRIMARY KEY,
+    merkle_root TEXT NOT NULL,
+    leaf_count INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    transaction_hash TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS anchors_due ON anchors (status, next_attempt_at);
+"""
+
+# Columns added to decisions for Merkle anchoring (migrated onto existing logs at open)
+_ANCHOR_COLUMNS = (("anchor_id", "TEXT"), ("leaf_index", "INTEGER"))
+
+class DecisionOutbox:
+    """
+    Durable outbox for Masumi decision logging.
+    Decisions are written to a SQLite write-ahead log and drained by background workers,
+    so request handlers never wait on the Masumi API.
+    In merkle anchoring mode, pending decisions are sealed every interval into a Merkle tree
+    and only its root is logged (one Masumi transaction per batch); each decision keeps its
+    leaf index so an inclusion proof against the logged root can be produced later.
+    """
+
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    ANCHORED = "anchored"
+    LOGGED = "logged"
+    FAILED = "failed"
+
+    ANCHOR_MODES = ("individual", "merkle")
+
+    def __init__(self, db_path: Optional[str] = None,
+                 sender: Callable[[str, str], Awaitable[Union[str, bool]]] = log_agent_decision,
+                 anchor_sender: Callable[[str, str], Awaitable[Union[str, bool]]] = log_anchor_root):
+        self.db_path = db_path or os.getenv("MASUMI_OUTBOX_PATH", "data/masumi_outbox.db")
+        self.workers = int(os.getenv("MASUMI_OUTBOX_WORKERS", "2"))
+        self.max_attempts = int(os.getenv("MASUMI_OUTBOX_MAX_ATTEMPTS", "8"))
+        self.backoff_base = float(os.getenv("MASUMI_OUTBOX_BACKOFF_BASE", "1"))
+        self.backoff_max = float(os.getenv("MASUMI_OUTBOX_BACKOFF_MAX", "300"))
+        self.poll_interval = float(os.getenv("MASUMI_OUTBOX_POLL_INTERVAL", "5"))
+        self.sender = sender
+        self.anchor_sender = anchor_sender
+        self.anchor_mode = os.getenv("MASUMI_ANCHOR_MODE", "individual").lower()
+        if self.anchor_mode not in self.ANCHOR_MODES:
+            raise ValueError(f"Unknown MASUMI_ANCHOR_MODE: {self.anchor_mode}")
+        self.anchor_interval = float(os.getenv("MASUMI_ANCHOR_INTERVAL", "60"))
+        self.anchor_max_leaves = int(os.getenv("MASUMI_ANCHOR_MAX_LEAVES", "10000"))
+        self.anchor_agent_id = os.getenv("MASUMI_ANCHOR_AGENT_ID", "did:vestiai:anchor")
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._seal_now: Optional[asyncio.Event] = None
+        self._unsealed = 0
+        # Trees of recently queried anchors (anchors never change once sealed)
+        self._trees: "OrderedDict[str, List[List[bytes]]]" = OrderedDict()
+        self._trees_lock = threading.Lock()
+
+    async def start(self):
+        """Open the log, requeue decisions interrupted by a restart and start the workers"""
+        await asyncio.to_thread(self._open)
+        self._wakeup = asyncio.Event()
+        self._seal_now = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.anchor_mode == "merkle":
+            self._tasks.append(asyncio.create_task(self._sealer()))
+
+    async def stop(self):
+        """Stop the workers; undelivered decisions stay in the log for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    async def enqueue(self, agent_id: str, decision_hash: str) -> str:
+        """
+        Persist a decision and return its id immediately.
+        Repeated submissions of the same decision coalesce onto the existing entry.
+        """
+        decision_id = await asyncio.to_thread(self._insert, agent_id, decision_hash)
+        if self.anchor_mode == "merkle":
+            # Seal early once a full batch is waiting
+            self._unsealed += 1
+            if self._unsealed >= self.anchor_max_leaves and self._seal_now is not None:
+                self._seal_now.set()
+        elif self._wakeup is not None:
+            self._wakeup.set()
+        return decision_id
+
+    async def get_status(self, decision_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored state of a decision, or None if unknown"""
+        return await asyncio.to_thread(self._fetch, decision_id)
+
+    async def get_proof(self, decision_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Inclusion proof of an anchored decision against its batch's Merkle root, or None if
+        unknown. Decisions not yet sealed into a batch have no proof (proof is None).
+        """
+        return await asyncio.to_thread(self._proof, decision_id)
+
+    async def seal(self) -> Optional[str]:
+        """Seal pending decisions into an anchor now; returns the anchor id, if any were pending"""
+        anchor_id = await asyncio.to_thread(self._seal_batch)
+        if anchor_id is not None and self._wakeup is not None:
+            self._wakeup.set()
+        return anchor_id
+
+    async def _sealer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._seal_now.wait(), timeout=self.anchor_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._seal_now.clear()
+            self._unsealed = 0
+            try:
+                # Drain a backlog larger than one batch in consecutive anchors
+                while await self.seal() is not None and self._pending_count() >= self.anchor_max_leaves:
+                    pass
+            except Exception as e:
+                print(f"Outbox anchor sealing failed: {e}")
+
+    async def _worker(self):
+        while True:
+            try:
+                row = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Outbox claim failed: {e}")
+                row = None
+
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            table, entry_id, agent_id, decision_hash, attempts = row
+            sender = self.anchor_sender if table == "anchors" else self.sender
+            try:
+                result = await sender(agent_id, decision_hash)
+            except asyncio.CancelledError:
+                await self._record(table, entry_id, self._release, table, entry_id)
+                raise
+            except Exception as e:
+                await self._record(table, entry_id, self._mark_retry, table, entry_id, attempts + 1, str(e))
+                continue
+            tx_hash = result if isinstance(result, str) else None
+            await self._record(table, entry_id, self._mark_logged, table, entry_id, tx_hash)
+
+    async def _record(self, table: str, entry_id: str, mark: Callable[..., None], *args):
+        """
+        Store a delivery outcome, retrying briefly (e.g. while the database is locked).
+        A failure is reported instead of escaping, which would end the worker; the entry then
+        stays in flight and is requeued at the next start.
+        """
+        for attempt in range(3):
+            try:
+                await asyncio.to_thread(mark, *args)
+                return
+            except Exception as e:
+                error = e
+                if attempt < 2:
+                    await asyncio.sleep(0.1 * (2 ** attempt))
+        print(f"Outbox could not record the outcome of {table} {entry_id}: {error}")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _open(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit, so an accepted decision survives power loss too
+        # (NORMAL would only survive a process crash)
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(decisions)")}
+        for name, kind in _ANCHOR_COLUMNS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE decisions ADD COLUMN {name} {kind}")
+        for table in ("decisions", "anchors"):
+            conn.execute(
+                f"UPDATE {table} SET status = ? WHERE status = ?",
+                (self.PENDING, self.IN_FLIGHT)
+            )
+        self._conn = conn
+
+    def _insert(self, agent_id: str, decision_hash: str) -> str:
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT id, status FROM decisions WHERE agent_id = ? AND decision_hash = ?",
+                (agent_id, decision_hash)
+            ).fetchone()
+            if existing is not None:
+                decision_id, status = existing
+                if status == self.FAILED:
+                    # Resubmitting a failed decision gives it a fresh set of attempts
+                    self._conn.execute(
+                        "UPDATE decisions SET status = ?, attempts = 0, next_attempt_at = ?, "
+                        "anchor_id = NULL, leaf_index = NULL, updated_at = ? WHERE id = ?",
+                        (self.PENDING, now, now, decision_id)
+                    )
+                return decision_id
+
+            decision_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO decisions (id, agent_id, decision_hash, status, next_attempt_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (decision_id, agent_id, decision_hash, self.PENDING, now, now, now)
+            )
+            return decision_id
+
+    def _claim(self):
+        """
+        Next due delivery as (table, id, agent id, hash, attempts).
+        Sealed anchors are always delivered, even after switching back to individual mode;
+        individual decisions only outside merkle mode, where the sealer owns them.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, ?, merkle_root, attempts FROM anchors "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (self.anchor_agent_id, self.PENDING, now)
+            ).fetchone()
+            table = "anchors"
+            if row is None and self.anchor_mode == "individual":
+                row = self._conn.execute(
+                    "SELECT id, agent_id, decision_hash, attempts FROM decisions "
+                    "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                    (self.PENDING, now)
+                ).fetchone()
+                table = "decisions"
+            if row is None:
+                return None
+            self._conn.execute(
+                f"UPDATE {table} SET status = ?, updated_at = ? WHERE id = ?",
+                (self.IN_FLIGHT, now, row[0])
+            )
+            return (table,) + tuple(row)
+
+    def _mark_logged(self, table: str, entry_id: str, transaction_hash: Optional[str]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                f"UPDATE {table} SET status = ?, transaction_hash = ?, last_error = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (self.LOGGED, transaction_hash, now, entry_id)
+            )
+            if table == "anchors":
+                # Every decision in the batch is logged by the root's transaction
+                self._conn.execute(
+                    "UPDATE decisions SET status = ?, transaction_hash = ?, last_error = NULL, "
+                    "updated_at = ? WHERE anchor_id = ? AND status = ?",
+                    (self.LOGGED, transaction_hash, now, entry_id, self.ANCHORED)
+                )
+
+    def _mark_retry(self, table: str, entry_id: str, attempts: int, error: str):
+        now = time.time()
+        status = self.FAILED if attempts >= self.max_attempts else self.PENDING
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                f"UPDATE {table} SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (status, attempts, now + self._backoff(attempts), error, now, entry_id)
+            )
+            if table == "anchors" and status == self.FAILED:
+                self._conn.execute(
+                    "UPDATE decisions SET status = ?, last_error = ?, updated_at = ? "
+                    "WHERE anchor_id = ? AND status = ?",
+                    (self.FAILED, error, now, entry_id, self.ANCHORED)
+                )
+
+    def _release(self, table: str, entry_id: str):
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE {table} SET status = ? WHERE id = ? AND status = ?",
+                (self.PENDING, entry_id, self.IN_FLIGHT)
+            )
+
+    def _pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM decisions WHERE status = ?", (self.PENDING,)
+            ).fetchone()[0]
+
+    def _seal_batch(self) -> Optional[str]:
+        """Move up to anchor_max_leaves pending decisions into a new anchor with their Merkle root"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, agent_id, decision_hash FROM decisions WHERE status = ? "
+                "ORDER BY created_at, id LIMIT ?",
+                (self.PENDING, self.anchor_max_leaves)
+            ).fetchall()
+            if not rows:
+                return None
+            levels = build_tree([leaf_hash(agent_id, decision_hash) for _, agent_id, decision_hash in rows])
+            anchor_id = uuid.uuid4().hex
+            # One transaction, so a batch is never half sealed
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT INTO anchors (id, merkle_root, leaf_count, status, next_attempt_at, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (anchor_id, levels[-1][0].hex(), len(rows), self.PENDING, now, now, now)
+                )
+                self._conn.executemany(
+                    "UPDATE decisions SET status = ?, anchor_id = ?, leaf_index = ?, updated_at = ? WHERE id = ?",
+                    [(self.ANCHORED, anchor_id, index, now, row[0]) for index, row in enumerate(rows)]
+                )
+        self._remember_tree(anchor_id, levels)
+        return anchor_id
+
+    def _remember_tree(self, anchor_id: str, levels: List[List[bytes]]):
+        with self._trees_lock:
+            self._trees[anchor_id] = levels
+            self._trees.move_to_end(anchor_id)
+            while len(self._trees) > 8:
+                self._trees.popitem(last=False)
+
+    def _tree(self, anchor_id: str) -> List[List[bytes]]:
+        with self._trees_lock:
+            levels = self._trees.get(anchor_id)
+        if levels is None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT agent_id, decision_hash FROM decisions WHERE anchor_id = ? ORDER BY leaf_index",
+                    (anchor_id,)
+                ).fetchall()
+            levels = build_tree([leaf_hash(agent_id, decision_hash) for agent_id, decision_hash in rows])
+            self._remember_tree(anchor_id, levels)
+        return levels
+
+    def _proof(self, decision_id: str) -> Optional[Dict[str, Any]]:
+        decision = self._fetch(decision_id)
+        if decision is None:
+            return None
+        result = {
+            "decision_id": decision_id,
+            "agent_id": decision["agent_id"],
+            "decision_hash": decision["decision_hash"],
+            "leaf_hash": leaf_hash(decision["agent_id"], decision["decision_hash"]).hex(),
+            "status": decision["status"],
+            "anchor_id": decision["anchor_id"],
+            "proof": None,
+        }
+        if decision["anchor_id"] is None:
+            return result
+        with self._lock:
+            anchor = self._conn.execute(
+                "SELECT merkle_root, leaf_count, status, transaction_hash FROM anchors WHERE id = ?",
+                (decision["anchor_id"],)
+            ).fetchone()
+        if anchor is None:
+            return result
+        merkle_root, leaf_count, anchor_status, transaction_hash = anchor
+        levels = self._tree(decision["anchor_id"])
+        if levels[-1][0].hex() != merkle_root:
+            raise Exception(f"Anchor {decision['anchor_id']} no longer matches its Merkle root")
+        result.update({
+            "leaf_index": decision["leaf_index"],
+            "leaf_count": leaf_count,
+            "merkle_root": merkle_root,
+            "anchor_agent_id": self.anchor_agent_id,
+            "anchor_status": anchor_status,
+            "transaction_hash": transaction_hash,
+            "proof": inclusion_proof(levels, decision["leaf_index"]),
+        })
+        return result
+
+    def _fetch(self, decision_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, agent_id, decision_hash, status, attempts, transaction_hash, "
+                "last_error, created_at, updated_at, anchor_id, leaf_index FROM decisions WHERE id = ?",
+                (decision_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("decision_id", "agent_id", "decision_hash", "status", "attempts",
+                "transaction_hash", "last_error", "created_at", "updated_at", "anchor_id", "leaf_index")
+        return dict(zip(keys, row))
@@ -0,0 +1,295 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pins (
+    cid TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    remote_cid TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pins_due ON pins (status, next_attempt_at);
+"""
+
+class PinQueue:
+    """
+    Durable queue of content waiting to be pinned, keyed by its locally computed CID.
+    Payloads are held in SQLite until a backend has accepted them, so uploads can return
+    as soon as the CID is known and the content stays readable while the pin is pending.
+    A backend that pins the content under a different CID leaves it in the mismatch state,
+    payload kept, until an operator retries or discards it.
+    """
+
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    PINNED = "pinned"
+    FAILED = "failed"
+    MISMATCH = "mismatch"
+
+    def __init__(self, pinner: Callable[[bytes], Awaitable[str]], db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("IPFS_PIN_QUEUE_PATH", "data/ipfs_pins.db")
+        self.workers = int(os.getenv("IPFS_PIN_WORKERS", "4"))
+        self.max_attempts = int(os.getenv("IPFS_PIN_MAX_ATTEMPTS", "10"))
+        self.backoff_base = float(os.getenv("IPFS_PIN_BACKOFF_BASE", "1"))
+        self.backoff_max = float(os.getenv("IPFS_PIN_BACKOFF_MAX", "600"))
+        self.poll_interval = float(os.getenv("IPFS_PIN_POLL_INTERVAL", "5"))
+        self.pinner = pinner
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+
+        self.deduplicated = 0
+
+    async def start(self):
+        """Open the queue, requeue pins interrupted by a restart and start the workers"""
+        await asyncio.to_thread(self._open)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; unpinned content stays queued for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    async def enqueue(self, cid: str, payload: bytes) -> str:
+        """
+        Queue content for pinning and return its status.
+        Content already queued or pinned under the same CID is not stored again.
+        """
+        if self._conn is None:
+            await asyncio.to_thread(self._open)
+        status = await asyncio.to_thread(self._insert, cid, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return status
+
+    async def get_status(self, cid: str) -> Optional[Dict[str, Any]]:
+        """Return the pin state of a CID, or None if it was never queued"""
+        if self._conn is None:
+            return None
+        return await asyncio.to_thread(self._fetch, cid)
+
+    async def get_payload(self, cid: str) -> Optional[bytes]:
+        """Return content that is still waiting to be pinned"""
+        if self._conn is None:
+            return None
+        return await asyncio.to_thread(self._fetch_payload, cid)
+
+    async def resolve(self, cid: str, action: str) -> Optional[str]:
+        """
+        Settle a CID mismatch: "retry" queues the pin again with fresh attempts, "discard"
+        drops the payload and marks it failed. Returns the new status, or None if cid is not
+        in the mismatch state.
+        """
+        if action not in ("retry", "discard"):
+            raise ValueError(f"Unknown action: {action} (expected retry or discard)")
+        if self._conn is None:
+            return None
+        status = await asyncio.to_thread(self._resolve, cid, action)
+        if status == self.PENDING and self._wakeup is not None:
+            self._wakeup.set()
+        return status
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {self.PENDING: 0, self.IN_FLIGHT: 0, self.PINNED: 0, self.FAILED: 0, self.MISMATCH: 0}
+        if self._conn is not None:
+            counts.update(await asyncio.to_thread(self._count))
+        counts["deduplicated"] = self.deduplicated
+        return counts
+
+    async def _worker(self):
+        while True:
+            try:
+                row = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Pin queue claim failed: {e}")
+                row = None
+
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    # Sleep until the next retry is due, a new pin arrives, or the poll interval passes
+                    due = await asyncio.to_thread(self._next_due)
+                    timeout = self.poll_interval if due is None else min(self.poll_interval, max(due - time.time(), 0.0))
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            cid, payload, attempts = row
+            try:
+                remote_cid = await self.pinner(payload)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self._release, cid)
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self._mark_retry, cid, attempts + 1, str(e))
+                continue
+
+            if remote_cid == cid:
+                await asyncio.to_thread(self._mark_pinned, cid)
+            else:
+                # The backend chunked the content differently; keep serving it locally until resolved
+                print(f"Warning: Backend pinned {cid} as {remote_cid}")
+                await asyncio.to_thread(self._mark_mismatch, cid, remote_cid)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _open(self):
+        with self._lock:
+            if self._conn is not None:
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "UPDATE pins SET status = ? WHERE status = ?",
+                (self.PENDING, self.IN_FLIGHT)
+            )
+            self._conn = conn
+
+    def _insert(self, cid: str, payload: bytes) -> str:
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT status FROM pins WHERE cid = ?", (cid,)
+            ).fetchone()
+            if existing is not None:
+                status = existing[0]
+                self.deduplicated += 1
+                if status in (self.FAILED, self.MISMATCH):
+                    # Re-uploading failed content gives it a fresh set of attempts; a discarded
+                    # payload is replaced by the one just uploaded (same CID, same bytes)
+                    self._conn.execute(
+                        "UPDATE pins SET status = ?, attempts = 0, size = ?, payload = ?, "
+                        "next_attempt_at = ?, updated_at = ? WHERE cid = ?",
+                        (self.PENDING, len(payload), sqlite3.Binary(payload), now, now, cid)
+                    )
+                    return self.PENDING
+                return status
+
+            self._conn.execute(
+                "INSERT INTO pins (cid, status, size, payload, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cid, self.PENDING, len(payload), sqlite3.Binary(payload), now, now, now)
+            )
+            return self.PENDING
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cid, payload, attempts FROM pins "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (self.PENDING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE pins SET status = ?, updated_at = ? WHERE cid = ?",
+                (self.IN_FLIGHT, now, row[0])
+            )
+            return row
+
+    def _next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM pins WHERE status = ?", (self.PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def _mark_pinned(self, cid: str):
+        # The pinned copy is now authoritative, so the queued payload can go
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pins SET status = ?, payload = NULL, remote_cid = ?, last_error = NULL, "
+                "updated_at = ? WHERE cid = ?",
+                (self.PINNED, cid, time.time(), cid)
+            )
+
+    def _mark_mismatch(self, cid: str, remote_cid: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pins SET status = ?, remote_cid = ?, last_error = ?, updated_at = ? WHERE cid = ?",
+                (self.MISMATCH, remote_cid, f"Backend returned CID {remote_cid}", time.time(), cid)
+            )
+
+    def _resolve(self, cid: str, action: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            if action == "retry":
+                cursor = self._conn.execute(
+                    "UPDATE pins SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? "
+                    "WHERE cid = ? AND status = ?",
+                    (self.PENDING, now, now, cid, self.MISMATCH)
+                )
+                return self.PENDING if cursor.rowcount else None
+            cursor = self._conn.execute(
+                "UPDATE pins SET status = ?, payload = NULL, last_error = ?, updated_at = ? "
+                "WHERE cid = ? AND status = ?",
+                (self.FAILED, "Discarded after CID mismatch", now, cid, self.MISMATCH)
+            )
+            return self.FAILED if cursor.rowcount else None
+
+    def _mark_retry(self, cid: str, attempts: int, error: str):
+        now = time.time()
+        status = self.FAILED if attempts >= self.max_attempts else self.PENDING
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pins SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ?, updated_at = ? WHERE cid = ?",
+                (status, attempts, now + self._backoff(attempts), error, now, cid)
+            )
+
+    def _release(self, cid: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pins SET status = ? WHERE cid = ? AND status = ?",
+                (self.PENDING, cid, self.IN_FLIGHT)
+            )
+
+    def _fetch(self, cid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cid, status, size, attempts, remote_cid, last_error, created_at, updated_at "
+                "FROM pins WHERE cid = ?",
+                (cid,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("cid", "status", "size", "attempts", "remote_cid", "last_error", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def _fetch_payload(self, cid: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM pins WHERE cid = ?", (cid,)).fetchone()
+        return bytes(row[0]) if row is not None and row[0] is not None else None
+
+    def _count(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM pins GROUP BY status").fetchall())
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+PROFILE_MODES = ("sampling", "torch")
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+class _TorchSession:
+    """Per-operator totals accumulated from every inference batch profiled during a window"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.operators: Dict[str, Dict[str, float]] = {}
+
+    def add(self, events):
+        self.batches += 1
+        for event in events:
+            totals = self.operators.setdefault(event.key, {"count": 0, "self_cpu_ms": 0.0, "cpu_total_ms": 0.0})
+            totals["count"] += event.count
+            totals["self_cpu_ms"] += event.self_cpu_time_total / 1000.0
+            totals["cpu_total_ms"] += event.cpu_time_total / 1000.0
+
+    def report(self, row_limit: int) -> Dict[str, Any]:
+        rows = sorted(self.operators.items(), key=lambda item: item[1]["self_cpu_ms"], reverse=True)[:row_limit]
+        return {
+            "batches": self.batches,
+            "operators": [{"name": name, **totals} for name, totals in rows],
+        }
+
+class ProfilingService:
+    """
+    On-demand, time-boxed profiles of the running backend.
+    sampling: a pure-Python stack sampler over all threads, returned as folded stacks
+    (flamegraph.pl / speedscope input). torch: torch.profiler runs around each inference
+    batch during the window (the profiler only sees ops on the thread that started it), and
+    per-operator CPU times are summed across batches.
+    Only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self.max_seconds = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+        self.sample_interval = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000.0
+        self._busy = False
+        self._torch_session: Optional[_TorchSession] = None
+
+    async def profile(self, mode: str, seconds: float, row_limit: int = 50):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        if self._busy:
+            raise ProfilerBusyError("A profile is already running")
+        seconds = max(0.1, min(seconds, self.max_seconds))
+
+        self._busy = True
+        try:
+            if mode == "sampling":
+                return await asyncio.to_thread(self._sample, seconds)
+            session = _TorchSession()
+            self._torch_session = session
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                self._torch_session = None
+            # Wait for a batch that is still being profiled
+            with session.lock:
+                return {"seconds": seconds, **session.report(row_limit)}
+        finally:
+            self._busy = False
+
+    @contextmanager
+    def capture(self):
+        """
+        Wrap one inference batch; profiled only while a torch session is open.
+        Batches on other scheduler threads that overlap an in-progress capture run unprofiled.
+        """
+        session = self._torch_session
+        if session is None or not session.lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            import torch
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU]) as profiler:
+                yield
+            session.add(profiler.key_averages())
+        finally:
+            session.lock.release()
+
+    def _sample(self, seconds: float) -> str:
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[";".join([names.get(thread_id, str(thread_id))] + frames[::-1])] += 1
+            samples += 1
+            time.sleep(self.sample_interval)
+
+        lines = [f"# {samples} samples every {self.sample_interval * 1000:.1f}ms over {seconds:.1f}s"]
+        lines.extend(f"{stack} {count}" for stack, count in stacks.most_common())
+        return "\n".join(lines) + "\n"
+
+# Shared profiler used by the admin endpoint and the inference thread
+profiler = ProfilingService()
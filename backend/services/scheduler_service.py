@@ -0,0 +1,143 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching scheduler.
+    Concurrent submissions are collected into batches (up to max_batch_size items, waiting at
+    most max_wait_ms after the first one) and run by batch_fn on a dedicated worker thread.
+    batch_fn receives the list of submitted inputs and returns one result per input.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0, name: str = "batch-scheduler"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen_batch = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._last_batch_ms = 0.0
+
+    def start(self):
+        """Start the worker thread (also started lazily on first submit)"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the worker after it drains items already queued"""
+        with self._start_lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one input and wait for its result"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((item, future, loop))
+        return await future
+
+    def submit_many(self, items: Sequence[Any]) -> List[asyncio.Future]:
+        """
+        Queue several inputs back to back so they land in the same batch(es).
+        Returns one future per input, in order; await them (e.g. with asyncio.as_completed)
+        to consume results as their batch finishes.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._queue.put((item, future, loop))
+        return futures
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size statistics"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "largest_batch": self._max_seen_batch,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "last_batch_ms": self._last_batch_ms,
+            }
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is self._STOP:
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is self._STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch):
+        # Drop requests whose callers have already gone away
+        live = [entry for entry in batch if not entry[1].cancelled()]
+        if not live:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = list(self.batch_fn([entry[0] for entry in live]))
+            if len(results) != len(live):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(live)} inputs")
+        except BaseException as e:
+            for _, future, loop in live:
+                loop.call_soon_threadsafe(_resolve, future, None, e)
+        else:
+            for (_, future, loop), result in zip(live, results):
+                loop.call_soon_threadsafe(_resolve, future, result, None)
+
+        with self._stats_lock:
+            size = len(live)
+            self._batches += 1
+            self._items += size
+            self._max_seen_batch = max(self._max_seen_batch, size)
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._last_batch_ms = (time.perf_counter() - started) * 1000.0
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+class StartupState:
+    """
+    Tracks the components brought up at startup (stores, background workers, model warm-up)
+    so the readiness probe can hold traffic until all of them are usable.
+    Each component is pending, ready or failed, with how long it took.
+    """
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._components: Dict[str, Dict[str, Any]] = {}
+
+    def expect(self, name: str):
+        """Register a component before it starts, so readiness waits for it"""
+        self._components[name] = {"status": self.PENDING, "seconds": None, "error": None, "details": None}
+
+    async def run(self, name: str, awaitable: Awaitable) -> Any:
+        """Await one startup step, recording its outcome; failures are re-raised"""
+        if name not in self._components:
+            self.expect(name)
+        component = self._components[name]
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception as e:
+            component.update(status=self.FAILED, error=str(e))
+            raise
+        finally:
+            component["seconds"] = time.perf_counter() - started
+        component["status"] = self.READY
+        if isinstance(result, dict):
+            component["details"] = result
+        return result
+
+    def ready(self) -> bool:
+        return all(component["status"] == self.READY for component in self._components.values())
+
+    def describe(self, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {
+            "ready": self.ready(),
+            "uptime_s": time.time() - self.started_at,
+            "components": {name: dict(component) for name, component in self._components.items()},
+            **(extra or {}),
+        }
+
+# Startup state of this worker process
+startup = StartupState()
+
+def run_in_background(name: str, function, *args) -> asyncio.Task:
+    """Start a blocking startup step on a worker thread without holding up the server"""
+    startup.expect(name)
+    return asyncio.create_task(_quiet(startup.run(name, asyncio.to_thread(function, *args))))
+
+async def _quiet(awaitable: Awaitable):
+    # A failed background step is reported through readiness instead of an unretrieved task error
+    try:
+        return await awaitable
+    except Exception as e:
+        print(f"Warning: Startup step failed: {e}")
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.admission_service import ByteBudget
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue (or its input byte budget) is at capacity"""
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused with different request inputs"""
+
+class TryOnJobQueue:
+    """
+    Asynchronous try-on jobs.
+    Submissions return a job id at once and run on a fixed number of workers, so the server
+    schedules inference instead of open connections driving it. Each job records the stages
+    it passes through (queued, decode, preprocess, inference, encode, ...) as events that can
+    be replayed and followed. Finished jobs live in a bounded in-memory store (count, result
+    bytes) and expire after a TTL. An idempotency key, scoped to the submitting client, maps
+    a retried submission with the same inputs to its job. Input bytes of queued and running
+    jobs are charged to a byte budget (the admission budget in the app) until the job ends.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, runner: Callable[[Dict[str, Any], Callable[[str], None]], Awaitable[Dict[str, Any]]],
+                 budget: Optional[ByteBudget] = None):
+        # runner(inputs, progress) -> result fields merged into the job (must include "image")
+        self.runner = runner
+        self.budget = budget
+        self.workers = int(os.getenv("VTO_JOB_WORKERS", "4"))
+        self.max_queued = int(os.getenv("VTO_JOB_MAX_QUEUED", "256"))
+        self.max_jobs = int(os.getenv("VTO_JOB_MAX_JOBS", "1000"))
+        self.max_result_bytes = int(os.getenv("VTO_JOB_MAX_RESULT_BYTES", str(256 * 1024 * 1024)))
+        self.job_ttl = float(os.getenv("VTO_JOB_TTL", "600"))
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inputs: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        # (client, idempotency key) -> job id
+        self._idempotency: Dict[Tuple[str, str], str] = {}
+        self._result_bytes = 0
+        self._input_bytes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self):
+        if not self._tasks:
+            self._queue = self._queue or asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, inputs: Dict[str, Any], idempotency_key: Optional[str] = None, client: str = "",
+                     request_hash: Optional[str] = None, input_bytes: int = 0, **fields) -> str:
+        """
+        Queue a try-on and return its job id immediately.
+        Repeating a client's idempotency key with the same request_hash returns the existing job
+        instead of queueing the work twice, unless that job failed; a different request_hash
+        raises IdempotencyConflictError. input_bytes is held against the byte budget.
+        """
+        await self.start()
+        self._prune()
+        scoped_key = (client, idempotency_key) if idempotency_key is not None else None
+        existing = self._jobs.get(self._idempotency.get(scoped_key)) if scoped_key is not None else None
+        if existing is not None:
+            if existing["request_hash"] != request_hash:
+                raise IdempotencyConflictError("Idempotency-Key was already used with different inputs")
+            if existing["status"] != self.FAILED:
+                return existing["job_id"]
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError("Try-on job queue is full")
+        if self.budget is not None and not self.budget.try_reserve(input_bytes):
+            raise JobQueueFullError("Server busy, too much try-on input data queued")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": self.QUEUED,
+            "stage": self.QUEUED,
+            "events": [{"stage": self.QUEUED, "at": now}],
+            "image": None,
+            "error": None,
+            "idempotency_key": scoped_key,
+            "request_hash": request_hash,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+        self._inputs[job_id] = (inputs, input_bytes)
+        self._input_bytes += input_bytes
+        self._changed[job_id] = asyncio.Event()
+        if scoped_key is not None:
+            self._idempotency[scoped_key] = job_id
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, or None if unknown or expired"""
+        return self._jobs.get(job_id)
+
+    async def follow(self, job_id: str, start: int = 0,
+                     heartbeat: float = 15.0) -> AsyncIterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """
+        Yield (index, event) for a job's stage events from index start, then new ones as they
+        happen, until it finishes. Yields None after heartbeat seconds without news (for keep-alives).
+        """
+        cursor = start
+        while True:
+            job = self._jobs.get(job_id)
+            changed = self._changed.get(job_id)
+            if job is None or changed is None:
+                return
+            events = job["events"]
+            while cursor < len(events):
+                yield cursor, events[cursor]
+                cursor += 1
+            if job["status"] in (self.SUCCEEDED, self.FAILED):
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "workers": self.workers,
+            "jobs": counts,
+            "result_bytes": self._result_bytes,
+            "input_bytes": self._input_bytes,
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            entry = self._inputs.get(job_id)
+            if entry is None or job_id not in self._jobs:
+                self._release_inputs(job_id)
+                continue
+            self._update(job_id, status=self.RUNNING)
+            try:
+                result = await self.runner(entry[0], lambda stage: self._event(job_id, stage))
+            except asyncio.CancelledError:
+                self._finish(job_id, status=self.FAILED, error="Cancelled at shutdown")
+                raise
+            except Exception as e:
+                self._finish(job_id, status=self.FAILED, error=str(e))
+                continue
+            finally:
+                self._release_inputs(job_id)
+            self._result_bytes += len(result.get("image") or b"")
+            self._finish(job_id, status=self.SUCCEEDED, **result)
+
+    def _release_inputs(self, job_id: str):
+        _, input_bytes = self._inputs.pop(job_id, (None, 0))
+        self._input_bytes -= input_bytes
+        if self.budget is not None:
+            self.budget.release(input_bytes)
+
+    def _event(self, job_id: str, stage: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        now = time.time()
+        job["events"].append({"stage": stage, "at": now, **fields})
+        job.update(stage=stage, updated_at=now)
+        # Wake every follower, then arm a fresh event for the next change
+        self._changed[job_id].set()
+        self._changed[job_id] = asyncio.Event()
+
+    def _update(self, job_id: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+
+    def _finish(self, job_id: str, status: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields, status=status)
+        self._event(job_id, status, **({"error": fields["error"]} if "error" in fields else {}))
+        # The job just finished stays until its result has been read or it ages out
+        self._prune(keep=job_id)
+
+    def _prune(self, keep: Optional[str] = None):
+        """
+        Drop finished jobs, oldest first, past their TTL or while over the count/byte bounds.
+        keep is never dropped, so followers of a job that just finished see its final event.
+        """
+        cutoff = time.time() - self.job_ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job_id == keep or job["status"] not in (self.SUCCEEDED, self.FAILED):
+                continue
+            over_bounds = len(self._jobs) >= self.max_jobs or self._result_bytes > self.max_result_bytes
+            if not over_bounds and job["updated_at"] >= cutoff:
+                break
+            self._drop(job_id)
+
+    def _drop(self, job_id: str):
+        job = self._jobs.pop(job_id)
+        self._result_bytes -= len(job.get("image") or b"")
+        self._changed.pop(job_id, None)
+        if self._idempotency.get(job.get("idempotency_key")) == job_id:
+            del self._idempotency[job["idempotency_key"]]
@@ -0,0 +1,38 @@
+import os
+from typing import Optional, Tuple
+
+# Request options of the try-on endpoints. Kept apart from vto_service so the app can
+# validate requests without importing torch.
+
+TARGET_SIZE = (512, 384)
+
+# Per-request resolution tiers (height, width); all tiers share one set of model weights
+RESOLUTION_TIERS = {
+    "preview": (256, 192),
+    "standard": TARGET_SIZE,
+    "high": (1024, 768),
+}
+DEFAULT_QUALITY = os.getenv("VTO_DEFAULT_QUALITY", "standard")
+
+def resolve_quality(quality: Optional[str]) -> Tuple[str, Tuple[int, int]]:
+    """
+    Map a quality parameter to its (tier name, target size); None selects the default tier
+    """
+    tier = (quality or DEFAULT_QUALITY).lower()
+    if tier not in RESOLUTION_TIERS:
+        raise ValueError(f"Unknown quality tier: {quality} (expected one of {', '.join(RESOLUTION_TIERS)})")
+    return tier, RESOLUTION_TIERS[tier]
+
+# Output encoders: format name -> (PIL format, MIME type, encoder options)
+OUTPUT_FORMATS = {
+    "png": ("PNG", "image/png", {
+        "compress_level": int(os.getenv("VTO_PNG_COMPRESS_LEVEL", "6")),
+    }),
+    "jpeg": ("JPEG", "image/jpeg", {
+        "quality": int(os.getenv("VTO_JPEG_QUALITY", "90")),
+    }),
+    "webp": ("WEBP", "image/webp", {
+        "quality": int(os.getenv("VTO_WEBP_QUALITY", "90")),
+        "method": int(os.getenv("VTO_WEBP_METHOD", "4")),
+    }),
+}
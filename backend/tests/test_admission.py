@@ -0,0 +1,29 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services.admission_service import AdmissionController, AdmissionMiddleware
+
+def test_shed_streamed_body_is_not_timed():
+    controller = AdmissionController()
+    limiter = controller.limiters["upload"]
+    limiter.max_body_bytes = 10
+    released = []
+    release = limiter.release
+    limiter.release = lambda service_time=None: (released.append(service_time), release(service_time))
+
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.post("/api/garments/ingest")
+    async def ingest(request: Request):
+        return {"size": len(await request.body())}
+
+    def body(size):
+        # A generator body is sent chunked, so the limit is enforced while it streams
+        yield b"x" * size
+
+    client = TestClient(app)
+    assert client.post("/api/garments/ingest", content=body(20)).status_code == 413
+    assert client.post("/api/garments/ingest", content=body(5)).status_code == 200
+    assert released[0] is None and released[1] is not None
+    assert limiter.shed == {"too_large": 1}
@@ -0,0 +1,19 @@
+import asyncio
+
+from services.cache_service import TieredResultCache
+
+def test_get_counts_hits_and_misses(tmp_path):
+    async def scenario():
+        cache = TieredResultCache(str(tmp_path))
+        assert await cache.get("absent") is None
+        await cache.put("key", b"value")
+        assert await cache.get("key") == b"value"
+        # A fresh cache over the same directory serves the value from disk
+        reopened = TieredResultCache(str(tmp_path))
+        assert await reopened.get("key") == b"value"
+        return cache.stats(), reopened.stats()
+
+    stats, reopened = asyncio.run(scenario())
+    assert (stats["hits_memory"], stats["hits_disk"], stats["misses"]) == (1, 0, 1)
+    assert (reopened["hits_memory"], reopened["hits_disk"], reopened["misses"]) == (0, 1, 0)
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,127 @@
+import asyncio
+import base64
+import hashlib
+import time
+
+import pytest
+
+from benchmarks.fake_services import FakeIPFSNode, FaultConfig
+from services.cid_service import is_valid_cid, verify_cid
+from services.http_service import HTTPClientRegistry
+from services.ipfs_routing_service import BackendRouter, LocalNodeBackend
+
+CONTENT = b"encrypted clothing payload " * 64
+
+@pytest.fixture
+def nodes():
+    started = []
+
+    def start(latency_ms: float = 0.0) -> FakeIPFSNode:
+        node = FakeIPFSNode(FaultConfig(latency_ms=latency_ms))
+        node.start()
+        started.append(node)
+        return node
+
+    yield start
+    for node in started:
+        node.stop()
+
+def make_router(http: HTTPClientRegistry, *nodes: FakeIPFSNode, hedge_delay_ms: float = 50.0) -> BackendRouter:
+    backends = []
+    for index, node in enumerate(nodes):
+        backend = LocalNodeBackend(http, node.api_url)
+        backend.name = f"node{index}"
+        backends.append(backend)
+    router = BackendRouter(backends, verify=verify_cid, verifiable=is_valid_cid)
+    router.hedge_reads = True
+    router.hedge_delay = hedge_delay_ms / 1000.0
+    router.read_fanout = len(backends)
+    return router
+
+async def with_http(scenario):
+    http = HTTPClientRegistry()
+    await http.start()
+    try:
+        return await scenario(http)
+    finally:
+        await http.close()
+
+def test_hedged_read_is_served_by_the_faster_backend(nodes):
+    slow, fast = nodes(latency_ms=1000), nodes()
+    cid = slow.store.add(CONTENT)
+    fast.store.add(CONTENT)
+
+    async def scenario(http):
+        router = make_router(http, slow, fast)
+        started = time.perf_counter()
+        data = await router.fetch(cid)
+        return data, time.perf_counter() - started, router
+
+    data, elapsed, router = asyncio.run(with_http(scenario))
+    assert data == CONTENT
+    assert elapsed < 0.8
+    slow_backend, fast_backend = router.backends
+    assert fast_backend.successes == 1
+    assert slow_backend.failures == 0
+
+def test_slow_backend_is_demoted(nodes):
+    slow, fast = nodes(latency_ms=300), nodes(latency_ms=5)
+    cid = slow.store.add(CONTENT)
+    fast.store.add(CONTENT)
+
+    async def scenario(http):
+        router = make_router(http, slow, fast)
+        assert [b.name for b in router.ranked()] == ["node0", "node1"]
+        for _ in range(3):
+            assert await router.fetch(cid) == CONTENT
+        assert [b.name for b in router.ranked()] == ["node1", "node0"]
+
+        # The fast backend now answers within the hedge delay, so the slow one is not asked
+        requests_before = slow.requests
+        assert await router.fetch(cid) == CONTENT
+        assert slow.requests == requests_before
+
+    asyncio.run(with_http(scenario))
+
+def test_mismatched_content_counts_as_backend_failure(nodes):
+    wrong, right = nodes(), nodes()
+    cid = right.store.add(CONTENT)
+    wrong.store._blobs[cid] = b"tampered payload"
+
+    async def scenario(http):
+        router = make_router(http, wrong, right)
+        return await router.fetch(cid), router
+
+    data, router = asyncio.run(with_http(scenario))
+    assert data == CONTENT
+    wrong_backend, right_backend = router.backends
+    assert wrong_backend.failures == 1 and wrong_backend.successes == 0
+    assert right_backend.successes == 1
+
+def test_fetch_fails_when_no_backend_matches_the_cid(nodes):
+    first, second = nodes(), nodes()
+    cid = first.store.add(CONTENT)
+    first.store._blobs[cid] = b"tampered payload"
+    second.store._blobs[cid] = b"another tampered payload"
+
+    async def scenario(http):
+        router = make_router(http, first, second)
+        with pytest.raises(Exception, match="does not match CID"):
+            await router.fetch(cid)
+        return router
+
+    router = asyncio.run(with_http(scenario))
+    assert all(backend.failures == 1 for backend in router.backends)
+
+def test_cid_without_local_verifier_is_returned_unchecked(nodes):
+    node = nodes()
+    # CIDv1 dag-cbor: a codec the local verifier does not handle
+    raw = bytes([1, 0x71, 0x12, 32]) + hashlib.sha256(b"block").digest()
+    cid = "b" + base64.b32encode(raw).decode().lower().rstrip("=")
+    assert not is_valid_cid(cid)
+    node.store._blobs[cid] = CONTENT
+
+    async def scenario(http):
+        return await make_router(http, node).fetch(cid)
+
+    assert asyncio.run(with_http(scenario)) == CONTENT
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+from pycardano import Address, Network, PaymentSigningKey, PaymentVerificationKey
+
+from benchmarks.fake_services import FakeBlockfrost, FakeMasumi
+from services import nft_minting_service
+from services.chain_service import ChainView
+from services.http_service import http_registry
+from services.mint_job_service import MintJobQueue
+
+def new_address() -> str:
+    key = PaymentVerificationKey.from_signing_key(PaymentSigningKey.generate())
+    return str(Address(key.hash(), network=Network.TESTNET))
+
+@pytest.fixture
+def blockfrost():
+    service = FakeBlockfrost()
+    service.start()
+    yield service
+    service.stop()
+
+@pytest.fixture
+def masumi():
+    service = FakeMasumi()
+    service.start()
+    yield service
+    service.stop()
+
+@pytest.fixture
+def minting_service(monkeypatch, tmp_path):
+    monkeypatch.setenv("NFT_POLICY_SKEY_PATH", str(tmp_path / "policy.skey"))
+    service = nft_minting_service.NFTMintingService()
+    monkeypatch.setattr(nft_minting_service, "_minting_service", service)
+    return service
+
+def chain_for(blockfrost: FakeBlockfrost) -> ChainView:
+    chain = ChainView()
+    chain.base_url = blockfrost.base_url
+    chain.tip_ttl = 0
+    return chain
+
+async def with_http(scenario):
+    try:
+        return await scenario()
+    finally:
+        await http_registry.close()
+
+def test_batch_is_submitted_to_masumi_and_confirmed_on_chain(blockfrost, masumi, minting_service):
+    minting_service.masumi_endpoint = masumi.submit_endpoint
+    chain = chain_for(blockfrost)
+    address = new_address()
+
+    async def scenario():
+        queue = MintJobQueue(minter=lambda items: nft_minting_service.mint_wardrobe_batch_async(items, chain), chain=chain)
+        queue.max_wait = 0.05
+        try:
+            job_id = await queue.submit(address, ["QmItemOne", "QmItemTwo"])
+            job = await queue.wait(job_id)
+            assert job["status"] == MintJobQueue.SUBMITTED
+            assert all(result["success"] for result in job["results"])
+            assert len(masumi.transactions) == 1
+
+            # Confirmed once every minted asset is held by the recipient
+            assert (await queue.get_status(job_id))["status"] == MintJobQueue.SUBMITTED
+            for result in job["results"]:
+                blockfrost.hold(address, result["asset_unit"])
+            assert (await queue.get_status(job_id))["status"] == MintJobQueue.CONFIRMED
+        finally:
+            await queue.stop()
+
+    asyncio.run(with_http(scenario))
+
+def test_unreachable_masumi_fails_the_items(blockfrost, minting_service):
+    # Nothing listens on the discard port
+    minting_service.masumi_endpoint = "http://127.0.0.1:9"
+    chain = chain_for(blockfrost)
+
+    async def scenario():
+        return await nft_minting_service.mint_wardrobe_batch_async([(new_address(), "QmItem")], chain)
+
+    [result] = asyncio.run(with_http(scenario))
+    assert result["success"] is False
+    assert "Masumi submission failed" in result["error"]
+    assert "tx_hash" not in result
+
+def test_missing_minter_results_fail_the_job():
+    async def short_minter(items):
+        return [{"success": True, "tx_hash": "abc", "asset_unit": "unit"} for _ in items[:-1]]
+
+    async def scenario():
+        queue = MintJobQueue(minter=short_minter, chain=ChainView())
+        queue.max_wait = 0.05
+        try:
+            job_id = await queue.submit("addr_test1", ["QmA", "QmB", "QmC"])
+            return await asyncio.wait_for(queue.wait(job_id), timeout=5)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == MintJobQueue.FAILED
+    assert all(result["success"] is False for result in job["results"])
+    assert "returned 2 results for 3 items" in job["results"][0]["error"]
+
+def test_prune_skips_unfinished_jobs():
+    queue = MintJobQueue(minter=None, chain=ChainView())
+    queue.max_jobs = 3
+    for job_id, finished in (("minting", False), ("done1", True), ("done2", True), ("done3", True)):
+        queue._jobs[job_id] = {"job_id": job_id, "status": MintJobQueue.SUBMITTED, "updated_at": 0.0 if job_id != "done3" else 2e9}
+        queue._done[job_id] = asyncio.Event()
+        if finished:
+            queue._done[job_id].set()
+
+    queue._prune()
+    # The unfinished head is kept; finished jobs behind it are dropped past the TTL or the bound
+    assert list(queue._jobs) == ["minting", "done3"]
+
+def test_same_item_is_not_minted_twice(blockfrost, masumi, minting_service):
+    minting_service.masumi_endpoint = masumi.submit_endpoint
+    chain = chain_for(blockfrost)
+    pending, held = new_address(), new_address()
+
+    async def scenario():
+        [first] = await nft_minting_service.mint_wardrobe_batch_async([(pending, "QmItem")], chain)
+        blockfrost.hold(held, minting_service.asset_unit(minting_service._asset_name("QmItem", held)))
+        return first, await nft_minting_service.mint_wardrobe_batch_async([(pending, "QmItem"), (held, "QmItem")], chain)
+
+    first, (again, owned) = asyncio.run(with_http(scenario))
+    assert first["success"] is True
+    assert again == {"success": False, "error": "Item is already being minted to this address", "message": "Failed to mint NFT"}
+    assert owned["error"] == "Item is already minted to this address"
+    assert len(masumi.transactions) == 1
+
+def test_wait_returns_the_job_even_if_it_is_pruned():
+    async def scenario():
+        queue = MintJobQueue(minter=None, chain=ChainView())
+        queue.max_jobs = 1
+        queue._jobs["job"] = job = {"job_id": "job", "status": MintJobQueue.SUBMITTED, "updated_at": 0.0}
+        queue._done["job"] = asyncio.Event()
+        waiter = asyncio.create_task(queue.wait("job"))
+        await asyncio.sleep(0)
+        # Finished and pruned (e.g. by another request's submit) before the waiter resumes
+        queue._done["job"].set()
+        queue._prune()
+        assert "job" not in queue._jobs
+        return job, await waiter
+
+    job, waited = asyncio.run(scenario())
+    assert waited is job
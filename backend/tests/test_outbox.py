@@ -0,0 +1,39 @@
+import asyncio
+import sqlite3
+
+from services.outbox_service import DecisionOutbox
+
+def test_worker_survives_bookkeeping_failures(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASUMI_OUTBOX_WORKERS", "1")
+    monkeypatch.setenv("MASUMI_ANCHOR_MODE", "individual")
+    sent = []
+
+    async def sender(agent_id, decision_hash):
+        sent.append(decision_hash)
+        if decision_hash == "first":
+            raise Exception("Masumi unavailable")
+        return f"tx-{decision_hash}"
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    async def scenario():
+        outbox = DecisionOutbox(str(tmp_path / "outbox.db"), sender=sender)
+        outbox._mark_retry = locked
+        await outbox.start()
+        try:
+            first = await outbox.enqueue("agent", "first")
+            second = await outbox.enqueue("agent", "second")
+            for _ in range(100):
+                if (await outbox.get_status(second))["status"] == DecisionOutbox.LOGGED:
+                    break
+                await asyncio.sleep(0.05)
+            return await outbox.get_status(first), await outbox.get_status(second)
+        finally:
+            await outbox.stop()
+
+    first, second = asyncio.run(scenario())
+    # The unrecorded delivery stays in flight (requeued on restart); the worker keeps going
+    assert first["status"] == DecisionOutbox.IN_FLIGHT
+    assert second["status"] == DecisionOutbox.LOGGED
+    assert sent == ["first", "second"]
@@ -0,0 +1,25 @@
+import asyncio
+
+from services.pin_queue_service import PinQueue
+
+def test_reuploading_discarded_content_requeues_it(tmp_path):
+    async def pinner(data):
+        return "QmOther"
+
+    async def scenario():
+        queue = PinQueue(pinner, str(tmp_path / "pins.db"))
+        try:
+            assert await queue.enqueue("QmContent", b"payload") == PinQueue.PENDING
+            await asyncio.to_thread(queue._mark_mismatch, "QmContent", "QmOther")
+            assert await queue.resolve("QmContent", "discard") == PinQueue.FAILED
+            assert await queue.get_payload("QmContent") is None
+
+            status = await queue.enqueue("QmContent", b"payload")
+            return status, await queue.get_payload("QmContent"), await queue.get_status("QmContent")
+        finally:
+            await queue.stop()
+
+    status, payload, pin = asyncio.run(scenario())
+    assert status == PinQueue.PENDING
+    assert payload == b"payload"
+    assert (pin["status"], pin["attempts"]) == (PinQueue.PENDING, 0)
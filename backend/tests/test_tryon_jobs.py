@@ -0,0 +1,22 @@
+import asyncio
+
+from services.tryon_job_service import TryOnJobQueue
+
+def test_job_over_the_result_budget_is_kept_for_its_followers():
+    async def runner(inputs, progress):
+        progress("inference")
+        return {"image": b"x" * 100}
+
+    async def scenario():
+        queue = TryOnJobQueue(runner)
+        queue.max_result_bytes = 10
+        try:
+            job_id = await queue.submit({})
+            stages = [event["stage"] async for _, event in queue.follow(job_id)]
+            return stages, queue.get(job_id)
+        finally:
+            await queue.stop()
+
+    stages, job = asyncio.run(scenario())
+    assert stages[-1] == TryOnJobQueue.SUCCEEDED
+    assert job["image"] == b"x" * 100
@@ -0,0 +1,36 @@
+import pytest
+import torch
+from PIL import Image
+
+from services import vto_service
+
+@pytest.fixture
+def checkpoints(monkeypatch, tmp_path):
+    for name in ("condition_generator.pth", "image_generator.pth"):
+        torch.save({}, tmp_path / name)
+    monkeypatch.setenv("VTO_MODEL_DIR", str(tmp_path))
+    return tmp_path
+
+def run(model) -> torch.Tensor:
+    person, cloth = torch.zeros((1, 3, 8, 6)), torch.ones((1, 3, 8, 6))
+    with torch.no_grad():
+        return model.eval()(person, cloth)
+
+def test_mock_model_is_the_default(checkpoints):
+    assert run(vto_service.create_viton_model()).shape == (1, 3, 8, 6)
+
+def test_hrviton_without_a_forward_pass_falls_back_to_the_mock(checkpoints, monkeypatch):
+    monkeypatch.setenv("VTO_USE_HRVITON", "true")
+    wrapper = type("Wrapper", (), {"to": lambda self, device: self, "eval": lambda self: self})()
+    monkeypatch.setattr(vto_service, "load_actual_hrviton_model", lambda *paths: wrapper)
+
+    output = run(vto_service.create_viton_model())
+    assert torch.allclose(output, torch.full((1, 3, 8, 6), 0.3))
+
+def test_preprocess_writes_normalised_pixels_into_out():
+    pixels = torch.randint(0, 256, (8, 6, 3), dtype=torch.uint8)
+    out = torch.empty((1, 3, 8, 6))
+
+    result = vto_service.preprocess_image(Image.fromarray(pixels.numpy()), (8, 6), out=out)
+    assert result is out
+    assert torch.allclose(out[0], pixels.permute(2, 0, 1).float() / 255 * 2 - 1, atol=1e-6)